@@ -0,0 +1,127 @@
+"""Load benchmark: concurrent clients against a real uvicorn server on a temp SQLite file.
+
+python -m benchmarks.load_results --clients 64 --duration 10
+"""
+
+import argparse
+import asyncio
+import os
+import socket
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _start_server(workdir: Path, port: int, workers: int) -> subprocess.Popen:
+    env = dict(os.environ, PYTHONPATH=str(BACKEND_DIR))
+    command = [sys.executable, "-m", "uvicorn", "k_matcher.main:app", "--port", str(port)]
+    command += ["--log-level", "warning", "--workers", str(workers)]
+    return subprocess.Popen(
+        command, cwd=workdir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+
+
+async def _wait_until_ready(client: httpx.AsyncClient):
+    for _ in range(200):
+        try:
+            await client.get("/question_categories")
+            return
+        except httpx.TransportError:
+            await asyncio.sleep(0.05)
+    raise RuntimeError("Server did not start")
+
+
+def _fill_questions(db_path: Path, question_count: int):
+    with sqlite3.connect(db_path) as connection:
+        connection.execute("INSERT INTO question_category (id, name) VALUES (1, 'category')")
+        connection.executemany(
+            "INSERT INTO question (id, text, category_id) VALUES (?, ?, 1)",
+            [(i, f"question {i}") for i in range(1, question_count + 1)],
+        )
+
+
+async def _client(
+    client: httpx.AsyncClient, deadline: float, payload: dict, latencies: list[float]
+) -> int:
+    errors = 0
+    while time.perf_counter() < deadline:
+        for method, url, body in (("POST", "/results", payload), ("GET", "/questions", None)):
+            started = time.perf_counter()
+            try:
+                response = await client.request(method, url, json=body)
+                response.raise_for_status()
+            except httpx.HTTPError:
+                errors += 1
+            else:
+                latencies.append(time.perf_counter() - started)
+    return errors
+
+
+async def run(clients: int, duration: float, question_count: int, workers: int) -> dict:
+    with tempfile.TemporaryDirectory() as workdir:
+        port = _free_port()
+        server = _start_server(Path(workdir), port, workers)
+        limits = httpx.Limits(max_connections=clients)
+        try:
+            async with httpx.AsyncClient(
+                base_url=f"http://127.0.0.1:{port}", limits=limits, timeout=10
+            ) as client:
+                await _wait_until_ready(client)
+                _fill_questions(Path(workdir) / "db.sqlite", question_count)
+                payload = {
+                    "answers": [
+                        {"question_id": i, "answer": i % 5, "if_forced": False}
+                        for i in range(1, question_count + 1)
+                    ]
+                }
+                latencies: list[float] = []
+                started = time.perf_counter()
+                deadline = started + duration
+                errors = await asyncio.gather(
+                    *(_client(client, deadline, payload, latencies) for _ in range(clients))
+                )
+                elapsed = time.perf_counter() - started
+        finally:
+            server.terminate()
+            try:
+                server.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                server.kill()
+
+    quantiles = statistics.quantiles(latencies, n=100)
+    return {
+        "clients": clients,
+        "requests": len(latencies),
+        "errors": sum(errors),
+        "requests_per_second": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(quantiles[49] * 1000, 2),
+        "p99_ms": round(quantiles[98] * 1000, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--clients", type=int, default=64)
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--questions", type=int, default=100)
+    parser.add_argument("--workers", type=int, default=1)
+    args = parser.parse_args()
+    print(asyncio.run(run(args.clients, args.duration, args.questions, args.workers)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""Nearest results search over a synthetic population of results.
+
+Reports the time to fill the index, the search latency percentiles, the cost of adding one
+result and of saving and loading the index file.
+
+python -m benchmarks.match_index --results 1000000 --questions 100
+"""
+
+import argparse
+import os
+import statistics
+import tempfile
+import time
+import uuid
+from pathlib import Path
+
+from k_matcher.domain.answer_vector import AnswerVector
+from k_matcher.domain.match_engine import GRADE_TABLE
+from k_matcher.match_index import CODES, MatchIndex
+
+# Maps random bytes to packed answers
+_RANDOM_CODES = bytes(CODES[value % len(CODES)] for value in range(256))
+
+
+def _vector(question_ids: tuple[int, ...]) -> AnswerVector:
+    return AnswerVector(question_ids, os.urandom(len(question_ids)).translate(_RANDOM_CODES))
+
+
+def run(result_count: int, question_count: int, block_size: int, k: int, searches: int) -> dict:
+    question_ids = tuple(range(1, question_count + 1))
+    index = MatchIndex(block_size)
+    started = time.perf_counter()
+    for start in range(0, result_count, block_size):
+        index.add(
+            [
+                (uuid.uuid4(), _vector(question_ids))
+                for _ in range(min(block_size, result_count - start))
+            ]
+        )
+    fill_seconds = time.perf_counter() - started
+
+    latencies = []
+    for _ in range(searches):
+        vector = _vector(question_ids)
+        started = time.perf_counter()
+        index.nearest(vector, k, GRADE_TABLE)
+        latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    index.add([(uuid.uuid4(), _vector(question_ids))])
+    add_seconds = time.perf_counter() - started
+
+    with tempfile.TemporaryDirectory() as workdir:
+        path = Path(workdir) / "match_index.bin"
+        started = time.perf_counter()
+        index.save(path)
+        save_seconds = time.perf_counter() - started
+        started = time.perf_counter()
+        MatchIndex.load(path)
+        load_seconds = time.perf_counter() - started
+        file_bytes = path.stat().st_size
+
+    quantiles = statistics.quantiles(latencies, n=100)
+    return {
+        "results": result_count,
+        "questions": question_count,
+        "fill_s": round(fill_seconds, 2),
+        "search_p50_ms": round(quantiles[49] * 1000, 2),
+        "search_p99_ms": round(quantiles[98] * 1000, 2),
+        "add_one_us": round(add_seconds * 1e6, 1),
+        "save_s": round(save_seconds, 2),
+        "load_s": round(load_seconds, 2),
+        "file_mib": round(file_bytes / 2**20, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--results", type=int, default=1_000_000)
+    parser.add_argument("--questions", type=int, default=100)
+    parser.add_argument("--block-size", type=int, default=65536)
+    parser.add_argument("-k", type=int, default=10)
+    parser.add_argument("--searches", type=int, default=50)
+    args = parser.parse_args()
+    print(run(args.results, args.questions, args.block_size, args.k, args.searches))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""GET /questions throughput of `k_matcher.serve` for an increasing number of workers.
+
+Load comes from several client processes so the client side is not the bottleneck.
+
+python -m benchmarks.scaling --workers 1,2,4 --duration 10
+"""
+
+import argparse
+import asyncio
+import multiprocessing
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+
+from benchmarks.load_results import (
+    BACKEND_DIR,
+    _fill_questions,
+    _free_port,
+    _wait_until_ready,
+)
+
+
+def _start_server(workdir: Path, port: int, workers: int) -> subprocess.Popen:
+    env = dict(os.environ, PYTHONPATH=str(BACKEND_DIR))
+    command = [sys.executable, "-m", "k_matcher.serve", "--port", str(port)]
+    command += ["--workers", str(workers)]
+    return subprocess.Popen(
+        command, cwd=workdir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+
+
+async def _clients(port: int, clients: int, duration: float) -> tuple[int, int]:
+    requests = errors = 0
+
+    async def client_loop(client: httpx.AsyncClient, deadline: float):
+        nonlocal requests, errors
+        while time.perf_counter() < deadline:
+            try:
+                (await client.get("/questions")).raise_for_status()
+                requests += 1
+            except httpx.HTTPError:
+                errors += 1
+
+    limits = httpx.Limits(max_connections=clients)
+    async with httpx.AsyncClient(
+        base_url=f"http://127.0.0.1:{port}", limits=limits, timeout=10
+    ) as client:
+        deadline = time.perf_counter() + duration
+        await asyncio.gather(*(client_loop(client, deadline) for _ in range(clients)))
+    return requests, errors
+
+
+def _client_process(arguments: tuple[int, int, float]) -> tuple[int, int]:
+    return asyncio.run(_clients(*arguments))
+
+
+async def _wait(port: int):
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}") as client:
+        await _wait_until_ready(client)
+
+
+def run(workers: int, client_processes: int, clients: int, duration: float) -> dict:
+    with tempfile.TemporaryDirectory() as workdir:
+        port = _free_port()
+        server = _start_server(Path(workdir), port, workers)
+        try:
+            asyncio.run(_wait(port))
+            _fill_questions(Path(workdir) / "db.sqlite", 100)
+            with multiprocessing.Pool(client_processes) as pool:
+                started = time.perf_counter()
+                counts = pool.map(_client_process, [(port, clients, duration)] * client_processes)
+                elapsed = time.perf_counter() - started
+        finally:
+            server.terminate()
+            try:
+                server.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                server.kill()
+
+    requests = sum(count for count, _ in counts)
+    return {
+        "workers": workers,
+        "requests": requests,
+        "errors": sum(errors for _, errors in counts),
+        "requests_per_second": round(requests / elapsed, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--workers", default=f"1,{os.cpu_count() or 1}")
+    parser.add_argument("--client-processes", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--clients", type=int, default=16, help="per client process")
+    parser.add_argument("--duration", type=float, default=10)
+    args = parser.parse_args()
+
+    baseline = None
+    for workers in sorted({int(count) for count in args.workers.split(",")}):
+        result = run(workers, args.client_processes, args.clients, args.duration)
+        baseline = baseline or result["requests_per_second"]
+        result["speedup"] = round(result["requests_per_second"] / baseline, 2)
+        print(result)
+
+
+if __name__ == "__main__":
+    main()
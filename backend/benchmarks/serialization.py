@@ -0,0 +1,67 @@
+"""Encode/decode time and allocations of a 500-question MatchList: pydantic vs msgspec.
+
+python -m benchmarks.serialization --questions 500
+"""
+
+import argparse
+import random
+import timeit
+import tracemalloc
+from typing import Callable
+
+import msgspec
+
+from k_matcher.domain.enums import AnswerEnum
+from k_matcher.domain.match_engine import encode_answer
+from k_matcher.domain.question_result import MatchList, match_list_from_vectors
+from k_matcher.domain.structs import MatchListStruct, match_structs_from_vectors
+
+
+def _measure(function: Callable[[], object], number: int) -> dict[str, float]:
+    seconds = min(timeit.repeat(function, number=number, repeat=5)) / number
+    tracemalloc.start()
+    function()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"us": round(seconds * 1e6, 1), "peak_kib": round(peak / 1024, 1)}
+
+
+def run(question_count: int, number: int) -> dict[str, dict[str, float]]:
+    rng = random.Random(0)
+    codes = [encode_answer(answer, if_forced) for answer in AnswerEnum for if_forced in (0, 1)]
+    question_ids = list(range(1, question_count + 1))
+    # Mostly YES/NEED answers, so most questions end up in the MatchList
+    vector_a = bytes(rng.choice(codes[4:]) for _ in question_ids)
+    vector_b = bytes(rng.choice(codes[4:]) for _ in question_ids)
+
+    match = match_list_from_vectors(question_ids, vector_a, vector_b)
+    structs = match_structs_from_vectors(question_ids, vector_a, vector_b)
+    encoded = match.model_dump_json()
+    decoder = msgspec.json.Decoder(MatchListStruct)
+    encoder = msgspec.json.Encoder()
+    return {
+        "matched_questions": {"count": sum(len(g["matches"]) for g in match.root)},
+        "pydantic_build": _measure(
+            lambda: match_list_from_vectors(question_ids, vector_a, vector_b), number
+        ),
+        "msgspec_build": _measure(
+            lambda: match_structs_from_vectors(question_ids, vector_a, vector_b), number
+        ),
+        "pydantic_encode": _measure(match.model_dump_json, number),
+        "msgspec_encode": _measure(lambda: encoder.encode(structs), number),
+        "pydantic_decode": _measure(lambda: MatchList.model_validate_json(encoded), number),
+        "msgspec_decode": _measure(lambda: decoder.decode(encoded), number),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--questions", type=int, default=500)
+    parser.add_argument("--number", type=int, default=200)
+    args = parser.parse_args()
+    for name, values in run(args.questions, args.number).items():
+        print(f"{name:20} {values}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""Cold start of the API process: `python -X importtime -c "import k_matcher.main"`.
+
+Exits with status 1 when the median import time of k_matcher.main is over the budget.
+
+python -m benchmarks.startup --runs 5 --budget-ms 800
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+from collections import defaultdict
+
+from benchmarks.load_results import BACKEND_DIR
+
+STARTUP_BUDGET_MS = 800.0
+MODULE = "k_matcher.main"
+
+
+def _import_times(module: str) -> dict[str, tuple[int, int]]:
+    """Self and cumulative import time in microseconds per module, from one fresh process"""
+    env = dict(os.environ, PYTHONPATH=str(BACKEND_DIR))
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=BACKEND_DIR,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    times = {}
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line.removeprefix("import time:").split("|")
+        times[name.strip()] = (int(self_us), int(cumulative_us))
+    return times
+
+
+def run(runs: int, top: int) -> dict:
+    totals = []
+    self_times: dict[str, list[int]] = defaultdict(list)
+    for _ in range(runs):
+        times = _import_times(MODULE)
+        totals.append(times[MODULE][1] / 1000)
+        for name, (self_us, _) in times.items():
+            self_times[name].append(self_us)
+
+    medians = {name: statistics.median(values) / 1000 for name, values in self_times.items()}
+    slowest = sorted(medians.items(), key=lambda item: item[1], reverse=True)[:top]
+    return {
+        "total_ms": round(statistics.median(totals), 1),
+        "k_matcher_ms": round(
+            sum(ms for name, ms in medians.items() if name.split(".")[0] == "k_matcher"), 1
+        ),
+        "slowest_modules_ms": {name: round(ms, 1) for name, ms in slowest},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--budget-ms", type=float, default=STARTUP_BUDGET_MS)
+    args = parser.parse_args()
+
+    result = run(args.runs, args.top)
+    print(f"import {MODULE}: {result['total_ms']} ms (budget {args.budget_ms} ms)")
+    print(f"  own modules, self time: {result['k_matcher_ms']} ms")
+    for name, ms in result["slowest_modules_ms"].items():
+        print(f"  {name:40} {ms:>8} ms")
+    if result["total_ms"] > args.budget_ms:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
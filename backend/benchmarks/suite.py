@@ -0,0 +1,198 @@
+"""Matching domain and in-process HTTP benchmarks, saved as JSON to compare between commits.
+
+python -m benchmarks.suite
+python -m benchmarks.suite --filter get_match --compare benchmarks/results/<commit>.json
+"""
+
+import argparse
+import json
+import platform
+import random
+import statistics
+import subprocess
+import tempfile
+import timeit
+from datetime import datetime, timezone
+from functools import partial
+from pathlib import Path
+from typing import Callable, Iterator
+
+from fastapi.testclient import TestClient
+from sqlmodel import Session, create_engine
+
+from k_matcher.database import create_db_and_tables, get_session
+from k_matcher.domain.enums import AnswerEnum
+from k_matcher.domain.group_match import grade_group
+from k_matcher.domain.match_engine import pack_answers
+from k_matcher.domain.question_result import (
+    filter_matches,
+    get_match,
+    get_question_results,
+    group_by_min_answer,
+)
+from k_matcher.main import app
+from k_matcher.models.models import AnswerCreate, Question, QuestionCategory
+
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+DOMAIN_SIZES = (10, 100, 1000, 10000)
+HTTP_SIZES = (10, 100, 1000)
+GROUP_SIZE = 20
+
+Benchmark = tuple[str, Callable[[], object]]
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def _measure(function: Callable[[], object], repeat: int) -> dict[str, float]:
+    timer = timeit.Timer(function)
+    number, _ = timer.autorange()
+    timings = [seconds / number for seconds in timer.repeat(repeat=repeat, number=number)]
+    return {
+        "min_us": round(min(timings) * 1e6, 2),
+        "median_us": round(statistics.median(timings) * 1e6, 2),
+        "number": number,
+        "repeat": repeat,
+    }
+
+
+def _answers(rng: random.Random, question_count: int) -> list[AnswerCreate]:
+    return [
+        AnswerCreate(
+            question_id=question_id,
+            answer=rng.choice(list(AnswerEnum)),
+            if_forced=rng.random() < 0.1,
+        )
+        for question_id in range(1, question_count + 1)
+    ]
+
+
+def domain_benchmarks(sizes: tuple[int, ...]) -> Iterator[Benchmark]:
+    rng = random.Random(0)
+    for size in sizes:
+        answers_a, answers_b = _answers(rng, size), _answers(rng, size)
+        question_ids = set(range(1, size + 1))
+        question_results = get_question_results(answers_a, answers_b, question_ids)
+        matches = filter_matches(question_results)
+
+        yield f"domain.get_question_results[{size}]", partial(
+            get_question_results, answers_a, answers_b, question_ids
+        )
+        yield f"domain.filter_matches[{size}]", partial(filter_matches, question_results)
+        yield f"domain.group_by_min_answer[{size}]", partial(group_by_min_answer, matches)
+        yield f"domain.get_match[{size}]", partial(get_match, answers_a, answers_b, question_ids)
+
+        positions = {question_id: i for i, question_id in enumerate(sorted(question_ids))}
+        group = [pack_answers(_answers(rng, size), positions) for _ in range(GROUP_SIZE)]
+        yield f"domain.grade_group[{size}]", partial(grade_group, group)
+
+
+def http_benchmarks(sizes: tuple[int, ...], workdir: Path) -> Iterator[Benchmark]:
+    engine = create_engine(
+        f"sqlite:///{workdir / 'benchmark.sqlite'}", connect_args={"check_same_thread": False}
+    )
+    create_db_and_tables(engine)
+    with Session(engine) as session:
+        session.bulk_insert_mappings(
+            QuestionCategory, [{"id": 1, "name": "category"}]  # type: ignore
+        )
+        session.bulk_insert_mappings(
+            Question,  # type: ignore
+            [
+                {"id": i, "text": f"question {i}", "category_id": 1}
+                for i in range(1, max(sizes) + 1)
+            ],
+        )
+        session.commit()
+
+    def get_session_override():
+        with Session(engine) as session:
+            yield session
+
+    app.dependency_overrides[get_session] = get_session_override
+    client = TestClient(app)
+    rng = random.Random(0)
+    try:
+        for size in sizes:
+            payload_a = {"answers": [a.model_dump(mode="json") for a in _answers(rng, size)]}
+            payload_b = {"answers": [a.model_dump(mode="json") for a in _answers(rng, size)]}
+            result_id = client.post("/results", json=payload_a).raise_for_status().json()["id"]
+            match_payload = payload_b | {"partner_id": result_id}
+            client.post("/results", json=match_payload).raise_for_status()
+
+            yield f"http.create_result[{size}]", partial(client.post, "/results", json=payload_a)
+            yield f"http.match_result[{size}]", partial(client.post, "/results", json=match_payload)
+            yield f"http.get_result[{size}]", partial(client.get, f"/results/{result_id}")
+    finally:
+        app.dependency_overrides.clear()
+        engine.dispose()
+
+
+def run(
+    domain_sizes: tuple[int, ...], http_sizes: tuple[int, ...], name_filter: str, repeat: int
+) -> dict[str, dict[str, float]]:
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        benchmarks = [domain_benchmarks(domain_sizes)]
+        if http_sizes:
+            benchmarks.append(http_benchmarks(http_sizes, Path(workdir)))
+        for group in benchmarks:
+            for name, function in group:
+                if name_filter not in name:
+                    continue
+                results[name] = _measure(function, repeat)
+                print(f"{name:40} {results[name]['median_us']:>14.2f} us")
+    return results
+
+
+def compare(results: dict[str, dict[str, float]], baseline_path: Path, threshold: float):
+    baseline = json.loads(baseline_path.read_text())["benchmarks"]
+    print(f"\nCompared with {baseline_path.name} (median, new / old):")
+    for name, values in results.items():
+        if name not in baseline:
+            continue
+        ratio = values["median_us"] / baseline[name]["median_us"]
+        marker = "  slower" if ratio > 1 + threshold else ""
+        print(f"{name:40} {ratio:>8.2f}x{marker}")
+
+
+def _sizes(value: str) -> tuple[int, ...]:
+    return tuple(int(size) for size in value.split(",") if size)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--domain-sizes", type=_sizes, default=DOMAIN_SIZES)
+    parser.add_argument("--http-sizes", type=_sizes, default=HTTP_SIZES)
+    parser.add_argument("--filter", default="", help="only run benchmarks containing this text")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", type=Path, help="defaults to results/<commit>.json")
+    parser.add_argument("--compare", type=Path, help="a previously saved results file")
+    parser.add_argument("--threshold", type=float, default=0.1)
+    args = parser.parse_args()
+
+    commit = _git_commit()
+    results = run(args.domain_sizes, args.http_sizes, args.filter, args.repeat)
+    output = args.output or RESULTS_DIR / f"{commit}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    document = {
+        "commit": commit,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "benchmarks": results,
+    }
+    output.write_text(json.dumps(document, indent=2))
+    print(f"\nSaved to {output}")
+    if args.compare:
+        compare(results, args.compare, args.threshold)
+
+
+if __name__ == "__main__":
+    main()
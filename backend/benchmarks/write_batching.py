@@ -0,0 +1,113 @@
+"""New result commits from concurrent writer threads, with and without group commit.
+
+Each thread stands in for a POST /results request: it writes one result with its answers and
+waits for the commit. Reports results and transactions per second and the latency percentiles.
+
+python -m benchmarks.write_batching --threads 32 --duration 5 --profile safe
+"""
+
+import argparse
+import statistics
+import tempfile
+import threading
+import time
+import uuid
+from pathlib import Path
+
+from sqlalchemy import Engine
+from sqlmodel import create_engine
+
+from benchmarks.load_results import _fill_questions
+from k_matcher.config import DatabaseConfig
+from k_matcher.database import create_db_and_tables, set_sqlite_pragma
+from k_matcher.domain.enums import AnswerEnum
+from k_matcher.domain.pairing_code import new_pairing_code
+from k_matcher.write_batcher import NewResult, WriteBatcher, insert_results
+
+
+def _new_result(question_count: int) -> NewResult:
+    result_id = uuid.uuid4()
+    return NewResult(
+        {"id": result_id, "pairing_code": new_pairing_code()},
+        [
+            {"result_id": result_id, "question_id": question_id, "answer": AnswerEnum.YES}
+            for question_id in range(1, question_count + 1)
+        ],
+    )
+
+
+def _engine(path: Path, profile: str, threads: int) -> Engine:
+    engine = create_engine(
+        f"sqlite:///{path}",
+        connect_args={"check_same_thread": False},
+        pool_size=threads,
+        max_overflow=-1,
+    )
+    settings = DatabaseConfig(profile=profile, echo=False)  # type: ignore[arg-type]
+    create_db_and_tables(engine)
+    engine.dispose()
+    set_sqlite_pragma(engine, settings)
+    return engine
+
+
+def run(batching: bool, threads: int, duration: float, question_count: int, profile: str) -> dict:
+    with tempfile.TemporaryDirectory() as workdir:
+        path = Path(workdir) / "db.sqlite"
+        engine = _engine(path, profile, threads)
+        _fill_questions(path, question_count)
+        batcher = WriteBatcher(engine, 0.002, threads) if batching else None
+        latencies: list[float] = []
+        transactions = 0
+        lock = threading.Lock()
+        deadline = time.perf_counter() + duration
+
+        def writer():
+            nonlocal transactions
+            while time.perf_counter() < deadline:
+                new_result = _new_result(question_count)
+                started = time.perf_counter()
+                if batcher is not None:
+                    batcher.write(new_result)
+                else:
+                    with engine.begin() as connection:
+                        insert_results(connection, [new_result])
+                with lock:
+                    latencies.append(time.perf_counter() - started)
+                    transactions += batcher is None
+
+        workers = [threading.Thread(target=writer) for _ in range(threads)]
+        started = time.perf_counter()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        elapsed = time.perf_counter() - started
+        if batcher is not None:
+            batcher.close()
+            transactions = batcher.batches
+        engine.dispose()
+
+    quantiles = statistics.quantiles(latencies, n=100)
+    return {
+        "batching": batching,
+        "results_per_second": round(len(latencies) / elapsed, 1),
+        "commits_per_second": round(transactions / elapsed, 1),
+        "p50_ms": round(quantiles[49] * 1000, 2),
+        "p99_ms": round(quantiles[98] * 1000, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--threads", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=5)
+    parser.add_argument("--questions", type=int, default=100)
+    parser.add_argument("--profile", choices=["safe", "fast"], default="safe")
+    args = parser.parse_args()
+
+    for batching in (False, True):
+        print(run(batching, args.threads, args.duration, args.questions, args.profile))
+
+
+if __name__ == "__main__":
+    main()
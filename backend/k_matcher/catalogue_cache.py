@@ -0,0 +1,72 @@
+import hashlib
+import threading
+from typing import Callable, Hashable, NamedTuple
+
+from pydantic import BaseModel
+
+
+class CachedResponse(NamedTuple):
+    body: bytes
+    etag: str
+
+
+class CacheStats(BaseModel):
+    version: int | None
+    entries: int
+    size_bytes: int
+    hits: int
+    misses: int
+    hit_rate: float
+
+
+class CatalogueCache:
+    """Serialized catalogue responses, dropped whenever the catalogue version changes"""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._version: int | None = None
+        self._entries: dict[Hashable, CachedResponse] = {}
+        self._hits = 0
+        self._misses = 0
+
+    def get(self, key: Hashable, version: int, build: Callable[[], bytes]) -> CachedResponse:
+        with self._lock:
+            if version != self._version:
+                self._entries.clear()
+                self._version = version
+            cached = self._entries.get(key)
+            if cached is not None:
+                self._hits += 1
+                return cached
+            self._misses += 1
+
+        body = build()
+        cached = CachedResponse(
+            body, f'"{version}-{hashlib.blake2b(body, digest_size=8).hexdigest()}"'
+        )
+        with self._lock:
+            if version == self._version:
+                self._entries[key] = cached
+        return cached
+
+    def clear(self):
+        with self._lock:
+            self._version = None
+            self._entries.clear()
+            self._hits = 0
+            self._misses = 0
+
+    def stats(self) -> CacheStats:
+        with self._lock:
+            requests = self._hits + self._misses
+            return CacheStats(
+                version=self._version,
+                entries=len(self._entries),
+                size_bytes=sum(len(cached.body) for cached in self._entries.values()),
+                hits=self._hits,
+                misses=self._misses,
+                hit_rate=self._hits / requests if requests else 0.0,
+            )
+
+
+catalogue_cache = CatalogueCache()
@@ -1,18 +1,134 @@
+import functools
 import os
 from pathlib import Path
-from typing import Any
+from typing import Any, Literal
 
+from pydantic import BaseModel, Field, model_validator
 from pydantic_settings import BaseSettings
-from yaml import safe_load
+
+from k_matcher.domain.match_rules import MatchRules
 
 
 class HttpConfig(BaseSettings):
     allow_origins: list[str]
+    # Encoder for the results and questions responses, "pydantic" is kept for comparison
+    serializer: Literal["msgspec", "pydantic"] = "msgspec"
+
+
+# "safe" keeps SQLite defaults and SQL echo, "fast" is tuned for concurrent production load
+DATABASE_PROFILES: dict[str, dict[str, Any]] = {
+    "safe": {"echo": True},
+    "fast": {
+        "echo": False,
+        "auto_vacuum": "INCREMENTAL",
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "busy_timeout": 30000,
+        "mmap_size": 256 * 1024 * 1024,
+        "cache_size": -64 * 1024,
+        "pool_size": 10,
+    },
+}
+
+
+class DatabaseConfig(BaseModel):
+    profile: Literal["safe", "fast"] = "fast"
+    echo: bool = False
+    # None leaves the SQLite default in place. auto_vacuum only applies to a new database
+    # (or after a VACUUM), INCREMENTAL lets the retention job give pages back to the OS
+    auto_vacuum: Literal["NONE", "FULL", "INCREMENTAL"] | None = None
+    journal_mode: Literal["DELETE", "TRUNCATE", "PERSIST", "MEMORY", "WAL", "OFF"] | None = None
+    synchronous: Literal["OFF", "NORMAL", "FULL", "EXTRA"] | None = None
+    busy_timeout: int | None = Field(default=None, ge=0)  # milliseconds
+    mmap_size: int | None = Field(default=None, ge=0)  # bytes
+    cache_size: int | None = None  # pages, or KiB when negative
+    pool_size: int = Field(default=5, ge=1)
+    # "binary" stores result ids as 16-byte blobs instead of 32-char hex, for new databases only
+    uuid_storage: Literal["text", "binary"] = "text"
+
+    @model_validator(mode="before")
+    @classmethod
+    def apply_profile(cls, data: Any) -> Any:
+        if isinstance(data, dict):
+            data = {**DATABASE_PROFILES.get(data.get("profile", "fast"), {}), **data}
+        return data
+
+
+class RetentionConfig(BaseModel):
+    # Results without a match are deleted this long after they were created
+    ttl_days: int = Field(default=30, ge=1)
+    batch_size: int = Field(default=500, ge=1)
+    # Pause between delete batches so that the API's writers get the lock in between
+    batch_pause_ms: int = Field(default=50, ge=0)
+
+
+class ServerConfig(BaseModel):
+    host: str = "0.0.0.0"
+    port: int = 8000
+    # None starts one worker process per CPU
+    workers: int | None = Field(default=None, ge=1)
+
+
+class InstrumentationConfig(BaseModel):
+    # Stage timers, Server-Timing headers, /metrics and /debug/profiling. Metrics and the
+    # sample rate are kept per worker process
+    enabled: bool = False
+    # Fraction of requests run under cProfile, can be changed at runtime via /debug/profiling
+    profile_sample_rate: float = Field(default=0.0, ge=0, le=1)
+    profile_dir: str = "profiles"
+    # Bearer token for PUT /debug/profiling, the sample rate is config only without one
+    profiling_token: str | None = None
+
+
+class MatchCacheConfig(BaseModel):
+    # "memory" is per worker process: with several workers a GET can return a match that
+    # another worker has replaced, until the entry expires. "redis" is shared by all workers.
+    backend: Literal["off", "memory", "redis"] = "off"
+    eviction: Literal["lru", "fifo"] = "lru"
+    max_entries: int = Field(default=10000, ge=1)
+    max_bytes: int = Field(default=64 * 1024 * 1024, ge=0)
+    ttl_seconds: float = Field(default=3600, gt=0)
+    redis_url: str = "redis://localhost:6379/0"
+    key_prefix: str = "k_matcher:"
+
+
+class ExportConfig(BaseModel):
+    # Bearer token for GET /export/{kind}, the endpoint is disabled without one
+    token: str | None = None
+    # Rows fetched from the cursor and encoded per chunk
+    batch_size: int = Field(default=1000, ge=1)
+
+
+class WriteBatchingConfig(BaseModel):
+    # Group commit for POST /results: new results arriving within flush_window_ms of the
+    # first one, up to max_batch_size of them, are committed in one transaction
+    enabled: bool = False
+    flush_window_ms: float = Field(default=2.0, ge=0)
+    max_batch_size: int = Field(default=32, ge=1)
+
+
+class MatchIndexConfig(BaseModel):
+    # In-process index behind GET /results/{id}/nearest, saved to path on shutdown and loaded
+    # on startup. Every worker process holds its own copy in memory.
+    enabled: bool = False
+    path: str = "match_index.bin"
+    block_size: int = Field(default=65536, ge=8)
+    # Results created by other workers are picked up at most this often
+    refresh_interval_seconds: float = Field(default=5, ge=0)
 
 
 class Config(BaseSettings):
     http: HttpConfig
     sqlite_file_name: str
+    database: DatabaseConfig = Field(default_factory=DatabaseConfig)
+    server: ServerConfig = Field(default_factory=ServerConfig)
+    retention: RetentionConfig = Field(default_factory=RetentionConfig)
+    instrumentation: InstrumentationConfig = Field(default_factory=InstrumentationConfig)
+    matching: MatchRules = Field(default_factory=MatchRules)
+    match_cache: MatchCacheConfig = Field(default_factory=MatchCacheConfig)
+    export: ExportConfig = Field(default_factory=ExportConfig)
+    write_batching: WriteBatchingConfig = Field(default_factory=WriteBatchingConfig)
+    match_index: MatchIndexConfig = Field(default_factory=MatchIndexConfig)
 
 
 def load_config(path: Path | None = None) -> Config:
@@ -22,6 +138,8 @@ def load_config(path: Path | None = None) -> Config:
 
 
 def load_yaml(path: Path) -> dict[str, Any]:
+    from yaml import safe_load
+
     with open(path, 'r') as f:
         config = safe_load(f)
     if not isinstance(config, dict):
@@ -29,4 +147,7 @@ def load_yaml(path: Path) -> dict[str, Any]:
     return config
 
 
-config = load_config()
+@functools.cache
+def get_config() -> Config:
+    """The config file is read on first use rather than on import"""
+    return load_config()
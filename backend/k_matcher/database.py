@@ -1,28 +1,128 @@
-from sqlalchemy import event
+import functools
+import os
+
+from sqlalchemy import event, inspect, text
 from sqlalchemy.engine import Engine
 from sqlmodel import Session, SQLModel, create_engine
 
-from k_matcher.config import config
+from k_matcher.config import DatabaseConfig, get_config
+
+
+@functools.cache
+def get_engine() -> Engine:
+    settings = get_config()
+    # Sync endpoints run in the threadpool; an unbounded overflow keeps threads waiting on a
+    # pooled connection from starving the ones that have to give theirs back.
+    return create_engine(
+        f"sqlite:///{settings.sqlite_file_name}",
+        echo=settings.database.echo,
+        connect_args={"check_same_thread": False},
+        pool_size=settings.database.pool_size,
+        max_overflow=-1,
+    )
+
+
+def sqlite_pragmas(settings: DatabaseConfig) -> list[str]:
+    pragmas = ["PRAGMA foreign_keys=ON"]
+    for name in (
+        "auto_vacuum",
+        "journal_mode",
+        "synchronous",
+        "busy_timeout",
+        "mmap_size",
+        "cache_size",
+    ):
+        value = getattr(settings, name)
+        if value is not None:
+            pragmas.append(f"PRAGMA {name}={value}")
+    return pragmas
 
-sqlite_url = f"sqlite:///{config.sqlite_file_name}"
-connect_args = {"check_same_thread": False}
-engine = create_engine(sqlite_url, echo=True, connect_args=connect_args)
 
+def set_sqlite_pragma(engine: Engine, settings: DatabaseConfig | None = None):
+    pragmas = sqlite_pragmas(settings or get_config().database)
 
-def set_sqlite_pragma(engine: Engine):
     @event.listens_for(engine, "connect")
     def _set_sqlite_pragma(dbapi_connection, connection_record):
-        """Enable foreign key constraints for SQLite"""
+        """Enable foreign key constraints and apply the configured tuning for SQLite"""
         cursor = dbapi_connection.cursor()
-        cursor.execute("PRAGMA foreign_keys=ON")
+        for pragma in pragmas:
+            cursor.execute(pragma)
         cursor.close()
 
 
+CATALOGUE_VERSION_TRIGGERS = [
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {table}_{operation}_catalogue_version
+    AFTER {operation} ON {table}
+    BEGIN
+        UPDATE catalogue_version SET version = version + 1 WHERE id = 1;
+    END
+    """
+    for table in ("question", "question_category")
+    for operation in ("INSERT", "UPDATE", "DELETE")
+]
+
+
+# Numbers results for incremental exports: writers are serialized, so unlike created_at a
+# later commit always gets a higher number
+_NEXT_CHANGE = "(SELECT value FROM change_sequence WHERE id = 1)"
+CHANGE_SEQUENCE_TRIGGERS = [
+    f"""
+    CREATE TRIGGER IF NOT EXISTS result_{name}_change_sequence
+    AFTER {operation} ON result
+    BEGIN
+        UPDATE change_sequence SET value = value + 1 WHERE id = 1;
+        UPDATE result SET {assignments} WHERE id = NEW.id;
+    END
+    """
+    for name, operation, assignments in (
+        ("insert", "INSERT", f"created_seq = {_NEXT_CHANGE}, updated_seq = {_NEXT_CHANGE}"),
+        ("match", "UPDATE OF matching_result", f"updated_seq = {_NEXT_CHANGE}"),
+    )
+]
+
+
+# Indexes added to existing tables, which create_all leaves alone
+LATE_INDEXES = ["CREATE INDEX IF NOT EXISTS ix_result_created_at ON result (created_at)"]
+
+
 def create_db_and_tables(engine: Engine):
     set_sqlite_pragma(engine)
     SQLModel.metadata.create_all(engine)
+    with engine.begin() as connection:
+        for table, column in (("catalogue_version", "version"), ("change_sequence", "value")):
+            connection.execute(text(f"INSERT OR IGNORE INTO {table} (id, {column}) VALUES (1, 0)"))
+        for statement in (*CATALOGUE_VERSION_TRIGGERS, *CHANGE_SEQUENCE_TRIGGERS, *LATE_INDEXES):
+            connection.execute(text(statement))
+
+
+def check_schema(engine: Engine):
+    """Fails fast on a database created before columns were added to its existing tables,
+    instead of every insert failing later"""
+    inspector = inspect(engine)
+    table_names = set(inspector.get_table_names())
+    missing = [
+        f"{table.name}.{column.name}"
+        for table in SQLModel.metadata.sorted_tables
+        if table.name in table_names
+        for column in table.columns
+        if column.name not in {existing["name"] for existing in inspector.get_columns(table.name)}
+    ]
+    if missing:
+        raise RuntimeError(
+            f"The database lacks the columns {', '.join(missing)}; "
+            "run python -m k_matcher.tools.migrate first"
+        )
+
+
+# Set by the launcher once it has created the schema, so worker processes skip it
+SCHEMA_READY_ENV = "K_MATCHER_SCHEMA_READY"
+
+
+def schema_ready() -> bool:
+    return os.environ.get(SCHEMA_READY_ENV) == "1"
 
 
 def get_session():
-    with Session(engine) as session:
+    with Session(get_engine()) as session:
         yield session
@@ -0,0 +1,79 @@
+import struct
+from functools import lru_cache
+from typing import Iterable, NamedTuple
+
+from k_matcher.domain.answer import AnswerBase
+from k_matcher.domain.match_engine import pack_answers
+
+# Blob layout: 4-byte big-endian bitmap length, the question id bitmap (bit N of
+# byte N // 8 is set when question N is answered), then the packed answers of
+# the answered questions in ascending id order, two 4-bit answers per byte.
+# When a few high ids would make the bitmap larger than listing them, the top bit
+# of the length is set and the question ids follow as 4-byte big-endian ints.
+_BITMAP_LENGTH_SIZE = 4
+_ID_LIST_FLAG = 1 << 31
+_ID_SIZE = 4
+_HIGH_NIBBLE = bytes(code >> 4 for code in range(256))
+_LOW_NIBBLE = bytes(code & 0x0F for code in range(256))
+
+
+class AnswerVector(NamedTuple):
+    question_ids: tuple[int, ...]
+    answers: bytes
+
+
+def vector_from_answers(answers: Iterable[AnswerBase]) -> AnswerVector:
+    answers = list(answers)
+    question_ids = tuple(sorted({answer.question_id for answer in answers}))
+    positions = {question_id: i for i, question_id in enumerate(question_ids)}
+    return AnswerVector(question_ids, pack_answers(answers, positions))
+
+
+def _encode_question_ids(question_ids: tuple[int, ...]) -> bytes:
+    bitmap_size = (question_ids[-1] // 8 + 1) if question_ids else 0
+    if _ID_SIZE * len(question_ids) < bitmap_size:
+        ids = b"".join(question_id.to_bytes(_ID_SIZE) for question_id in question_ids)
+        return (_ID_LIST_FLAG | len(ids)).to_bytes(_BITMAP_LENGTH_SIZE) + ids
+    bitmap = bytearray(bitmap_size)
+    for question_id in question_ids:
+        bitmap[question_id >> 3] |= 1 << (question_id & 7)
+    return bitmap_size.to_bytes(_BITMAP_LENGTH_SIZE) + bitmap
+
+
+def encode_answer_vector(vector: AnswerVector) -> bytes:
+    answers = vector.answers + b"\0" * (len(vector.answers) % 2)
+    high, low = answers[0::2], answers[1::2]
+    packed = ((int.from_bytes(high) << 4) | int.from_bytes(low)).to_bytes(len(high))
+    return _encode_question_ids(vector.question_ids) + packed
+
+
+@lru_cache(maxsize=64)
+def _question_ids_from_bitmap(bitmap: bytes) -> tuple[int, ...]:
+    return tuple(
+        byte_index * 8 + bit
+        for byte_index, byte in enumerate(bitmap)
+        if byte
+        for bit in range(8)
+        if byte >> bit & 1
+    )
+
+
+@lru_cache(maxsize=64)
+def _question_ids_from_list(ids: bytes) -> tuple[int, ...]:
+    return struct.unpack(f">{len(ids) // _ID_SIZE}I", ids)
+
+
+def decode_answer_vector(blob: bytes) -> AnswerVector:
+    length = int.from_bytes(blob[:_BITMAP_LENGTH_SIZE])
+    bitmap_end = _BITMAP_LENGTH_SIZE + (length & ~_ID_LIST_FLAG)
+    ids = blob[_BITMAP_LENGTH_SIZE:bitmap_end]
+    if length & _ID_LIST_FLAG:
+        question_ids = _question_ids_from_list(ids)
+    else:
+        question_ids = _question_ids_from_bitmap(ids)
+
+    packed = blob[bitmap_end:]
+    answers = bytearray(len(packed) * 2)
+    answers[0::2] = packed.translate(_HIGH_NIBBLE)
+    answers[1::2] = packed.translate(_LOW_NIBBLE)
+    return AnswerVector(question_ids, bytes(answers[: len(question_ids)]))
@@ -0,0 +1,121 @@
+from typing import Sequence
+
+from pydantic import BaseModel, RootModel
+from typing_extensions import TypedDict
+
+from k_matcher.domain.answer import Answer
+from k_matcher.domain.match_engine import (
+    ANSWER_MASK,
+    FORCED_FLAG,
+    GRADE_TABLE,
+    NO_MATCH,
+)
+from k_matcher.domain.question_result import PACKED_ANSWERS, positions_by_grade
+
+
+class GroupQuestionResult(BaseModel):
+    question_id: int
+    # In the order of the participants
+    answers: list[Answer]
+
+
+class GroupGradedMatch(TypedDict):
+    min_answer: int
+    matches: list[GroupQuestionResult]
+
+
+class GroupMatchList(RootModel):
+    root: list[GroupGradedMatch]
+
+
+# Packed answers as one-hot bits: unforced answers in the first table, forced in the second,
+# so that OR-ing whole vectors collects the distinct answers given to each question
+_UNFORCED_BITS = bytes(
+    1 << (code & ANSWER_MASK) if code < FORCED_FLAG else 0 for code in range(256)
+)
+_FORCED_BITS = bytes(
+    1 << (code & ANSWER_MASK) if FORCED_FLAG <= code < 2 * FORCED_FLAG else 0 for code in range(256)
+)
+
+
+def grade_group(vectors: Sequence[bytes], grade_table: bytes = GRADE_TABLE) -> bytes:
+    """Grade every question for the whole group at once: one byte per position, the lowest
+    grade between any two participants or NO_MATCH if any two of them don't match.
+
+    One pass over the participants collects which answers each question got, and which of
+    them more than once, as one bit per position and answer. Every pair of distinct answers
+    is then graded once for all positions, so the work grows with the group size and not with
+    the number of pairs of participants.
+    """
+    if len({len(vector) for vector in vectors}) > 1:
+        raise ValueError("Answer vectors have different lengths")
+    if len(vectors) < 2:
+        raise ValueError("A group has at least two participants")
+    unforced = forced = repeated_unforced = repeated_forced = 0
+    for vector in vectors:
+        vector_unforced = int.from_bytes(vector.translate(_UNFORCED_BITS))
+        vector_forced = int.from_bytes(vector.translate(_FORCED_BITS))
+        repeated_unforced |= unforced & vector_unforced
+        repeated_forced |= forced & vector_forced
+        unforced |= vector_unforced
+        forced |= vector_forced
+
+    # Per answer code, 1 in the byte of every position where someone gave that answer
+    length = len(vectors[0])
+    ones = int.from_bytes(b"\x01" * length)
+    given: dict[int, int] = {}
+    repeated: dict[int, int] = {}
+    for value in range(ANSWER_MASK + 1):
+        for code, bits, repeated_bits in (
+            (value, unforced, repeated_unforced),
+            (FORCED_FLAG | value, forced, repeated_forced),
+        ):
+            if positions := (bits >> value) & ones:
+                given[code] = positions
+                repeated[code] = (repeated_bits >> value) & ones
+
+    graded: dict[int, int] = {}
+    codes = sorted(given)
+    for i, code_a in enumerate(codes):
+        for code_b in codes[i:]:
+            # An answer only has to match itself where more than one participant gave it
+            both = repeated[code_a] if code_a == code_b else given[code_a] & given[code_b]
+            if both:
+                grade = grade_table[(code_a << 4) | code_b]
+                graded[grade] = graded.get(grade, 0) | both
+
+    # Each position is 0 or 1, so multiplying never carries into the next byte; lower grades
+    # overwrite higher ones and any pair that doesn't match overwrites them all
+    no_match = graded.pop(NO_MATCH, 0)
+    grades = 0
+    for grade in sorted(graded, reverse=True):
+        positions = graded[grade]
+        grades = grades & ~(positions * 0xFF) | positions * grade
+    grades |= no_match * NO_MATCH
+    return grades.to_bytes(length)
+
+
+def group_match_list(
+    question_ids: Sequence[int],
+    vectors: Sequence[bytes],
+    grade_table: bytes = GRADE_TABLE,
+    seed: int | None = None,
+) -> GroupMatchList:
+    """Questions every participant matches on, grouped by grade and shuffled within a grade"""
+    return GroupMatchList.model_construct(
+        root=[
+            GroupGradedMatch(
+                min_answer=min_answer,
+                matches=[
+                    GroupQuestionResult.model_construct(
+                        question_id=question_ids[position],
+                        answers=[PACKED_ANSWERS[vector[position]] for vector in vectors],
+                    )
+                    for position in positions
+                ],
+            )
+            for min_answer, positions in positions_by_grade(
+                grade_group(vectors, grade_table), seed
+            ).items()
+        ]
+    )
@@ -0,0 +1,92 @@
+from typing import Iterable, Mapping
+
+from k_matcher.domain.answer import AnswerBase
+from k_matcher.domain.enums import AnswerEnum
+
+# Answers are packed one byte per question: bits 0-2 hold the answer value and
+# bit 3 the if_forced flag, so every packed answer fits into a nibble.
+ANSWER_MASK = 0x07
+FORCED_FLAG = 0x08
+NO_MATCH = 0xFF
+_UNANSWERED = 0x10
+
+
+def encode_answer(answer: AnswerEnum, if_forced: bool) -> int:
+    return answer.value | (FORCED_FLAG if if_forced else 0)
+
+
+ENCODED_ANSWERS = {
+    (answer, if_forced): encode_answer(answer, if_forced)
+    for answer in AnswerEnum
+    for if_forced in (False, True)
+}
+
+
+def pack_answers(answers: Iterable[AnswerBase], positions: dict[int, int]) -> bytes:
+    vector = bytearray([_UNANSWERED]) * len(positions)
+    for answer in answers:
+        position = positions.get(answer.question_id)
+        if position is not None:
+            vector[position] = ENCODED_ANSWERS[answer.answer, answer.if_forced]
+    if _UNANSWERED in vector:
+        missing_position = vector.index(_UNANSWERED)
+        raise KeyError(next(qid for qid, pos in positions.items() if pos == missing_position))
+    return bytes(vector)
+
+
+def _grade(value_a: int, value_b: int) -> int:
+    low, high = min(value_a, value_b), max(value_a, value_b)
+    if low <= AnswerEnum.NEVER.value:
+        return NO_MATCH
+    if high >= AnswerEnum.NEED.value or low > AnswerEnum.NO_DESIRE.value:
+        return low
+    return NO_MATCH
+
+
+def build_grade_table(
+    pair_grades: Mapping[tuple[int, int], int | None] | None = None, forced_grade_offset: int = 0
+) -> bytes:
+    """Compile the matching rules into a table indexed by (packed_a << 4) | packed_b.
+
+    pair_grades overrides the default grade of an answer pair (None for no match) and
+    forced_grade_offset is added to a match grade once per if_forced answer.
+    """
+    pair_grades = pair_grades or {}
+    table = bytearray([NO_MATCH]) * 256
+    valid_values = {answer.value for answer in AnswerEnum}
+    for code in range(256):
+        value_a, value_b = (code >> 4) & ANSWER_MASK, code & ANSWER_MASK
+        if value_a not in valid_values or value_b not in valid_values:
+            continue
+        pair = (min(value_a, value_b), max(value_a, value_b))
+        grade = pair_grades[pair] if pair in pair_grades else _grade(value_a, value_b)
+        if grade is None or grade == NO_MATCH:
+            continue
+        forced_answers = ((code >> 4) & FORCED_FLAG > 0) + (code & FORCED_FLAG > 0)
+        grade = min(grade + forced_grade_offset * forced_answers, AnswerEnum.NEED.value)
+        # A match weighted below the lowest grade is not a match anymore
+        if grade >= AnswerEnum.NO_DESIRE.value:
+            table[code] = grade
+    return bytes(table)
+
+
+# Default rules: the min answer value of a match or NO_MATCH
+GRADE_TABLE = build_grade_table()
+
+
+def grade_vectors(vector_a: bytes, vector_b: bytes, grade_table: bytes = GRADE_TABLE) -> bytes:
+    """Grade every question at once: one byte per position, its grade or NO_MATCH"""
+    if len(vector_a) != len(vector_b):
+        raise ValueError("Answer vectors have different lengths")
+    # Packed answers are nibbles, so shifting one side by 4 bits never carries
+    # into the neighbouring byte and each byte becomes a grade table index.
+    codes = (int.from_bytes(vector_a) << 4) | int.from_bytes(vector_b)
+    return codes.to_bytes(len(vector_a)).translate(grade_table)
+
+
+# Every grade a grade table can hold, in descending order, as used for ranking
+GRADES = tuple(range(AnswerEnum.NEED.value, AnswerEnum.NO_DESIRE.value - 1, -1))
+
+
+def count_grades(grades: bytes) -> dict[int, int]:
+    return {grade: count for grade in GRADES if (count := grades.count(grade))}
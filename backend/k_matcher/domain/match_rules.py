@@ -0,0 +1,36 @@
+from typing import Annotated
+
+from pydantic import BaseModel, Field, field_validator
+
+from k_matcher.domain.enums import AnswerEnum
+from k_matcher.domain.match_engine import build_grade_table
+
+Grade = Annotated[int, Field(ge=AnswerEnum.NO_DESIRE.value, le=AnswerEnum.NEED.value)]
+
+
+def _parse_pair(pair: str) -> tuple[int, int]:
+    names = pair.split("+")
+    if len(names) != 2 or not all(name.strip() in AnswerEnum.__members__ for name in names):
+        raise ValueError(f"Expected a pair of answers like MAYBE+MAYBE, got {pair!r}")
+    value_a, value_b = (AnswerEnum[name.strip()].value for name in names)
+    return min(value_a, value_b), max(value_a, value_b)
+
+
+class MatchRules(BaseModel):
+    """Overrides of the default matching rules, compiled once into a grade table"""
+
+    # "MAYBE+MAYBE": grade, or null for no match; the order of the answers doesn't matter
+    pairs: dict[str, Grade | None] = {}
+    # Added to the grade once per if_forced answer; a match below NO_DESIRE is dropped
+    forced_grade_offset: int = Field(default=0, ge=-3, le=3)
+
+    @field_validator("pairs")
+    @classmethod
+    def check_pairs(cls, pairs: dict[str, int | None]) -> dict[str, int | None]:
+        for pair in pairs:
+            _parse_pair(pair)
+        return pairs
+
+    def grade_table(self) -> bytes:
+        pair_grades = {_parse_pair(pair): grade for pair, grade in self.pairs.items()}
+        return build_grade_table(pair_grades, self.forced_grade_offset)
@@ -0,0 +1,17 @@
+import re
+import secrets
+
+# Lowercase letters and digits without the easily confused 0/o, 1/i/l
+PAIRING_CODE_ALPHABET = "23456789abcdefghjkmnpqrstuvwxyz"
+PAIRING_CODE_LENGTH = 10
+# New codes drawn before giving up when the ones drawn are already taken
+PAIRING_CODE_ATTEMPTS = 3
+_PAIRING_CODE = re.compile(f"[{PAIRING_CODE_ALPHABET}]{{{PAIRING_CODE_LENGTH}}}")
+
+
+def new_pairing_code() -> str:
+    return "".join(secrets.choice(PAIRING_CODE_ALPHABET) for _ in range(PAIRING_CODE_LENGTH))
+
+
+def is_pairing_code(value: str) -> bool:
+    return _PAIRING_CODE.fullmatch(value) is not None
@@ -1,11 +1,20 @@
+import hashlib
 import random
 from collections import defaultdict
-from typing import Sequence
+from typing import Any, Callable, Sequence
 
 from pydantic import BaseModel, RootModel
 from typing_extensions import TypedDict
 
 from k_matcher.domain.answer import Answer, AnswerBase, AnswerEnum
+from k_matcher.domain.match_engine import (
+    ENCODED_ANSWERS,
+    GRADE_TABLE,
+    NO_MATCH,
+    encode_answer,
+    grade_vectors,
+    pack_answers,
+)
 
 
 class QuestionResult(BaseModel):
@@ -17,42 +26,63 @@ class QuestionResult(BaseModel):
         return f"{self.question_id}: ({self.answer_a.answer}, {self.answer_b.answer})"
 
 
-def _is_match(result: QuestionResult) -> bool:
-    answer_values = [result.answer_a.answer.value, result.answer_b.answer.value]
-    if min(answer_values) <= AnswerEnum.NEVER.value:
-        return False
-    if max(answer_values) >= AnswerEnum.NEED.value:
-        return True
-    return all(map(lambda value: value > AnswerEnum.NO_DESIRE.value, answer_values))
+def match_seed(*keys: str | bytes) -> int:
+    """A shuffle seed that is always the same for the same keys, e.g. two result ids"""
+    digest = hashlib.blake2b(digest_size=8)
+    for key in keys:
+        key_bytes = key.encode() if isinstance(key, str) else key
+        digest.update(len(key_bytes).to_bytes(4) + key_bytes)
+    return int.from_bytes(digest.digest())
 
 
-def filter_matches(question_results: list[QuestionResult]) -> list[QuestionResult]:
-    return list(filter(_is_match, question_results))
+def _shuffler(seed: int | None) -> Callable[[list[Any]], None]:
+    # Without a seed the order is random on every call
+    return random.shuffle if seed is None else random.Random(seed).shuffle
 
 
-def group_by_min_answer(matches: list[QuestionResult]) -> dict[AnswerEnum, list[QuestionResult]]:
+def _grade(result: QuestionResult, grade_table: bytes) -> int:
+    answer_a, answer_b = result.answer_a, result.answer_b
+    code_a = ENCODED_ANSWERS[answer_a.answer, answer_a.if_forced]
+    return grade_table[(code_a << 4) | ENCODED_ANSWERS[answer_b.answer, answer_b.if_forced]]
+
+
+def _is_match(result: QuestionResult, grade_table: bytes = GRADE_TABLE) -> bool:
+    return _grade(result, grade_table) != NO_MATCH
+
+
+def filter_matches(
+    question_results: list[QuestionResult], grade_table: bytes = GRADE_TABLE
+) -> list[QuestionResult]:
+    return [result for result in question_results if _is_match(result, grade_table)]
+
+
+_ANSWERS_BY_VALUE = tuple(sorted(AnswerEnum, key=lambda answer: answer.value))
+
+
+def group_by_min_answer(
+    matches: list[QuestionResult], grade_table: bytes = GRADE_TABLE, seed: int | None = None
+) -> dict[AnswerEnum, list[QuestionResult]]:
+    """Group matches by their grade; question results that don't match are left out, as
+    filter_matches with the same table would"""
     result = defaultdict(list)
     for match in matches:
-        min_answer_enum = min(match.answer_a, match.answer_b).answer
-        result[min_answer_enum].append(match)
+        grade = _grade(match, grade_table)
+        if grade != NO_MATCH:
+            result[_ANSWERS_BY_VALUE[grade]].append(match)
+    shuffle = _shuffler(seed)
     for key in result.keys():
-        random.shuffle(result[key])
+        shuffle(result[key])
     return result
 
 
 def get_question_results(
     answers_a: Sequence[AnswerBase], answers_b: Sequence[AnswerBase], question_ids: set[int]
 ) -> list[QuestionResult]:
-    answers_dict_a = {answer.question_id: Answer.from_answer_base(answer) for answer in answers_a}
-    answers_dict_b = {answer.question_id: Answer.from_answer_base(answer) for answer in answers_b}
-    return [
-        QuestionResult(
-            question_id=question_id,
-            answer_a=answers_dict_a[question_id],
-            answer_b=answers_dict_b[question_id],
-        )
-        for question_id in question_ids
-    ]
+    ordered_question_ids = list(question_ids)
+    positions = {question_id: i for i, question_id in enumerate(ordered_question_ids)}
+    return question_results_from_vectors(
+        ordered_question_ids, pack_answers(answers_a, positions), pack_answers(answers_b, positions)
+    )
 
 
 class GradedMatch(TypedDict):
@@ -64,14 +94,86 @@ class MatchList(RootModel):
     root: list[GradedMatch]
 
 
-def get_match(
-    answers_a: Sequence[AnswerBase], answers_b: Sequence[AnswerBase], question_ids: set[int]
+# Every packed answer code maps to one shared, never mutated Answer instance
+PACKED_ANSWERS = {
+    encode_answer(answer, if_forced): Answer(answer=answer, if_forced=if_forced)
+    for answer in AnswerEnum
+    for if_forced in (False, True)
+}
+
+
+def question_results_from_vectors(
+    question_ids: Sequence[int], vector_a: bytes, vector_b: bytes
+) -> list[QuestionResult]:
+    """Answers at the same position are to question_ids at that position"""
+    return [
+        QuestionResult.model_construct(
+            question_id=question_id,
+            answer_a=PACKED_ANSWERS[code_a],
+            answer_b=PACKED_ANSWERS[code_b],
+        )
+        for question_id, code_a, code_b in zip(question_ids, vector_a, vector_b)
+    ]
+
+
+def group_match_positions(
+    vector_a: bytes, vector_b: bytes, grade_table: bytes = GRADE_TABLE, seed: int | None = None
+) -> dict[int, list[int]]:
+    """Positions of the matched questions by grade, shuffled within each grade"""
+    return positions_by_grade(grade_vectors(vector_a, vector_b, grade_table), seed)
+
+
+def positions_by_grade(grades: bytes, seed: int | None = None) -> dict[int, list[int]]:
+    grouped: dict[int, list[int]] = {}
+    for position, grade in enumerate(grades):
+        if grade != NO_MATCH:
+            grouped.setdefault(grade, []).append(position)
+    shuffle = _shuffler(seed)
+    for positions in grouped.values():
+        shuffle(positions)
+    return grouped
+
+
+def match_list_from_vectors(
+    question_ids: Sequence[int],
+    vector_a: bytes,
+    vector_b: bytes,
+    grade_table: bytes = GRADE_TABLE,
+    seed: int | None = None,
 ) -> MatchList:
-    question_results = get_question_results(answers_a, answers_b, question_ids)
-    grouped = group_by_min_answer(filter_matches(question_results))
-    return MatchList(
+    return MatchList.model_construct(
         root=[
-            GradedMatch(min_answer=min_answer.value, matches=matches)
-            for min_answer, matches in grouped.items()
+            GradedMatch(
+                min_answer=min_answer,
+                matches=[
+                    QuestionResult.model_construct(
+                        question_id=question_ids[position],
+                        answer_a=PACKED_ANSWERS[vector_a[position]],
+                        answer_b=PACKED_ANSWERS[vector_b[position]],
+                    )
+                    for position in positions
+                ],
+            )
+            for min_answer, positions in group_match_positions(
+                vector_a, vector_b, grade_table, seed
+            ).items()
         ]
     )
+
+
+def get_match(
+    answers_a: Sequence[AnswerBase],
+    answers_b: Sequence[AnswerBase],
+    question_ids: set[int],
+    grade_table: bytes = GRADE_TABLE,
+    seed: int | None = None,
+) -> MatchList:
+    ordered_question_ids = list(question_ids)
+    positions = {question_id: i for i, question_id in enumerate(ordered_question_ids)}
+    return match_list_from_vectors(
+        ordered_question_ids,
+        pack_answers(answers_a, positions),
+        pack_answers(answers_b, positions),
+        grade_table,
+        seed,
+    )
@@ -0,0 +1,71 @@
+from typing import Mapping
+
+from pydantic import BaseModel
+
+from k_matcher.domain.answer_vector import AnswerVector
+from k_matcher.domain.match_engine import (
+    GRADE_TABLE,
+    GRADES,
+    count_grades,
+    grade_vectors,
+)
+from k_matcher.domain.question_result import (
+    MatchList,
+    match_list_from_vectors,
+    match_seed,
+)
+
+
+class RankedMatch(BaseModel):
+    result_id: str
+    match_count: int
+    grade_counts: dict[int, int]
+    matching_result: MatchList | None = None
+
+
+def _rank_key(ranked_match: RankedMatch) -> tuple[int, ...]:
+    return (
+        ranked_match.match_count,
+        *(ranked_match.grade_counts.get(grade, 0) for grade in GRADES),
+    )
+
+
+def rank_matches(
+    vector: AnswerVector,
+    candidates: Mapping[str, AnswerVector],
+    include_matches: bool = False,
+    grade_table: bytes = GRADE_TABLE,
+    vector_id: str | None = None,
+) -> list[RankedMatch]:
+    """Candidates answering a different set of questions are left out of the ranking.
+
+    With vector_id, the included matches are shuffled by a seed derived from both result ids.
+    """
+    ranked_matches = []
+    for result_id, candidate in candidates.items():
+        if not (
+            candidate.question_ids is vector.question_ids
+            or candidate.question_ids == vector.question_ids
+        ):
+            continue
+        grade_counts = count_grades(grade_vectors(vector.answers, candidate.answers, grade_table))
+        ranked_matches.append(
+            RankedMatch(
+                result_id=result_id,
+                match_count=sum(grade_counts.values()),
+                grade_counts=grade_counts,
+                matching_result=(
+                    match_list_from_vectors(
+                        vector.question_ids,
+                        vector.answers,
+                        candidate.answers,
+                        grade_table,
+                        match_seed(vector_id, result_id) if vector_id else None,
+                    )
+                    if include_matches
+                    else None
+                ),
+            )
+        )
+    ranked_matches.sort(key=_rank_key, reverse=True)
+    return ranked_matches
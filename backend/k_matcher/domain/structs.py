@@ -0,0 +1,59 @@
+from typing import Sequence
+
+import msgspec
+
+from k_matcher.domain.enums import AnswerEnum
+from k_matcher.domain.match_engine import GRADE_TABLE, encode_answer
+from k_matcher.domain.question_result import group_match_positions
+
+# msgspec mirrors of the pydantic domain models, encoding to the same JSON
+
+
+class AnswerStruct(msgspec.Struct, frozen=True):
+    answer: AnswerEnum
+    if_forced: bool = False
+
+
+class QuestionResultStruct(msgspec.Struct):
+    question_id: int
+    answer_a: AnswerStruct
+    answer_b: AnswerStruct
+
+
+class GradedMatchStruct(msgspec.Struct):
+    min_answer: int
+    matches: list[QuestionResultStruct]
+
+
+MatchListStruct = list[GradedMatchStruct]
+
+_PACKED_ANSWERS = {
+    encode_answer(answer, if_forced): AnswerStruct(answer=answer, if_forced=if_forced)
+    for answer in AnswerEnum
+    for if_forced in (False, True)
+}
+
+
+def match_structs_from_vectors(
+    question_ids: Sequence[int],
+    vector_a: bytes,
+    vector_b: bytes,
+    grade_table: bytes = GRADE_TABLE,
+    seed: int | None = None,
+) -> MatchListStruct:
+    return [
+        GradedMatchStruct(
+            min_answer=min_answer,
+            matches=[
+                QuestionResultStruct(
+                    question_id=question_ids[position],
+                    answer_a=_PACKED_ANSWERS[vector_a[position]],
+                    answer_b=_PACKED_ANSWERS[vector_b[position]],
+                )
+                for position in positions
+            ],
+        )
+        for min_answer, positions in group_match_positions(
+            vector_a, vector_b, grade_table, seed
+        ).items()
+    ]
@@ -0,0 +1,159 @@
+"""Streaming NDJSON and CSV export of results and answers for analytics"""
+
+import csv
+import io
+import itertools
+from typing import Any, Iterable, Iterator, Literal, cast
+
+import msgspec
+from fastapi import APIRouter, Depends, Header, Query
+from fastapi.responses import StreamingResponse
+from sqlalchemy import Connection, Engine, Select, select
+from sqlmodel import Session, col
+
+from k_matcher.auth import check_bearer_token
+from k_matcher.config import get_config
+from k_matcher.database import get_session
+from k_matcher.models.models import Answer, Result
+
+ExportKind = Literal["results", "answers"]
+ExportFormat = Literal["ndjson", "csv"]
+
+COLUMNS: dict[str, tuple[str, ...]] = {
+    "results": ("seq", "id", "pairing_code", "created_at", "matching_result"),
+    "answers": ("seq", "result_id", "question_id", "answer", "if_forced", "created_at"),
+}
+MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+
+def export_query(kind: ExportKind, since: int | None) -> Select:
+    """Ordered by the change sequence, which is indexed, so rows stream without a sort.
+
+    Results are numbered again when they get matched, so an incremental export brings them
+    back with their matching_result. Answers never change and keep their result's first
+    number. The numbers follow commit order, so results committed after an export are
+    never behind its watermark, whatever their created_at.
+    """
+    query: Select
+    if kind == "results":
+        seq = col(Result.updated_seq)
+        query = select(
+            seq,
+            col(Result.id),
+            col(Result.pairing_code),
+            col(Result.created_at),
+            col(Result.matching_result),
+        )
+    else:
+        seq = col(Result.created_seq)
+        query = select(
+            seq,
+            col(Answer.result_id),
+            col(Answer.question_id),
+            col(Answer.answer),
+            col(Answer.if_forced),
+            col(Result.created_at),
+        ).join(Result)
+    if since is not None:
+        # Exclusive, so the last exported seq is the next export's watermark
+        query = query.where(seq > since)
+    return query.order_by(seq)
+
+
+def export_rows(
+    connection: Connection, kind: ExportKind, since: int | None, batch_size: int
+) -> Iterator[tuple[Any, ...]]:
+    """Rows as plain values, fetched from the cursor batch_size at a time"""
+    rows = connection.execution_options(yield_per=batch_size).execute(export_query(kind, since))
+    for row in rows:
+        if kind == "results":
+            seq, result_id, pairing_code, created_at, matching_result = row
+            yield seq, str(result_id), pairing_code, created_at.isoformat(), matching_result
+        else:
+            seq, result_id, question_id, answer, if_forced, created_at = row
+            yield (
+                seq,
+                str(result_id),
+                question_id,
+                answer.value,
+                if_forced,
+                created_at.isoformat(),
+            )
+
+
+def _batches(rows: Iterable[tuple[Any, ...]], batch_size: int) -> Iterator[list[tuple[Any, ...]]]:
+    rows = iter(rows)
+    while batch := list(itertools.islice(rows, batch_size)):
+        yield batch
+
+
+def ndjson_chunks(
+    rows: Iterable[tuple[Any, ...]], kind: ExportKind, batch_size: int
+) -> Iterator[bytes]:
+    encoder = msgspec.json.Encoder()
+    columns = COLUMNS[kind]
+    for batch in _batches(rows, batch_size):
+        if kind == "results":
+            # matching_result is stored as JSON already and is spliced in as is
+            batch = [
+                (*row[:-1], msgspec.Raw(row[-1]) if row[-1] is not None else None) for row in batch
+            ]
+        yield encoder.encode_lines([dict(zip(columns, row)) for row in batch])
+
+
+def csv_chunks(
+    rows: Iterable[tuple[Any, ...]], kind: ExportKind, batch_size: int
+) -> Iterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(COLUMNS[kind])
+    for batch in _batches(rows, batch_size):
+        writer.writerows(batch)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+def encode_rows(
+    rows: Iterable[tuple[Any, ...]], kind: ExportKind, export_format: ExportFormat, batch_size: int
+) -> Iterator[bytes]:
+    chunks = ndjson_chunks if export_format == "ndjson" else csv_chunks
+    return chunks(rows, kind, batch_size)
+
+
+def export_stream(
+    engine: Engine,
+    kind: ExportKind,
+    export_format: ExportFormat,
+    since: int | None = None,
+    batch_size: int = 1000,
+) -> Iterator[bytes]:
+    """Encoded chunks of batch_size rows, read in one transaction on a connection of its own"""
+    with engine.connect() as connection:
+        rows = export_rows(connection, kind, since, batch_size)
+        yield from encode_rows(rows, kind, export_format, batch_size)
+
+
+router = APIRouter()
+
+
+def check_token(authorization: str | None = Header(default=None)):
+    check_bearer_token(authorization, get_config().export.token)
+
+
+@router.get("/export/{kind}", dependencies=[Depends(check_token)])
+def export(
+    kind: ExportKind,
+    export_format: ExportFormat = Query(default="ndjson", alias="format"),
+    # The seq of the last row of the previous export
+    since: int | None = Query(default=None, ge=0),
+    session: Session = Depends(get_session),
+) -> StreamingResponse:
+    # The session is closed before the body is streamed, so only its engine is used
+    engine = cast(Engine, session.get_bind())
+    return StreamingResponse(
+        export_stream(engine, kind, export_format, since, get_config().export.batch_size),
+        media_type=MEDIA_TYPES[export_format],
+    )
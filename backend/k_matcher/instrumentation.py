@@ -0,0 +1,252 @@
+"""Opt-in request instrumentation: stage timers, Server-Timing, /metrics and sampled cProfile"""
+
+import functools
+import inspect
+import random
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Any, Callable, Iterator
+
+from fastapi import APIRouter, Depends, Header, Response
+from fastapi.routing import APIRoute
+from pydantic import BaseModel, Field
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from k_matcher.auth import check_bearer_token
+from k_matcher.catalogue_cache import catalogue_cache
+from k_matcher.config import get_config
+from k_matcher.match_cache import get_match_cache
+
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class RequestTimings:
+    def __init__(self, profile: bool = False) -> None:
+        self.started = time.perf_counter()
+        self.stages: dict[str, float] = {}
+        self.profile = profile
+
+    def add(self, name: str, seconds: float):
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def server_timing(self) -> str:
+        stages = [*self.stages.items(), ("total", time.perf_counter() - self.started)]
+        return ", ".join(f"{name};dur={seconds * 1000:.2f}" for name, seconds in stages)
+
+
+_request_timings: ContextVar[RequestTimings | None] = ContextVar("request_timings", default=None)
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """Add the time spent in the block to the current request's timings, if it has any"""
+    timings = _request_timings.get()
+    if timings is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.add(name, time.perf_counter() - started)
+
+
+class Histogram:
+    def __init__(self, name: str, description: str, label_names: tuple[str, ...]) -> None:
+        self.name = name
+        self.description = description
+        self.label_names = label_names
+        # labels -> [cumulative bucket counts..., sum, count]
+        self._series: dict[tuple[str, ...], list[float]] = {}
+
+    def observe(self, labels: tuple[str, ...], value: float):
+        series = self._series.setdefault(labels, [0] * (len(BUCKETS) + 2))
+        for i, bound in enumerate(BUCKETS):
+            if value <= bound:
+                series[i] += 1
+        series[-2] += value
+        series[-1] += 1
+
+    def render(self) -> Iterator[str]:
+        yield f"# HELP {self.name} {self.description}"
+        yield f"# TYPE {self.name} histogram"
+        for labels, series in sorted(self._series.items()):
+            label_text = ",".join(f'{n}="{v}"' for n, v in zip(self.label_names, labels))
+            for bound, count in zip(BUCKETS, series):
+                yield f'{self.name}_bucket{{{label_text},le="{bound}"}} {count}'
+            yield f'{self.name}_bucket{{{label_text},le="+Inf"}} {series[-1]}'
+            yield f"{self.name}_sum{{{label_text}}} {series[-2]}"
+            yield f"{self.name}_count{{{label_text}}} {series[-1]}"
+
+
+class Metrics:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.requests = Histogram(
+            "k_matcher_request_duration_seconds",
+            "Request latency by route",
+            ("method", "route", "status"),
+        )
+        self.stages = Histogram(
+            "k_matcher_stage_duration_seconds",
+            "Time spent in each stage of a request",
+            ("method", "route", "stage"),
+        )
+
+    def observe(self, method: str, route: str, status: int, timings: RequestTimings):
+        with self._lock:
+            duration = time.perf_counter() - timings.started
+            self.requests.observe((method, route, str(status)), duration)
+            for name, seconds in timings.stages.items():
+                self.stages.observe((method, route, name), seconds)
+
+    def render(self) -> str:
+        with self._lock:
+            lines = [*self.requests.render(), *self.stages.render()]
+        stats = catalogue_cache.stats()
+        for name, kind, value in (
+            ("hits_total", "counter", stats.hits),
+            ("misses_total", "counter", stats.misses),
+            ("entries", "gauge", stats.entries),
+            ("size_bytes", "gauge", stats.size_bytes),
+        ):
+            lines.append(f"# TYPE k_matcher_catalogue_cache_{name} {kind}")
+            lines.append(f"k_matcher_catalogue_cache_{name} {value}")
+        match_cache = get_match_cache()
+        if match_cache is not None:
+            match_stats = match_cache.stats()
+            for name, kind, optional_value in (
+                ("hits_total", "counter", match_stats.hits),
+                ("misses_total", "counter", match_stats.misses),
+                ("evictions_total", "counter", match_stats.evictions),
+                ("entries", "gauge", match_stats.entries),
+                ("size_bytes", "gauge", match_stats.size_bytes),
+            ):
+                if optional_value is not None:
+                    lines.append(f"# TYPE k_matcher_match_cache_{name} {kind}")
+                    lines.append(f"k_matcher_match_cache_{name} {optional_value}")
+        return "\n".join(lines) + "\n"
+
+
+class Profiler:
+    """Runs a sampled fraction of endpoint calls under cProfile and dumps the stats"""
+
+    def __init__(self, sample_rate: float, directory: Path) -> None:
+        self.sample_rate = sample_rate
+        self.directory = directory
+        # cProfile is process wide since 3.12, so only one call is profiled at a time
+        self._lock = threading.Lock()
+
+    def sample(self) -> bool:
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def run(self, function: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        if not self._lock.acquire(blocking=False):
+            return function(*args, **kwargs)
+        try:
+            import cProfile
+
+            profiler = cProfile.Profile()
+            try:
+                return profiler.runcall(function, *args, **kwargs)
+            finally:
+                self.directory.mkdir(parents=True, exist_ok=True)
+                profiler.dump_stats(self.directory / f"{function.__name__}-{time.time_ns()}.prof")
+        finally:
+            self._lock.release()
+
+
+metrics = Metrics()
+
+
+@functools.cache
+def get_profiler() -> Profiler:
+    settings = get_config().instrumentation
+    return Profiler(settings.profile_sample_rate, Path(settings.profile_dir))
+
+
+def instrument_endpoint(endpoint: Callable[..., Any]) -> Callable[..., Any]:
+    if inspect.iscoroutinefunction(endpoint):
+        return endpoint
+
+    @functools.wraps(endpoint)
+    def wrapper(*args: Any, **kwargs: Any) -> Any:
+        timings = _request_timings.get()
+        if timings is None:
+            return endpoint(*args, **kwargs)
+        # Everything before the handler: body parsing, validation and dependencies
+        timings.add("validation", time.perf_counter() - timings.started)
+        if timings.profile:
+            return get_profiler().run(endpoint, *args, **kwargs)
+        return endpoint(*args, **kwargs)
+
+    return wrapper
+
+
+class InstrumentedRoute(APIRoute):
+    def __init__(self, path: str, endpoint: Callable[..., Any], **kwargs: Any) -> None:
+        super().__init__(path, instrument_endpoint(endpoint), **kwargs)
+
+
+class InstrumentationMiddleware:
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timings = RequestTimings(profile=get_profiler().sample())
+        token = _request_timings.set(timings)
+        status = 500
+
+        async def send_with_server_timing(message: Message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                MutableHeaders(scope=message).append("Server-Timing", timings.server_timing())
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_server_timing)
+        finally:
+            _request_timings.reset(token)
+            route = getattr(scope.get("route"), "path", "unmatched")
+            metrics.observe(scope["method"], route, status, timings)
+
+
+class ProfilingSettings(BaseModel):
+    sample_rate: float = Field(ge=0, le=1)
+
+
+router = APIRouter()
+
+
+@router.get("/metrics")
+def get_metrics() -> Response:
+    """The metrics of the worker process that serves the request; with several workers,
+    scrape each of them or sum the series"""
+    return Response(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
+@router.get("/debug/profiling")
+def get_profiling() -> ProfilingSettings:
+    """The sample rate of the worker process that serves the request"""
+    return ProfilingSettings(sample_rate=get_profiler().sample_rate)
+
+
+def check_profiling_token(authorization: str | None = Header(default=None)):
+    check_bearer_token(authorization, get_config().instrumentation.profiling_token)
+
+
+@router.put("/debug/profiling", dependencies=[Depends(check_profiling_token)])
+def put_profiling(settings: ProfilingSettings) -> ProfilingSettings:
+    """Changes the sample rate of the worker process that serves the request only; to
+    profile every worker, set profile_sample_rate in the config and restart"""
+    get_profiler().sample_rate = settings.sample_rate
+    return settings
@@ -1,123 +1,574 @@
 import datetime
+import functools
+import json
 import uuid
+from collections import defaultdict
 from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import NamedTuple, Sequence
 
-import pydantic_core
-from fastapi import Depends, FastAPI, HTTPException
+import msgspec
+from fastapi import Depends, FastAPI, Header, HTTPException, Query, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
+from pydantic import TypeAdapter
+from sqlalchemy import ColumnElement, delete, insert, update
 from sqlalchemy.exc import IntegrityError
-from sqlmodel import Session, column, select
+from sqlmodel import Session, col, column, select
 
-from k_matcher.config import config
-from k_matcher.database import create_db_and_tables, engine, get_session
-from k_matcher.domain.question_result import MatchList, get_match
+from k_matcher.catalogue_cache import CachedResponse, CacheStats, catalogue_cache
+from k_matcher.config import get_config
+from k_matcher.database import (
+    check_schema,
+    create_db_and_tables,
+    get_engine,
+    get_session,
+    schema_ready,
+    set_sqlite_pragma,
+)
+from k_matcher.domain.answer_vector import (
+    AnswerVector,
+    decode_answer_vector,
+    encode_answer_vector,
+    vector_from_answers,
+)
+from k_matcher.domain.group_match import group_match_list
+from k_matcher.domain.pairing_code import (
+    PAIRING_CODE_ATTEMPTS,
+    is_pairing_code,
+    new_pairing_code,
+)
+from k_matcher.domain.question_result import (
+    MatchList,
+    match_list_from_vectors,
+    match_seed,
+)
+from k_matcher.domain.ranking import rank_matches
+from k_matcher.domain.structs import MatchListStruct, match_structs_from_vectors
+from k_matcher.export import router as export_router
+from k_matcher.instrumentation import InstrumentationMiddleware, InstrumentedRoute
+from k_matcher.instrumentation import router as instrumentation_router
+from k_matcher.instrumentation import stage
+from k_matcher.match_cache import MatchCacheStats, answers_digest, get_match_cache
+from k_matcher.match_index import get_match_index
 from k_matcher.models.models import (
+    MAX_NEAREST_RESULTS,
     Answer,
+    CatalogueVersion,
+    GroupMatchPublic,
+    GroupMatchRequest,
+    MatchItem,
     Question,
     QuestionCategory,
+    QuestionnairePublic,
+    RankingRequest,
     Result,
     ResultCreate,
     ResultPublic,
 )
+from k_matcher.models.structs import (
+    QuestionCategoryStruct,
+    QuestionStruct,
+    ResultPublicStruct,
+)
+from k_matcher.questionnaires import (
+    current_questionnaire,
+    load_questionnaire,
+    vector_for_questionnaire,
+)
+from k_matcher.responses import MsgspecJSONResponse
+from k_matcher.write_batcher import (
+    NewResult,
+    close_write_batcher,
+    get_write_batcher,
+    insert_results,
+)
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    create_db_and_tables(engine)
+    if schema_ready():
+        # Pragmas are per connection, the tables were created by the launcher
+        set_sqlite_pragma(get_engine())
+    else:
+        create_db_and_tables(get_engine())
+        check_schema(get_engine())
+    # Loaded from its file before the first request rather than during it
+    get_match_index()
     yield
+    close_write_batcher()
+    index = get_match_index()
+    if index is not None:
+        index.save(Path(get_config().match_index.path))
 
 
 app = FastAPI(lifespan=lifespan)
+if get_config().instrumentation.enabled:
+    app.router.route_class = InstrumentedRoute
+app.include_router(export_router)
+
+
+@functools.cache
+def grade_table() -> bytes:
+    """The configured matching rules, compiled once"""
+    return get_config().matching.grade_table()
+
+
+# Only the pydantic serializer needs these, so their schemas are built on first use
+@functools.cache
+def questions_adapter() -> TypeAdapter[Sequence[Question]]:
+    return TypeAdapter(Sequence[Question])
+
+
+@functools.cache
+def question_categories_adapter() -> TypeAdapter[Sequence[QuestionCategory]]:
+    return TypeAdapter(Sequence[QuestionCategory])
+
+
+def catalogue_response(cached: CachedResponse, if_none_match: str | None) -> Response:
+    headers = {"ETag": cached.etag, "Cache-Control": "no-cache"}
+    if if_none_match and (
+        if_none_match.strip() == "*"
+        or cached.etag in (etag.strip().removeprefix("W/") for etag in if_none_match.split(","))
+    ):
+        return Response(status_code=304, headers=headers)
+    return Response(content=cached.body, media_type="application/json", headers=headers)
+
+
+def catalogue_version(session: Session) -> int:
+    return session.exec(select(CatalogueVersion.version)).one()
 
 
 @app.get("/questions", response_model=list[Question])
-async def get_questions(*, category_id: int | None = None, session: Session = Depends(get_session)):
-    query = select(Question)
-    if category_id:
-        query = query.where(column('category_id') == category_id)
-    return session.exec(query).all()
+def get_questions(
+    *,
+    category_id: int | None = None,
+    if_none_match: str | None = Header(default=None),
+    session: Session = Depends(get_session),
+) -> Response:
+    def build() -> bytes:
+        if get_config().http.serializer == "msgspec":
+            row_query = select(col(Question.id), col(Question.text), col(Question.category_id))
+            if category_id:
+                row_query = row_query.where(column('category_id') == category_id)
+            return msgspec.json.encode([QuestionStruct(*row) for row in session.exec(row_query)])
+        query = select(Question)
+        if category_id:
+            query = query.where(column('category_id') == category_id)
+        return questions_adapter().dump_json(session.exec(query).all())
+
+    cached = catalogue_cache.get(("questions", category_id), catalogue_version(session), build)
+    return catalogue_response(cached, if_none_match)
 
 
 @app.get("/question_categories", response_model=list[QuestionCategory])
-async def get_question_categories(*, session: Session = Depends(get_session)):
-    return session.exec(select(QuestionCategory)).all()
+def get_question_categories(
+    *, if_none_match: str | None = Header(default=None), session: Session = Depends(get_session)
+) -> Response:
+    def build() -> bytes:
+        if get_config().http.serializer == "msgspec":
+            query = select(
+                col(QuestionCategory.id),
+                col(QuestionCategory.name),
+                col(QuestionCategory.description),
+            )
+            return msgspec.json.encode(
+                [QuestionCategoryStruct(*row) for row in session.exec(query)]
+            )
+        return question_categories_adapter().dump_json(session.exec(select(QuestionCategory)).all())
+
+    cached = catalogue_cache.get(("question_categories",), catalogue_version(session), build)
+    return catalogue_response(cached, if_none_match)
+
 
+@app.get("/catalogue_cache")
+def get_catalogue_cache_stats() -> CacheStats:
+    return catalogue_cache.stats()
 
-@app.post("/results")
-async def post_results(
+
+@app.get("/match_cache")
+def get_match_cache_stats() -> MatchCacheStats | None:
+    """null when the match cache is turned off"""
+    cache = get_match_cache()
+    return cache.stats() if cache is not None else None
+
+
+@app.post("/results", response_model=ResultPublic)
+def post_results(
     *, request: ResultCreate, session: Session = Depends(get_session)
-) -> ResultPublic:
+) -> ResultPublic | Response:
+    vector = submitted_vector(session, request)
     if request.partner_id:
-        partner_result = session.get(Result, uuid.UUID(request.partner_id))
-        if not partner_result:
+        lookup = result_lookup(request.partner_id)
+        if lookup is None:
+            raise HTTPException(status_code=400, detail="Invalid partner id")
+        cache = get_match_cache()
+        if cache is not None:
+            digest = answers_digest(vector)
+            cached = cache.get_match(result_ref(request.partner_id), digest)
+            if cached is not None:
+                return Response(content=cached, media_type="application/json")
+        with stage("db"):
+            partner = load_stored_result(session, lookup)
+        if partner is None:
             raise HTTPException(status_code=404, detail="Result not found")
-        return match_results(session, request, partner_result)
+        response = match_results(session, vector, request.questionnaire_id, partner)
+        if cache is not None:
+            cache.put_match(str(partner.id), partner.pairing_code, digest, bytes(response.body))
+        return response
 
-    return create_result(session, request)
+    return create_result(session, request, vector)
 
 
-@app.get("/results/{result_id}")
-async def get_results(
-    result_id: uuid.UUID, session: Session = Depends(get_session)
-) -> ResultPublic:
-    result = session.get(Result, result_id)
-    if not result:
-        raise HTTPException(status_code=404, detail="Result not found")
-    if result.matching_result:
-        match_list = MatchList.model_validate(pydantic_core.from_json(result.matching_result))
-    else:
-        match_list = None
-    return ResultPublic(id=str(result_id), matching_result=match_list)
+def submitted_vector(session: Session, request: ResultCreate) -> AnswerVector:
+    if request.questionnaire_id is None:
+        with stage("match"):
+            return vector_from_answers(request.answers)
+    with stage("db"):
+        questionnaire = load_questionnaire(session, request.questionnaire_id)
+    if questionnaire is None:
+        raise HTTPException(status_code=400, detail="Unknown questionnaire")
+    with stage("match"):
+        try:
+            return vector_for_questionnaire(request.answers, questionnaire)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
 
 
-def match_results(session: Session, result: ResultCreate, partner_result: Result) -> ResultPublic:
-    question_ids = set(answer.question_id for answer in result.answers)
-    partner_question_ids = set(answer.question_id for answer in partner_result.answers)
-    if question_ids != partner_question_ids:
-        raise HTTPException(status_code=400, detail="Question IDs do not match")
+@app.get("/questionnaires/current")
+def get_current_questionnaire(session: Session = Depends(get_session)) -> QuestionnairePublic:
+    """The questionnaire to submit answers for, unless matching an older result"""
+    questionnaire = current_questionnaire(session, catalogue_version(session))
+    return QuestionnairePublic(id=questionnaire.id, question_ids=list(questionnaire.question_ids))
 
-    match = get_match(partner_result.answers, result.answers, question_ids)
-    partner_result.matching_result = match.model_dump_json()
-    session.add(partner_result)
-    session.commit()
-    session.refresh(partner_result)
-    return ResultPublic(id=str(partner_result.id), matching_result=match)
 
+@app.get("/questionnaires/{questionnaire_id}")
+def get_questionnaire(
+    questionnaire_id: int, session: Session = Depends(get_session)
+) -> QuestionnairePublic:
+    questionnaire = load_questionnaire(session, questionnaire_id)
+    if questionnaire is None:
+        raise HTTPException(status_code=404, detail="Questionnaire not found")
+    return QuestionnairePublic(id=questionnaire.id, question_ids=list(questionnaire.question_ids))
 
-def create_result(session: Session, request: ResultCreate) -> ResultPublic:
-    try:
-        result = Result(created_at=datetime.datetime.now())
-        session.add(result)
-        session.flush()
-
-        answers = []
-        for answer in request.answers:
-            answers.append(
-                Answer(
-                    result_id=result.id,
-                    question_id=answer.question_id,
-                    answer=answer.answer,
-                    if_forced=answer.if_forced,
-                )
+
+@app.get("/results/{result_id}", response_model=ResultPublic)
+def get_results(result_id: str, session: Session = Depends(get_session)) -> Response:
+    lookup = result_lookup(result_id)
+    if lookup is None:
+        raise HTTPException(status_code=404, detail="Result not found")
+    cache = get_match_cache()
+    if cache is not None:
+        cached = cache.get_result(result_ref(result_id))
+        if cached is not None:
+            return Response(content=cached, media_type="application/json")
+    with stage("db"):
+        row = session.exec(
+            select(col(Result.id), col(Result.pairing_code), col(Result.matching_result)).where(
+                lookup
             )
-        session.add_all(answers)
+        ).one_or_none()
+    if row is None:
+        raise HTTPException(status_code=404, detail="Result not found")
+    response = result_public_response(*row)
+    # A result still waiting for its match isn't cached: another worker can match it
+    # without invalidating this worker's cache
+    if cache is not None and row[2] is not None:
+        cache.put_result(str(row[0]), row[1], bytes(response.body))
+    return response
+
+
+def result_lookup(result_id: str) -> ColumnElement[bool] | None:
+    """Results are addressed by pairing code or by id, None if result_id is neither"""
+    if is_pairing_code(result_id):
+        return col(Result.pairing_code) == result_id
+    try:
+        return col(Result.id) == uuid.UUID(result_id)
+    except ValueError:
+        return None
+
+
+def result_ref(result_id: str) -> str:
+    """The cache key of a valid result id: a pairing code or the canonical uuid form"""
+    return result_id if is_pairing_code(result_id) else str(uuid.UUID(result_id))
+
+
+def result_public_response(
+    result_id: uuid.UUID, pairing_code: str | None, matching_result: str | None
+) -> Response:
+    # matching_result is already a serialized MatchList, so it is spliced in as is
+    content = (
+        f'{{"id":"{result_id}","pairing_code":{json.dumps(pairing_code)},'
+        f'"matching_result":{matching_result or "null"}}}'
+    )
+    return Response(content=content, media_type="application/json")
+
+
+@app.post("/results/{result_id}/ranking")
+def rank_results(
+    result_id: uuid.UUID, request: RankingRequest, session: Session = Depends(get_session)
+) -> StreamingResponse:
+    candidate_ids = set(request.candidate_ids)
+    candidate_ids.discard(result_id)
+    vectors = load_answer_vectors(session, [result_id, *candidate_ids])
+    vector = vectors.pop(str(result_id), None)
+    if vector is None:
+        raise HTTPException(status_code=404, detail="Result not found")
+
+    ranked_matches = rank_matches(
+        vector, vectors, request.include_matches, grade_table(), str(result_id)
+    )
+    return StreamingResponse(
+        (ranked_match.model_dump_json() + "\n" for ranked_match in ranked_matches),
+        media_type="application/x-ndjson",
+    )
+
+
+@app.get("/results/{result_id}/nearest")
+def nearest_results(
+    result_id: uuid.UUID,
+    k: int = Query(default=10, ge=1, le=MAX_NEAREST_RESULTS),
+    include_matches: bool = False,
+    session: Session = Depends(get_session),
+) -> StreamingResponse:
+    """The k results with the most and best matches out of all stored ones, ranked as in
+    /results/{result_id}/ranking"""
+    index = get_match_index()
+    if index is None:
+        raise HTTPException(status_code=404, detail="Match index is disabled")
+    with stage("db"):
+        vector = load_answer_vectors(session, [result_id]).get(str(result_id))
+        if vector is None:
+            raise HTTPException(status_code=404, detail="Result not found")
+        index.refresh(session, get_config().match_index.refresh_interval_seconds)
+    while True:
+        with stage("match"):
+            candidate_ids = [
+                candidate_id
+                for candidate_id in index.nearest(vector, k + 1, grade_table())
+                if candidate_id != result_id
+            ]
+        with stage("db"):
+            candidates = load_answer_vectors(session, candidate_ids)
+        # Deleted since they were indexed, e.g. by the retention job
+        deleted = [
+            candidate_id for candidate_id in candidate_ids if str(candidate_id) not in candidates
+        ]
+        if not deleted:
+            break
+        index.remove(deleted)
+
+    with stage("match"):
+        ranked_matches = rank_matches(
+            vector, candidates, include_matches, grade_table(), str(result_id)
+        )[:k]
+    return StreamingResponse(
+        (ranked_match.model_dump_json() + "\n" for ranked_match in ranked_matches),
+        media_type="application/x-ndjson",
+    )
+
+
+@app.post("/groups/match")
+def match_group(
+    request: GroupMatchRequest, session: Session = Depends(get_session)
+) -> GroupMatchPublic:
+    """Questions every result in the group matches on, graded by the lowest answer"""
+    if len(set(request.result_ids)) != len(request.result_ids):
+        raise HTTPException(status_code=400, detail="Result ids must be distinct")
+    with stage("db"):
+        vectors_by_id = load_answer_vectors(session, request.result_ids)
+    if len(vectors_by_id) != len(request.result_ids):
+        raise HTTPException(status_code=404, detail="Result not found")
+    with stage("match"):
+        vectors = [vectors_by_id[str(result_id)] for result_id in request.result_ids]
+        question_ids = vectors[0].question_ids
+        if any(vector.question_ids != question_ids for vector in vectors[1:]):
+            raise HTTPException(status_code=400, detail="Question IDs do not match")
+        matching_result = group_match_list(
+            question_ids,
+            [vector.answers for vector in vectors],
+            grade_table(),
+            match_seed(*(str(result_id) for result_id in request.result_ids)),
+        )
+    return GroupMatchPublic.model_construct(
+        result_ids=request.result_ids, matching_result=matching_result
+    )
+
+
+def load_answers(session: Session, result_ids: list[uuid.UUID]) -> dict[str, list[Answer]]:
+    query = select(Answer).where(col(Answer.result_id).in_(result_ids))
+    answers_by_result: dict[str, list[Answer]] = defaultdict(list)
+    for answer in session.exec(query):
+        answers_by_result[str(answer.result_id)].append(answer)
+    return answers_by_result
+
+
+def load_answer_vectors(session: Session, result_ids: list[uuid.UUID]) -> dict[str, AnswerVector]:
+    query = select(col(Result.id), col(Result.answers_vector)).where(col(Result.id).in_(result_ids))
+    vectors = {}
+    not_backfilled = []
+    for result_id, answers_vector in session.exec(query):
+        if answers_vector is None:
+            not_backfilled.append(result_id)
+        else:
+            vectors[str(result_id)] = decode_answer_vector(answers_vector)
+    if not_backfilled:
+        answers_by_result = load_answers(session, not_backfilled)
+        for result_id in not_backfilled:
+            vectors[str(result_id)] = vector_from_answers(answers_by_result[str(result_id)])
+    return vectors
+
+
+class StoredResult(NamedTuple):
+    id: uuid.UUID
+    pairing_code: str | None
+    questionnaire_id: int | None
+    vector: AnswerVector
+
+
+def load_stored_result(session: Session, lookup: ColumnElement[bool]) -> StoredResult | None:
+    query = select(
+        col(Result.id),
+        col(Result.pairing_code),
+        col(Result.questionnaire_id),
+        col(Result.answers_vector),
+    ).where(lookup)
+    row = session.exec(query).one_or_none()
+    if row is None:
+        return None
+    result_id, pairing_code, questionnaire_id, answers_vector = row
+    if answers_vector is None:
+        vector = vector_from_answers(load_answers(session, [result_id])[str(result_id)])
+    else:
+        vector = decode_answer_vector(answers_vector)
+    return StoredResult(result_id, pairing_code, questionnaire_id, vector)
+
+
+def match_results(
+    session: Session, vector: AnswerVector, questionnaire_id: int | None, partner: StoredResult
+) -> Response:
+    partner_id, partner_vector = partner.id, partner.vector
+    with stage("match"):
+        # Answers to the same questionnaire have the same positions, no need to compare them
+        same_questionnaire = (
+            questionnaire_id is not None and questionnaire_id == partner.questionnaire_id
+        )
+        if not same_questionnaire and vector.question_ids != partner_vector.question_ids:
+            raise HTTPException(status_code=400, detail="Question IDs do not match")
+        # The same answers matched against the same partner always come out in the same order
+        arguments = (
+            vector.question_ids,
+            partner_vector.answers,
+            vector.answers,
+            grade_table(),
+            match_seed(str(partner_id), vector.answers),
+        )
+        match: MatchList | MatchListStruct
+        if get_config().http.serializer == "msgspec":
+            match = match_structs_from_vectors(*arguments)
+        else:
+            match = match_list_from_vectors(*arguments)
+    with stage("serialize"):
+        if isinstance(match, MatchList):
+            matching_result = match.model_dump_json()
+        else:
+            matching_result = msgspec.json.encode(match).decode()
+        match_items = MatchItem.rows_from_match(partner_id, match)
+    with stage("commit"):
+        session.execute(
+            update(Result)
+            .where(col(Result.id) == partner_id)
+            .values(matching_result=matching_result)
+        )
+        session.execute(delete(MatchItem).where(col(MatchItem.result_id) == partner_id))
+        if match_items:
+            session.execute(insert(MatchItem), match_items)
         session.commit()
-        return ResultPublic(id=str(result.id))
-    except IntegrityError as e:
-        session.rollback()
-        if "FOREIGN KEY constraint failed" in str(e):
-            raise HTTPException(status_code=400, detail="Foreign key constraint violated")
-        raise HTTPException(status_code=500, detail="Database integrity error")
+    return result_public_response(partner_id, partner.pairing_code, matching_result)
+
+
+def create_result(
+    session: Session, request: ResultCreate, vector: AnswerVector
+) -> ResultPublic | Response:
+    with stage("serialize"):
+        answers_vector = encode_answer_vector(vector)
+    # A new pairing code is drawn in the unlikely case that the last one was taken
+    for _ in range(PAIRING_CODE_ATTEMPTS):
+        try:
+            result_id, pairing_code = insert_result(session, request, answers_vector)
+        except IntegrityError as e:
+            session.rollback()
+            if "result.pairing_code" in str(e):
+                continue
+            if "FOREIGN KEY constraint failed" in str(e):
+                raise HTTPException(status_code=400, detail="Foreign key constraint violated")
+            raise HTTPException(status_code=500, detail="Database integrity error")
+        index_result(session, result_id, vector)
+        if get_config().http.serializer == "msgspec":
+            return MsgspecJSONResponse(
+                ResultPublicStruct(id=str(result_id), pairing_code=pairing_code)
+            )
+        return ResultPublic(id=str(result_id), pairing_code=pairing_code)
+    raise HTTPException(status_code=500, detail="Database integrity error")
+
+
+def index_result(session: Session, result_id: uuid.UUID, vector: AnswerVector):
+    index = get_match_index()
+    if index is None:
+        return
+    with stage("match"):
+        index.add([(result_id, vector)])
+    # Also forgets the ids added here once the refresh has seen them in the database
+    with stage("db"):
+        index.refresh(session, get_config().match_index.refresh_interval_seconds)
+
+
+def insert_result(
+    session: Session, request: ResultCreate, answers_vector: bytes
+) -> tuple[uuid.UUID, str]:
+    # The id is generated here, so the result and its answers go out as two Core
+    # inserts without a flush or an ORM object per answer
+    result_id, pairing_code = uuid.uuid4(), new_pairing_code()
+    new_result = NewResult(
+        {
+            "id": result_id,
+            "pairing_code": pairing_code,
+            "questionnaire_id": request.questionnaire_id,
+            "created_at": datetime.datetime.now(),
+            "answers_vector": answers_vector,
+        },
+        [
+            {
+                "result_id": result_id,
+                "question_id": answer.question_id,
+                "answer": answer.answer,
+                "if_forced": answer.if_forced,
+            }
+            for answer in request.answers
+        ],
+    )
+    with stage("commit"):
+        batcher = get_write_batcher()
+        if batcher is not None:
+            batcher.write(new_result)
+        else:
+            insert_results(session, [new_result])
+            session.commit()
+    return result_id, pairing_code
+
 
+if get_config().instrumentation.enabled:
+    app.include_router(instrumentation_router)
+    app.add_middleware(InstrumentationMiddleware)
 
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=config.http.allow_origins,
+    allow_origins=get_config().http.allow_origins,
     allow_methods=["*"],
     allow_headers=["*"],
 )
 
 if __name__ == "__main__":
-    import uvicorn
+    from k_matcher.serve import main
 
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    main()
@@ -0,0 +1,201 @@
+"""Serialized results and matches, so repeated reads and matches skip the database"""
+
+import functools
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Literal, Protocol
+
+from pydantic import BaseModel
+
+from k_matcher.config import get_config
+from k_matcher.domain.answer_vector import AnswerVector, encode_answer_vector
+
+
+class MatchCacheStats(BaseModel):
+    backend: str
+    # None where the backend doesn't track it, e.g. Redis evicts on its own
+    entries: int | None
+    size_bytes: int | None
+    evictions: int | None
+    hits: int
+    misses: int
+    hit_rate: float
+
+
+class CacheBackend(Protocol):
+    name: str
+
+    def get(self, key: str) -> bytes | None: ...
+
+    def set(self, key: str, value: bytes) -> None: ...
+
+    def clear(self) -> None: ...
+
+
+class MemoryBackend:
+    """Per process, bounded by entry count and total size, entries expire after ttl seconds"""
+
+    name = "memory"
+
+    def __init__(
+        self,
+        max_entries: int,
+        max_bytes: int,
+        ttl: float,
+        eviction: Literal["lru", "fifo"] = "lru",
+    ) -> None:
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.eviction = eviction
+        self._lock = threading.Lock()
+        # Oldest first: by last use for "lru", by insertion for "fifo"
+        self._entries: OrderedDict[str, tuple[float, bytes]] = OrderedDict()
+        self.size_bytes = 0
+        self.evictions = 0
+
+    def get(self, key: str) -> bytes | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                self._remove(key)
+                return None
+            if self.eviction == "lru":
+                self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: bytes):
+        if len(value) > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self.size_bytes += len(value)
+            while len(self._entries) > self.max_entries or self.size_bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size_bytes = 0
+            self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _remove(self, key: str):
+        _, value = self._entries.pop(key)
+        self.size_bytes -= len(value)
+
+
+class RedisBackend:
+    """Any Redis compatible server, shared by all workers. Its maxmemory and
+    maxmemory-policy settings cap the memory and pick what is evicted."""
+
+    name = "redis"
+
+    def __init__(self, client: Any, ttl: float, key_prefix: str) -> None:
+        self.client = client
+        self.ttl_ms = int(ttl * 1000)
+        self.key_prefix = key_prefix
+
+    def get(self, key: str) -> bytes | None:
+        return self.client.get(self.key_prefix + key)
+
+    def set(self, key: str, value: bytes):
+        self.client.set(self.key_prefix + key, value, px=self.ttl_ms)
+
+    def clear(self):
+        for key in self.client.scan_iter(match=self.key_prefix + "*"):
+            self.client.delete(key)
+
+
+def answers_digest(vector: AnswerVector) -> str:
+    return hashlib.blake2b(encode_answer_vector(vector), digest_size=16).hexdigest()
+
+
+class MatchCache:
+    """GET /results/{id} response bodies by result id and pairing code, and the response
+    of each match by partner and submitted answers"""
+
+    def __init__(self, backend: CacheBackend) -> None:
+        self.backend = backend
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+
+    def get_result(self, result_ref: str) -> bytes | None:
+        return self._count(self.backend.get(f"result:{result_ref}"))
+
+    def put_result(self, result_id: str, pairing_code: str | None, body: bytes):
+        for result_ref in filter(None, (result_id, pairing_code)):
+            self.backend.set(f"result:{result_ref}", body)
+
+    def get_match(self, partner_ref: str, digest: str) -> bytes | None:
+        body = self.backend.get(f"match:{partner_ref}:{digest}")
+        # Only served while it is still the partner's stored match, another submission
+        # replaces it in the database and in the result entry
+        if body is not None and self.backend.get(f"result:{partner_ref}") != body:
+            body = None
+        return self._count(body)
+
+    def put_match(self, partner_id: str, pairing_code: str | None, digest: str, body: bytes):
+        for partner_ref in filter(None, (partner_id, pairing_code)):
+            self.backend.set(f"match:{partner_ref}:{digest}", body)
+        self.put_result(partner_id, pairing_code, body)
+
+    def clear(self):
+        self.backend.clear()
+        with self._lock:
+            self._hits = 0
+            self._misses = 0
+
+    def stats(self) -> MatchCacheStats:
+        memory = self.backend if isinstance(self.backend, MemoryBackend) else None
+        with self._lock:
+            requests = self._hits + self._misses
+            return MatchCacheStats(
+                backend=self.backend.name,
+                entries=len(memory) if memory is not None else None,
+                size_bytes=memory.size_bytes if memory is not None else None,
+                evictions=memory.evictions if memory is not None else None,
+                hits=self._hits,
+                misses=self._misses,
+                hit_rate=self._hits / requests if requests else 0.0,
+            )
+
+    def _count(self, body: bytes | None) -> bytes | None:
+        with self._lock:
+            if body is None:
+                self._misses += 1
+            else:
+                self._hits += 1
+        return body
+
+
+@functools.cache
+def get_match_cache() -> MatchCache | None:
+    """None when the cache is turned off"""
+    settings = get_config().match_cache
+    backend: CacheBackend
+    if settings.backend == "off":
+        return None
+    if settings.backend == "redis":
+        # Optional dependency, only needed for this backend
+        from redis import Redis  # type: ignore[import-not-found]
+
+        backend = RedisBackend(
+            Redis.from_url(settings.redis_url), settings.ttl_seconds, settings.key_prefix
+        )
+    else:
+        backend = MemoryBackend(
+            settings.max_entries, settings.max_bytes, settings.ttl_seconds, settings.eviction
+        )
+    return MatchCache(backend)
@@ -0,0 +1,432 @@
+"""Nearest neighbour search over all stored results, graded like matching.
+
+The index is a column store of bitmaps: for every question set, block of rows, question
+position and packed answer there is one int with bit i set if row i gave that answer. A
+search adds up the rank key of every row (match count, then the count of each grade) as
+bit-sliced counters, so the work per question is a few big-int operations over the whole
+block instead of a Python loop over its rows."""
+
+import functools
+import logging
+import os
+import tempfile
+import threading
+import time
+import uuid
+import zlib
+from pathlib import Path
+from typing import Iterable, Sequence
+
+import msgspec
+from sqlmodel import Session, col, select
+
+from k_matcher.config import get_config
+from k_matcher.domain.answer_vector import AnswerVector, decode_answer_vector
+from k_matcher.domain.match_engine import ENCODED_ANSWERS, GRADES, NO_MATCH
+from k_matcher.models.models import Result
+
+CODES = sorted(set(ENCODED_ANSWERS.values()))
+_CODE_INDEX = {code: i for i, code in enumerate(CODES)}
+# Per answer code, turns a column of packed answers into b"1" where it is that code
+_DIGITS = [bytes(ord("1") if c == code else ord("0") for c in range(256)) for code in CODES]
+# Fewer new rows than this are set bit by bit, more are converted column by column
+_BULK_ROWS = 64
+_MAGIC = b"KMATCHIDX2\n"
+# Ends the file: its length up to here and the CRC32 of all of it up to here
+_TRAILER_SIZE = 12
+
+logger = logging.getLogger(__name__)
+
+
+def _sum(bitmaps_by_plane: dict[int, list[int]]) -> list[int]:
+    """Bit-sliced sum of bitmaps, each adding 1 << plane to the counters of its rows.
+
+    Full adders turn three bitmaps of a plane into one and a carry into the next plane, so
+    every input costs a fixed five big-int operations, without rippling carries through
+    the whole counter for each of them. Returns the planes, least significant first.
+    """
+    planes = []
+    plane = 0
+    while bitmaps_by_plane:
+        bitmaps = bitmaps_by_plane.pop(plane, [])
+        while len(bitmaps) > 1:
+            a, b = bitmaps.pop(), bitmaps.pop()
+            partial = a ^ b
+            if bitmaps:
+                c = bitmaps.pop()
+                bitmaps.append(partial ^ c)
+                carry = (a & b) | (partial & c)
+            else:
+                bitmaps.append(partial)
+                carry = a & b
+            if carry:
+                bitmaps_by_plane.setdefault(plane + 1, []).append(carry)
+        planes.append(bitmaps[0] if bitmaps else 0)
+        plane += 1
+    return planes
+
+
+def _set_rows(bitmap: int, limit: int) -> list[int]:
+    rows: list[int] = []
+    while bitmap and len(rows) < limit:
+        lowest = bitmap & -bitmap
+        rows.append(lowest.bit_length() - 1)
+        bitmap ^= lowest
+    return rows
+
+
+def _top_rows(planes: list[int], live: int, k: int) -> list[int]:
+    """The k live rows with the highest keys, given the planes most significant first"""
+    greater, equal = 0, live
+    for plane in planes:
+        above = equal & plane
+        count = greater.bit_count() + above.bit_count()
+        if count > k:
+            equal = above
+            continue
+        greater |= above
+        equal &= ~plane
+        if count == k:
+            break
+    rows = _set_rows(greater, k)
+    return rows + _set_rows(equal, k - len(rows))
+
+
+class _Block:
+    __slots__ = ("rows", "live", "columns")
+
+    def __init__(self, question_count: int) -> None:
+        self.rows = 0
+        self.live = 0
+        # Per position, one bitmap per answer code in CODES order
+        self.columns = [[0] * len(CODES) for _ in range(question_count)]
+
+    def append(self, vectors: Sequence[bytes]):
+        offset = self.rows
+        if len(vectors) < _BULK_ROWS:
+            for row, vector in enumerate(vectors, offset):
+                bit = 1 << row
+                for column, code in zip(self.columns, vector):
+                    column[_CODE_INDEX[code]] |= bit
+        else:
+            blob = b"".join(vectors)
+            question_count = len(self.columns)
+            for position, column in enumerate(self.columns):
+                answers = blob[position::question_count]
+                for code_index, digits in enumerate(_DIGITS):
+                    bits = answers.translate(digits)
+                    if b"1" in bits:
+                        column[code_index] |= int(bits[::-1], 2) << offset
+        self.live |= ((1 << len(vectors)) - 1) << offset
+        self.rows += len(vectors)
+
+    def top_rows(self, query: list[list[tuple[int, list[int]]]], k: int) -> list[int]:
+        rows_by_grade: dict[int, list[int]] = {grade: [] for grade in GRADES}
+        for column, grades in zip(self.columns, query):
+            for grade, code_indexes in grades:
+                # A row has one answer per position, so OR-ing the answers of a grade sums them
+                rows = 0
+                for code_index in code_indexes:
+                    rows |= column[code_index]
+                if rows:
+                    rows_by_grade[grade].append(rows)
+        counts = {grade: _sum({0: rows}) for grade, rows in rows_by_grade.items()}
+        # The match count is the sum of the grade counts
+        match_counts: dict[int, list[int]] = {}
+        for planes in counts.values():
+            for plane, bitmap in enumerate(planes):
+                match_counts.setdefault(plane, []).append(bitmap)
+        # The rank key: match count, then the count of each grade from the highest one
+        key = _sum(match_counts)[::-1]
+        for grade in GRADES:
+            key += counts[grade][::-1]
+        return _top_rows(key, self.live, k)
+
+
+class _Segment:
+    """Results that answered the same questions"""
+
+    def __init__(self, question_ids: tuple[int, ...]) -> None:
+        self.question_ids = question_ids
+        # 16 bytes per row
+        self.result_ids = bytearray()
+        self.blocks: list[_Block] = []
+
+    def append(self, result_ids: Sequence[uuid.UUID], vectors: Sequence[bytes], block_size: int):
+        start = 0
+        while start < len(vectors):
+            if not self.blocks or self.blocks[-1].rows == block_size:
+                self.blocks.append(_Block(len(self.question_ids)))
+            block = self.blocks[-1]
+            end = min(start + block_size - block.rows, len(vectors))
+            block.append(vectors[start:end])
+            start = end
+        self.result_ids += b"".join(result_id.bytes for result_id in result_ids)
+
+    def find(self, result_id: uuid.UUID) -> int | None:
+        target, start = result_id.bytes, 0
+        while (found := self.result_ids.find(target, start)) != -1:
+            if found % 16 == 0:
+                return found // 16
+            start = found + 1
+        return None
+
+    def result_id(self, row: int) -> uuid.UUID:
+        start = row * 16
+        end = start + 16
+        return uuid.UUID(bytes=bytes(self.result_ids[start:end]))
+
+
+class _SegmentHeader(msgspec.Struct):
+    question_ids: list[int]
+    block_rows: list[int]
+
+
+class _Header(msgspec.Struct):
+    block_size: int
+    watermark: int | None
+    pending: list[uuid.UUID]
+    segments: list[_SegmentHeader]
+
+
+def _query(vector: AnswerVector, grade_table: bytes) -> list[list[tuple[int, list[int]]]]:
+    """Per position, each grade with the indexes of the answer codes that get it"""
+    grades_by_code = {}
+    for code_a in set(vector.answers):
+        code_indexes: dict[int, list[int]] = {}
+        for code_index, code_b in enumerate(CODES):
+            grade = grade_table[(code_a << 4) | code_b]
+            if grade != NO_MATCH:
+                code_indexes.setdefault(grade, []).append(code_index)
+        grades_by_code[code_a] = list(code_indexes.items())
+    return [grades_by_code[code] for code in vector.answers]
+
+
+class MatchIndex:
+    """Results are only compared to results that answered the same questions, as in ranking.
+
+    Searches return candidates, the k best of every block; rank_matches on their stored
+    answers gives the exact order.
+    """
+
+    def __init__(self, block_size: int = 65536) -> None:
+        self.block_size = block_size
+        self._segments: dict[tuple[int, ...], _Segment] = {}
+        # Highest Result.created_seq seen by refresh; the sequence follows commit order, so
+        # every result committed later has a higher one
+        self.watermark: int | None = None
+        # Added by this worker and not returned by a refresh yet, which skips them once
+        self._pending: set[uuid.UUID] = set()
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._refreshed_at = 0.0
+
+    def __len__(self) -> int:
+        return sum(
+            block.live.bit_count()
+            for segment in self._segments.values()
+            for block in segment.blocks
+        )
+
+    def add(self, new_results: Iterable[tuple[uuid.UUID, AnswerVector]]):
+        """Results committed since the last refresh, e.g. by this worker"""
+        with self._lock:
+            new_results = [item for item in new_results if item[0] not in self._pending]
+            self._pending.update(result_id for result_id, _ in new_results)
+            self._append(new_results)
+
+    def _append(self, new_results: Iterable[tuple[uuid.UUID, AnswerVector]]):
+        grouped: dict[tuple[int, ...], tuple[list[uuid.UUID], list[bytes]]] = {}
+        for result_id, vector in new_results:
+            result_ids, vectors = grouped.setdefault(vector.question_ids, ([], []))
+            result_ids.append(result_id)
+            vectors.append(vector.answers)
+        for question_ids, (result_ids, vectors) in grouped.items():
+            segment = self._segments.get(question_ids)
+            if segment is None:
+                segment = self._segments[question_ids] = _Segment(question_ids)
+            segment.append(result_ids, vectors, self.block_size)
+
+    def remove(self, result_ids: Iterable[uuid.UUID]):
+        """Deleted results; their rows stay in place but are never returned again"""
+        with self._lock:
+            for result_id in result_ids:
+                self._pending.discard(result_id)
+                for segment in self._segments.values():
+                    row = segment.find(result_id)
+                    if row is not None:
+                        block = segment.blocks[row // self.block_size]
+                        block.live &= ~(1 << (row % self.block_size))
+                        break
+
+    def nearest(self, vector: AnswerVector, k: int, grade_table: bytes) -> list[uuid.UUID]:
+        """Candidates for the k results with the most and best matches, at most k per block"""
+        with self._lock:
+            segment = self._segments.get(vector.question_ids)
+            if segment is None:
+                return []
+            query = _query(vector, grade_table)
+            return [
+                segment.result_id(block_number * self.block_size + row)
+                for block_number, block in enumerate(segment.blocks)
+                for row in block.top_rows(query, k)
+            ]
+
+    def refresh(self, session: Session, max_age: float = 0) -> int:
+        """Adds the results committed since the last refresh, e.g. by other worker processes.
+
+        Skipped when the last refresh is less than max_age seconds old or still running.
+        """
+        if time.monotonic() - self._refreshed_at < max_age:
+            return 0
+        if not self._refresh_lock.acquire(blocking=False):
+            return 0
+        try:
+            query = (
+                select(col(Result.id), col(Result.answers_vector), col(Result.created_seq))
+                .where(col(Result.answers_vector).is_not(None))
+                .order_by(col(Result.created_seq))
+            )
+            if self.watermark is not None:
+                query = query.where(col(Result.created_seq) > self.watermark)
+            added, newest = 0, self.watermark
+            batch: list[tuple[uuid.UUID, AnswerVector]] = []
+            rows = session.exec(query.execution_options(yield_per=self.block_size))
+            for result_id, answers_vector, created_seq in rows:
+                if created_seq is not None:
+                    newest = created_seq
+                if answers_vector is None:
+                    continue
+                batch.append((result_id, decode_answer_vector(answers_vector)))
+                if len(batch) == self.block_size:
+                    added += self._add_refreshed(batch, newest)
+                    batch = []
+            added += self._add_refreshed(batch, newest)
+            self._refreshed_at = time.monotonic()
+            return added
+        finally:
+            self._refresh_lock.release()
+
+    def _add_refreshed(
+        self, new_results: list[tuple[uuid.UUID, AnswerVector]], watermark: int | None
+    ) -> int:
+        with self._lock:
+            if self._pending:
+                seen = {result_id for result_id, _ in new_results} & self._pending
+                self._pending -= seen
+                new_results = [item for item in new_results if item[0] not in seen]
+            self._append(new_results)
+            self.watermark = watermark
+        return len(new_results)
+
+    def save(self, path: Path):
+        """Written to a temporary file of its own first, so a crash or another worker saving
+        at the same time never leaves half an index behind"""
+        with self._lock, tempfile.NamedTemporaryFile(
+            "wb", dir=path.parent, prefix=f"{path.name}.", suffix=".tmp", delete=False
+        ) as f:
+            try:
+                size = checksum = 0
+
+                def write(chunk: bytes | bytearray):
+                    nonlocal size, checksum
+                    f.write(chunk)
+                    size += len(chunk)
+                    checksum = zlib.crc32(chunk, checksum)
+
+                segments = list(self._segments.values())
+                header = msgspec.json.encode(
+                    _Header(
+                        block_size=self.block_size,
+                        watermark=self.watermark,
+                        pending=list(self._pending),
+                        segments=[
+                            _SegmentHeader(
+                                question_ids=list(segment.question_ids),
+                                block_rows=[block.rows for block in segment.blocks],
+                            )
+                            for segment in segments
+                        ],
+                    )
+                )
+                write(_MAGIC + len(header).to_bytes(8, "little") + header)
+                for segment in segments:
+                    write(segment.result_ids)
+                    for block in segment.blocks:
+                        row_bytes = (block.rows + 7) // 8
+                        write(block.live.to_bytes(row_bytes, "little"))
+                        for column in block.columns:
+                            write(b"".join(rows.to_bytes(row_bytes, "little") for rows in column))
+                f.write(size.to_bytes(8, "little") + checksum.to_bytes(4, "little"))
+                f.flush()
+                os.fsync(f.fileno())
+            except BaseException:
+                os.unlink(f.name)
+                raise
+        os.replace(f.name, path)
+
+    @classmethod
+    def load(cls, path: Path) -> "MatchIndex":
+        """Raises ValueError for anything but a complete index file"""
+        data = memoryview(path.read_bytes())
+        end = len(data) - _TRAILER_SIZE
+        if end < len(_MAGIC) or data[: len(_MAGIC)] != _MAGIC:
+            raise ValueError(f"Not a match index file: {path}")
+        trailer = data[end:]
+        size, checksum = int.from_bytes(trailer[:8], "little"), int.from_bytes(
+            trailer[8:], "little"
+        )
+        if size != end or checksum != zlib.crc32(data[:end]):
+            raise ValueError(f"Truncated or corrupt match index file: {path}")
+        offset = len(_MAGIC)
+
+        def read(size: int) -> memoryview:
+            nonlocal offset
+            start = offset
+            offset += size
+            if offset > end:
+                raise ValueError(f"Truncated or corrupt match index file: {path}")
+            return data[start:offset]
+
+        header_size = int.from_bytes(read(8), "little")
+        try:
+            header = msgspec.json.decode(read(header_size), type=_Header)
+        except msgspec.DecodeError as e:
+            raise ValueError(f"Corrupt match index header: {path}") from e
+
+        index = cls(header.block_size)
+        index.watermark = header.watermark
+        index._pending = set(header.pending)
+        for segment_header in header.segments:
+            segment = _Segment(tuple(segment_header.question_ids))
+            segment.result_ids = bytearray(read(16 * sum(segment_header.block_rows)))
+            for rows in segment_header.block_rows:
+                size = (rows + 7) // 8
+                block = _Block(0)
+                block.rows = rows
+                block.live = int.from_bytes(read(size), "little")
+                block.columns = [
+                    [int.from_bytes(read(size), "little") for _ in CODES]
+                    for _ in segment.question_ids
+                ]
+                segment.blocks.append(block)
+            index._segments[segment.question_ids] = segment
+        if offset != end:
+            raise ValueError(f"Truncated or corrupt match index file: {path}")
+        return index
+
+
+@functools.cache
+def get_match_index() -> MatchIndex | None:
+    """None when the index is turned off. Loaded from its file when there is a valid one,
+    otherwise filled from the database by the first refresh"""
+    settings = get_config().match_index
+    if not settings.enabled:
+        return None
+    path = Path(settings.path)
+    if path.exists():
+        try:
+            return MatchIndex.load(path)
+        except ValueError as e:
+            logger.warning("%s, rebuilding the match index from the database", e)
+    return MatchIndex(settings.block_size)
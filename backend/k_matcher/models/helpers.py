@@ -1,8 +1,13 @@
+import uuid
+
 import sqlalchemy as sa
 
+from k_matcher.config import get_config
+
 
 class IntEnum(sa.types.TypeDecorator):
     impl = sa.Integer
+    cache_ok = True
 
     def __init__(self, enumtype, *args, **kwargs):
         super().__init__(*args, **kwargs)
@@ -20,3 +25,36 @@ class IntEnum(sa.types.TypeDecorator):
 
     def __repr__(self) -> str:
         return 'sa.Integer()'
+
+
+def binary_uuids() -> bool:
+    return get_config().database.uuid_storage == "binary"
+
+
+class UUIDType(sa.types.TypeDecorator):
+    """32-char hex text like the default SQLModel UUID column, or 16 bytes when binary"""
+
+    impl = sa.CHAR(32)
+    cache_ok = True
+
+    def load_dialect_impl(self, dialect):
+        if binary_uuids():
+            return dialect.type_descriptor(sa.LargeBinary(16))
+        return dialect.type_descriptor(sa.CHAR(32))
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        if not isinstance(value, uuid.UUID):
+            value = uuid.UUID(value)
+        return value.bytes if binary_uuids() else value.hex
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        if isinstance(value, bytes):
+            return uuid.UUID(bytes=value)
+        return uuid.UUID(value)
+
+    def __repr__(self) -> str:
+        return 'sa.CHAR(32)'
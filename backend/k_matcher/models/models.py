@@ -1,14 +1,25 @@
 import datetime
 import uuid
-from typing import ClassVar
+from typing import Any, ClassVar, Iterable, Sequence
 
 from pydantic import BaseModel
-from sqlmodel import Column, Field, PrimaryKeyConstraint, Relationship, SQLModel, text
+from pydantic import Field as PydanticField
+from sqlmodel import (
+    Column,
+    Field,
+    Index,
+    PrimaryKeyConstraint,
+    Relationship,
+    SQLModel,
+    text,
+)
 
 from k_matcher.domain.answer import AnswerBase
 from k_matcher.domain.enums import AnswerEnum
-from k_matcher.domain.question_result import MatchList
-from k_matcher.models.helpers import IntEnum
+from k_matcher.domain.group_match import GroupMatchList
+from k_matcher.domain.question_result import MatchList, QuestionResult
+from k_matcher.domain.structs import MatchListStruct, QuestionResultStruct
+from k_matcher.models.helpers import IntEnum, UUIDType
 
 
 class QuestionCategory(SQLModel, table=True):
@@ -24,23 +35,75 @@ class Question(SQLModel, table=True):
     category_id: int = Field(foreign_key="question_category.id", ondelete="CASCADE")
 
 
-class Result(SQLModel, table=True):
-    id: uuid.UUID = Field(default_factory=uuid.uuid4, primary_key=True)
+class CatalogueVersion(SQLModel, table=True):
+    """Single row bumped by triggers on every question and category write"""
+
+    __tablename__: ClassVar[str] = "catalogue_version"  # type: ignore
+    id: int = Field(default=1, primary_key=True)
+    version: int = 0
+
+
+class ChangeSequence(SQLModel, table=True):
+    """Single row bumped by triggers on every result insert and matching_result update"""
+
+    __tablename__: ClassVar[str] = "change_sequence"  # type: ignore
+    id: int = Field(default=1, primary_key=True)
+    value: int = 0
+
+
+class Questionnaire(SQLModel, table=True):
+    """A frozen set of questions; results on the same questionnaire are comparable as is"""
+
+    id: int | None = Field(default=None, primary_key=True)
+    # Hash of the ordered question ids, to find an existing snapshot of the same questions
+    fingerprint: str = Field(unique=True)
     created_at: datetime.datetime = Field(
         sa_column_kwargs={"server_default": text("CURRENT_TIMESTAMP")}
     )
+
+
+class QuestionnaireQuestion(SQLModel, table=True):
+    """Dense position of each question, in ascending question id order like answer vectors"""
+
+    __tablename__: ClassVar[str] = "questionnaire_question"  # type: ignore
+    __table_args__ = (PrimaryKeyConstraint('questionnaire_id', 'position'),)
+    questionnaire_id: int = Field(foreign_key="questionnaire.id", ondelete="CASCADE")
+    position: int
+    question_id: int = Field(foreign_key="question.id")
+
+
+class QuestionnairePublic(BaseModel):
+    id: int
+    question_ids: list[int]
+
+
+class Result(SQLModel, table=True):
+    id: uuid.UUID = Field(default_factory=uuid.uuid4, primary_key=True, sa_type=UUIDType)
+    # Short code partners share instead of the id
+    pairing_code: str | None = Field(default=None, unique=True, index=True)
+    # None for results submitted without one, they are compared by their question ids
+    questionnaire_id: int | None = Field(default=None, foreign_key="questionnaire.id", index=True)
+    created_at: datetime.datetime = Field(
+        index=True, sa_column_kwargs={"server_default": text("CURRENT_TIMESTAMP")}
+    )
     matching_result: str | None = None
+    answers_vector: bytes | None = None
+    # Set from change_sequence by triggers in commit order, unlike created_at: created_seq
+    # on insert, updated_seq on insert and whenever matching_result is set
+    created_seq: int | None = Field(default=None, index=True)
+    updated_seq: int | None = Field(default=None, index=True)
     answers: list["Answer"] = Relationship(back_populates="result", cascade_delete=True)
 
 
 class ResultPublic(BaseModel):
     id: str
+    pairing_code: str | None = None
     matching_result: MatchList | None = None
 
 
 class Answer(AnswerBase, SQLModel, table=True):
     __table_args__ = (PrimaryKeyConstraint('result_id', 'question_id'),)
-    result_id: uuid.UUID = Field(foreign_key="result.id", ondelete="CASCADE")
+    result_id: uuid.UUID = Field(foreign_key="result.id", ondelete="CASCADE", sa_type=UUIDType)
     question_id: int = Field(foreign_key="question.id")
     answer: AnswerEnum = Field(
         sa_column=Column(name="answer", nullable=False, type_=IntEnum(AnswerEnum))
@@ -49,8 +112,56 @@ class Answer(AnswerBase, SQLModel, table=True):
     result: "Result" = Relationship(back_populates="answers")
 
 
+class MatchItem(SQLModel, table=True):
+    """One matched question of a stored match, for querying matches without parsing JSON"""
+
+    __tablename__: ClassVar[str] = "match_item"  # type: ignore
+    __table_args__ = (
+        PrimaryKeyConstraint('result_id', 'question_id'),
+        Index('ix_match_item_min_answer_question_id', 'min_answer', 'question_id'),
+    )
+    result_id: uuid.UUID = Field(foreign_key="result.id", ondelete="CASCADE", sa_type=UUIDType)
+    question_id: int = Field(foreign_key="question.id")
+    min_answer: int
+    answer_a: AnswerEnum = Field(
+        sa_column=Column(name="answer_a", nullable=False, type_=IntEnum(AnswerEnum))
+    )
+    if_forced_a: bool
+    answer_b: AnswerEnum = Field(
+        sa_column=Column(name="answer_b", nullable=False, type_=IntEnum(AnswerEnum))
+    )
+    if_forced_b: bool
+
+    @staticmethod
+    def rows_from_match(
+        result_id: uuid.UUID, match: MatchList | MatchListStruct
+    ) -> list[dict[str, Any]]:
+        graded_matches: Iterable[tuple[int, Sequence[QuestionResult | QuestionResultStruct]]]
+        if isinstance(match, MatchList):
+            graded_matches = ((g["min_answer"], g["matches"]) for g in match.root)
+        else:
+            graded_matches = ((g.min_answer, g.matches) for g in match)
+        return [
+            {
+                "result_id": result_id,
+                "question_id": question_result.question_id,
+                "min_answer": min_answer,
+                "answer_a": question_result.answer_a.answer,
+                "if_forced_a": question_result.answer_a.if_forced,
+                "answer_b": question_result.answer_b.answer,
+                "if_forced_b": question_result.answer_b.if_forced,
+            }
+            for min_answer, question_results in graded_matches
+            for question_result in question_results
+        ]
+
+
+# Answer vectors list sparse high ids instead of a bitmap up to them, so this only bounds the ids
+MAX_QUESTION_ID = 1_000_000
+
+
 class AnswerCreate(AnswerBase, BaseModel):
-    question_id: int
+    question_id: int = PydanticField(ge=0, le=MAX_QUESTION_ID)
     answer: AnswerEnum
     if_forced: bool = False
 
@@ -58,3 +169,30 @@ class AnswerCreate(AnswerBase, BaseModel):
 class ResultCreate(BaseModel):
     answers: list[AnswerCreate]
     partner_id: str | None = None
+    questionnaire_id: int | None = None
+
+
+MAX_RANKING_CANDIDATES = 5000
+
+
+class RankingRequest(BaseModel):
+    candidate_ids: list[uuid.UUID] = PydanticField(max_length=MAX_RANKING_CANDIDATES)
+    include_matches: bool = False
+
+
+MAX_NEAREST_RESULTS = 100
+
+
+MIN_GROUP_SIZE = 3
+MAX_GROUP_SIZE = 20
+
+
+class GroupMatchRequest(BaseModel):
+    result_ids: list[uuid.UUID] = PydanticField(
+        min_length=MIN_GROUP_SIZE, max_length=MAX_GROUP_SIZE
+    )
+
+
+class GroupMatchPublic(BaseModel):
+    result_ids: list[uuid.UUID]
+    matching_result: GroupMatchList
@@ -0,0 +1,23 @@
+import msgspec
+
+from k_matcher.domain.structs import MatchListStruct
+
+# msgspec mirrors of the public models, encoding to the same JSON
+
+
+class QuestionCategoryStruct(msgspec.Struct):
+    id: int | None
+    name: str
+    description: str | None = None
+
+
+class QuestionStruct(msgspec.Struct):
+    id: int | None
+    text: str
+    category_id: int
+
+
+class ResultPublicStruct(msgspec.Struct):
+    id: str
+    pairing_code: str | None = None
+    matching_result: MatchListStruct | None = None
@@ -0,0 +1,150 @@
+"""Questionnaire snapshots, cached for the life of the process since they never change"""
+
+import datetime
+import hashlib
+import threading
+from typing import NamedTuple, Sequence
+
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import Session, col, select
+
+from k_matcher.domain.answer import AnswerBase
+from k_matcher.domain.answer_vector import AnswerVector
+from k_matcher.domain.match_engine import pack_answers
+from k_matcher.models.models import Question, Questionnaire, QuestionnaireQuestion
+
+
+class QuestionnaireIndex(NamedTuple):
+    id: int
+    # Ascending, so a position is the same as in an answer vector of these questions
+    question_ids: tuple[int, ...]
+    positions: dict[int, int]
+
+
+def _index(questionnaire_id: int, question_ids: Sequence[int]) -> QuestionnaireIndex:
+    question_ids = tuple(question_ids)
+    positions = {question_id: i for i, question_id in enumerate(question_ids)}
+    return QuestionnaireIndex(questionnaire_id, question_ids, positions)
+
+
+def questionnaire_fingerprint(question_ids: Sequence[int]) -> str:
+    return hashlib.blake2b(",".join(map(str, question_ids)).encode(), digest_size=16).hexdigest()
+
+
+class QuestionnaireCache:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._by_id: dict[int, QuestionnaireIndex] = {}
+        self._by_fingerprint: dict[str, QuestionnaireIndex] = {}
+        # (catalogue version, questionnaire) of the current catalogue
+        self._current: tuple[int, QuestionnaireIndex] | None = None
+
+    def get(self, questionnaire_id: int) -> QuestionnaireIndex | None:
+        return self._by_id.get(questionnaire_id)
+
+    def get_by_fingerprint(self, fingerprint: str) -> QuestionnaireIndex | None:
+        return self._by_fingerprint.get(fingerprint)
+
+    def put(self, questionnaire: QuestionnaireIndex) -> QuestionnaireIndex:
+        with self._lock:
+            self._by_id[questionnaire.id] = questionnaire
+            self._by_fingerprint[questionnaire_fingerprint(questionnaire.question_ids)] = (
+                questionnaire
+            )
+        return questionnaire
+
+    def current(self, catalogue_version: int) -> QuestionnaireIndex | None:
+        current = self._current
+        if current is not None and current[0] == catalogue_version:
+            return current[1]
+        return None
+
+    def set_current(self, catalogue_version: int, questionnaire: QuestionnaireIndex):
+        self._current = (catalogue_version, questionnaire)
+
+    def clear(self):
+        with self._lock:
+            self._by_id.clear()
+            self._by_fingerprint.clear()
+            self._current = None
+
+
+questionnaire_cache = QuestionnaireCache()
+
+
+def load_questionnaire(session: Session, questionnaire_id: int) -> QuestionnaireIndex | None:
+    cached = questionnaire_cache.get(questionnaire_id)
+    if cached is not None:
+        return cached
+    question_ids = session.exec(
+        select(col(QuestionnaireQuestion.question_id))
+        .where(col(QuestionnaireQuestion.questionnaire_id) == questionnaire_id)
+        .order_by(col(QuestionnaireQuestion.position))
+    ).all()
+    if not question_ids and session.get(Questionnaire, questionnaire_id) is None:
+        return None
+    return questionnaire_cache.put(_index(questionnaire_id, question_ids))
+
+
+def snapshot_questionnaire(session: Session, question_ids: Sequence[int]) -> QuestionnaireIndex:
+    """The questionnaire of exactly these questions, created if there is none yet"""
+    question_ids = sorted(question_ids)
+    fingerprint = questionnaire_fingerprint(question_ids)
+    cached = questionnaire_cache.get_by_fingerprint(fingerprint)
+    if cached is not None:
+        return cached
+
+    query = select(col(Questionnaire.id)).where(col(Questionnaire.fingerprint) == fingerprint)
+    questionnaire_id: int | None = session.exec(query).one_or_none()
+    if questionnaire_id is None:
+        try:
+            questionnaire = Questionnaire(
+                fingerprint=fingerprint, created_at=datetime.datetime.now()
+            )
+            session.add(questionnaire)
+            session.flush()
+            questionnaire_id = questionnaire.id
+            session.execute(
+                insert(QuestionnaireQuestion),
+                [
+                    {"questionnaire_id": questionnaire_id, "position": i, "question_id": q}
+                    for i, q in enumerate(question_ids)
+                ],
+            )
+            session.commit()
+        except IntegrityError:
+            # Created by a concurrent request in the meantime, or an unknown question
+            session.rollback()
+            questionnaire_id = session.exec(query).one_or_none()
+            if questionnaire_id is None:
+                raise
+    assert questionnaire_id is not None
+    return questionnaire_cache.put(_index(questionnaire_id, question_ids))
+
+
+def current_questionnaire(session: Session, catalogue_version: int) -> QuestionnaireIndex:
+    """Snapshot of all questions in the catalogue; edits that keep the same questions
+    keep the same questionnaire"""
+    cached = questionnaire_cache.current(catalogue_version)
+    if cached is not None:
+        return cached
+    question_ids = session.exec(select(col(Question.id)).order_by(col(Question.id))).all()
+    questionnaire = snapshot_questionnaire(
+        session, [question_id for question_id in question_ids if question_id is not None]
+    )
+    questionnaire_cache.set_current(catalogue_version, questionnaire)
+    return questionnaire
+
+
+def vector_for_questionnaire(
+    answers: Sequence[AnswerBase], questionnaire: QuestionnaireIndex
+) -> AnswerVector:
+    """Raises ValueError unless there is exactly one answer per question of the questionnaire"""
+    if len(answers) != len(questionnaire.positions):
+        raise ValueError("Answers do not match the questionnaire")
+    try:
+        packed = pack_answers(answers, questionnaire.positions)
+    except KeyError:
+        raise ValueError("Answers do not match the questionnaire")
+    return AnswerVector(questionnaire.question_ids, packed)
@@ -0,0 +1,11 @@
+from typing import Any
+
+import msgspec
+from fastapi.responses import JSONResponse
+
+
+class MsgspecJSONResponse(JSONResponse):
+    """Encodes msgspec Structs (and plain JSON types) directly, skipping jsonable_encoder"""
+
+    def render(self, content: Any) -> bytes:
+        return msgspec.json.encode(content)
@@ -0,0 +1,47 @@
+"""Production launcher: creates the schema once, then starts the uvicorn worker processes.
+
+python -m k_matcher.serve --workers 4
+"""
+
+import argparse
+import os
+
+import uvicorn
+
+from k_matcher.config import get_config
+from k_matcher.database import (
+    SCHEMA_READY_ENV,
+    check_schema,
+    create_db_and_tables,
+    get_engine,
+)
+from k_matcher.models import (  # noqa: F401  registers the tables with the metadata
+    models,
+)
+
+
+def main():
+    config = get_config()
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--host", default=config.server.host)
+    parser.add_argument("--port", type=int, default=config.server.port)
+    parser.add_argument("--workers", type=int, default=config.server.workers)
+    args = parser.parse_args()
+
+    engine = get_engine()
+    create_db_and_tables(engine)
+    check_schema(engine)
+    # Workers are spawned and build their own engine on import; none of the
+    # launcher's connections are inherited
+    engine.dispose()
+    os.environ[SCHEMA_READY_ENV] = "1"
+    uvicorn.run(
+        "k_matcher.main:app",
+        host=args.host,
+        port=args.port,
+        workers=args.workers or os.cpu_count() or 1,
+    )
+
+
+if __name__ == "__main__":
+    main()
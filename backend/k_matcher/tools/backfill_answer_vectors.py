@@ -0,0 +1,61 @@
+import argparse
+import uuid
+
+from sqlalchemy import Engine, inspect, text
+from sqlmodel import Session, col, select, update
+
+from k_matcher.database import get_engine
+from k_matcher.domain.answer_vector import encode_answer_vector, vector_from_answers
+from k_matcher.models.models import Answer, Result
+
+
+def add_answers_vector_column(engine: Engine):
+    columns = {column["name"] for column in inspect(engine).get_columns("result")}
+    if "answers_vector" not in columns:
+        with engine.begin() as connection:
+            connection.execute(text("ALTER TABLE result ADD COLUMN answers_vector BLOB"))
+
+
+def backfill_answer_vectors(engine: Engine, batch_size: int = 1000) -> int:
+    add_answers_vector_column(engine)
+    backfilled = 0
+    with Session(engine) as session:
+        while True:
+            result_ids = session.exec(
+                select(col(Result.id)).where(col(Result.answers_vector).is_(None)).limit(batch_size)
+            ).all()
+            if not result_ids:
+                return backfilled
+
+            answers_by_result: dict[uuid.UUID, list[Answer]] = {
+                result_id: [] for result_id in result_ids
+            }
+            for answer in session.exec(select(Answer).where(col(Answer.result_id).in_(result_ids))):
+                answers_by_result[answer.result_id].append(answer)
+            session.execute(
+                update(Result),
+                [
+                    {
+                        "id": result_id,
+                        "answers_vector": encode_answer_vector(vector_from_answers(answers)),
+                    }
+                    for result_id, answers in answers_by_result.items()
+                ],
+            )
+            session.commit()
+            session.expunge_all()
+            backfilled += len(result_ids)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Add the packed answers column to an existing database and fill it"
+    )
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+    backfilled = backfill_answer_vectors(get_engine(), args.batch_size)
+    print(f"Backfilled answer vectors for {backfilled} results")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+import argparse
+
+from sqlalchemy import Engine, inspect, text
+
+from k_matcher.database import create_db_and_tables, get_engine
+
+
+def add_change_sequence_columns(engine: Engine):
+    columns = {column["name"] for column in inspect(engine).get_columns("result")}
+    with engine.begin() as connection:
+        for column in ("created_seq", "updated_seq"):
+            if column not in columns:
+                connection.execute(text(f"ALTER TABLE result ADD COLUMN {column} INTEGER"))
+            connection.execute(
+                text(f"CREATE INDEX IF NOT EXISTS ix_result_{column} ON result ({column})")
+            )
+
+
+def backfill_change_sequence(engine: Engine) -> int:
+    """Numbers the results written before the change sequence in created_at order"""
+    add_change_sequence_columns(engine)
+    create_db_and_tables(engine)
+    with engine.begin() as connection:
+        backfilled = connection.execute(
+            text(
+                """
+                UPDATE result
+                SET created_seq = numbered.seq + (SELECT value FROM change_sequence),
+                    updated_seq = numbered.seq + (SELECT value FROM change_sequence)
+                FROM (
+                    SELECT id, row_number() OVER (ORDER BY created_at, id) AS seq
+                    FROM result WHERE created_seq IS NULL
+                ) AS numbered
+                WHERE result.id = numbered.id
+                """
+            )
+        ).rowcount
+        connection.execute(
+            text(
+                "UPDATE change_sequence SET value = "
+                "(SELECT coalesce(max(updated_seq), 0) FROM result) WHERE id = 1"
+            )
+        )
+    return backfilled
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Add the change sequence columns to an existing database and fill them"
+    )
+    parser.parse_args()
+    backfilled = backfill_change_sequence(get_engine())
+    print(f"Backfilled the change sequence for {backfilled} results")
+
+
+if __name__ == "__main__":
+    main()
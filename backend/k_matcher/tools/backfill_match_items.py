@@ -0,0 +1,56 @@
+import argparse
+
+import msgspec
+from sqlalchemy import Engine, delete, insert
+from sqlmodel import Session, col, select
+
+from k_matcher.database import create_db_and_tables, get_engine
+from k_matcher.domain.structs import MatchListStruct
+from k_matcher.models.models import MatchItem, Result
+
+
+def backfill_match_items(engine: Engine, batch_size: int = 1000) -> int:
+    create_db_and_tables(engine)
+    backfilled = 0
+    with Session(engine) as session:
+        query = (
+            select(col(Result.id), col(Result.matching_result))
+            .where(col(Result.matching_result).is_not(None))
+            .order_by(col(Result.id))
+        )
+        last_id = None
+        while True:
+            batch_query = query if last_id is None else query.where(col(Result.id) > last_id)
+            rows = session.exec(batch_query.limit(batch_size)).all()
+            if not rows:
+                return backfilled
+
+            result_ids = [result_id for result_id, _ in rows]
+            session.execute(delete(MatchItem).where(col(MatchItem.result_id).in_(result_ids)))
+            match_items = [
+                item
+                for result_id, matching_result in rows
+                if matching_result is not None
+                for item in MatchItem.rows_from_match(
+                    result_id, msgspec.json.decode(matching_result, type=MatchListStruct)
+                )
+            ]
+            if match_items:
+                session.execute(insert(MatchItem), match_items)
+            session.commit()
+            backfilled += len(rows)
+            last_id = result_ids[-1]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Fill the match_item table from the stored matching_result JSON"
+    )
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+    backfilled = backfill_match_items(get_engine(), args.batch_size)
+    print(f"Backfilled match items for {backfilled} results")
+
+
+if __name__ == "__main__":
+    main()
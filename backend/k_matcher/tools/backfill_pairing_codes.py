@@ -0,0 +1,65 @@
+import argparse
+
+from sqlalchemy import Engine, inspect, text
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import Session, col, select, update
+
+from k_matcher.database import get_engine
+from k_matcher.domain.pairing_code import PAIRING_CODE_ATTEMPTS, new_pairing_code
+from k_matcher.models.models import Result
+
+
+def add_pairing_code_column(engine: Engine):
+    columns = {column["name"] for column in inspect(engine).get_columns("result")}
+    with engine.begin() as connection:
+        if "pairing_code" not in columns:
+            connection.execute(text("ALTER TABLE result ADD COLUMN pairing_code VARCHAR"))
+        connection.execute(
+            text(
+                "CREATE UNIQUE INDEX IF NOT EXISTS ix_result_pairing_code "
+                "ON result (pairing_code)"
+            )
+        )
+
+
+def backfill_pairing_codes(engine: Engine, batch_size: int = 1000) -> int:
+    add_pairing_code_column(engine)
+    backfilled = 0
+    with Session(engine) as session:
+        while True:
+            result_ids = session.exec(
+                select(col(Result.id)).where(col(Result.pairing_code).is_(None)).limit(batch_size)
+            ).all()
+            if not result_ids:
+                return backfilled
+            # The whole batch gets new codes in the unlikely case that one was taken
+            for attempt in range(1, PAIRING_CODE_ATTEMPTS + 1):
+                try:
+                    session.execute(
+                        update(Result),
+                        [
+                            {"id": result_id, "pairing_code": new_pairing_code()}
+                            for result_id in result_ids
+                        ],
+                    )
+                    session.commit()
+                    break
+                except IntegrityError as e:
+                    session.rollback()
+                    if "result.pairing_code" not in str(e) or attempt == PAIRING_CODE_ATTEMPTS:
+                        raise
+            backfilled += len(result_ids)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Add the pairing code column to an existing database and fill it"
+    )
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+    backfilled = backfill_pairing_codes(get_engine(), args.batch_size)
+    print(f"Backfilled pairing codes for {backfilled} results")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+import argparse
+
+from sqlalchemy import Engine, inspect, text
+from sqlmodel import Session, col, select, update
+
+from k_matcher.database import create_db_and_tables, get_engine
+from k_matcher.domain.answer_vector import decode_answer_vector
+from k_matcher.models.models import Result
+from k_matcher.questionnaires import snapshot_questionnaire
+
+
+def add_questionnaire_column(engine: Engine):
+    columns = {column["name"] for column in inspect(engine).get_columns("result")}
+    with engine.begin() as connection:
+        if "questionnaire_id" not in columns:
+            connection.execute(
+                text(
+                    "ALTER TABLE result ADD COLUMN questionnaire_id INTEGER "
+                    "REFERENCES questionnaire (id)"
+                )
+            )
+        connection.execute(
+            text(
+                "CREATE INDEX IF NOT EXISTS ix_result_questionnaire_id "
+                "ON result (questionnaire_id)"
+            )
+        )
+
+
+def backfill_questionnaires(engine: Engine, batch_size: int = 1000) -> int:
+    """Assigns each result the questionnaire of the questions it answered"""
+    create_db_and_tables(engine)
+    add_questionnaire_column(engine)
+    backfilled = 0
+    with Session(engine) as session:
+        while True:
+            rows = session.exec(
+                select(col(Result.id), col(Result.answers_vector))
+                .where(
+                    col(Result.questionnaire_id).is_(None),
+                    col(Result.answers_vector).is_not(None),
+                )
+                .limit(batch_size)
+            ).all()
+            if not rows:
+                return backfilled
+            updates = []
+            for result_id, answers_vector in rows:
+                assert answers_vector is not None
+                question_ids = decode_answer_vector(answers_vector).question_ids
+                questionnaire = snapshot_questionnaire(session, question_ids)
+                updates.append({"id": result_id, "questionnaire_id": questionnaire.id})
+            session.execute(update(Result), updates)
+            session.commit()
+            backfilled += len(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Add the questionnaire column to an existing database and fill it"
+    )
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+    backfilled = backfill_questionnaires(get_engine(), args.batch_size)
+    print(f"Backfilled questionnaires for {backfilled} results")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+import argparse
+import logging
+from pathlib import Path
+
+from sqlalchemy import Engine
+from sqlmodel import Session
+
+from k_matcher.config import get_config
+from k_matcher.database import get_engine
+from k_matcher.match_index import MatchIndex
+
+logger = logging.getLogger(__name__)
+
+
+def build_match_index(engine: Engine, path: Path, block_size: int) -> int:
+    """Brings the index file up to date with the database. It is built from scratch when
+    there is none, when it is truncated or corrupt, or when it has another block size"""
+    index = MatchIndex(block_size)
+    if path.exists():
+        try:
+            loaded = MatchIndex.load(path)
+        except ValueError as e:
+            logger.warning("%s, rebuilding the match index from the database", e)
+        else:
+            if loaded.block_size == block_size:
+                index = loaded
+            else:
+                logger.warning(
+                    "%s has a block size of %d, rebuilding it with %d",
+                    path,
+                    loaded.block_size,
+                    block_size,
+                )
+    with Session(engine) as session:
+        index.refresh(session)
+    index.save(path)
+    return len(index)
+
+
+def main():
+    settings = get_config().match_index
+    parser = argparse.ArgumentParser(
+        description="Build the nearest results index from the database, so that workers load it"
+    )
+    parser.add_argument("--path", type=Path, default=Path(settings.path))
+    parser.add_argument("--block-size", type=int, default=settings.block_size)
+    args = parser.parse_args()
+    indexed = build_match_index(get_engine(), args.path, args.block_size)
+    print(f"Indexed {indexed} results in {args.path}")
+
+
+if __name__ == "__main__":
+    main()
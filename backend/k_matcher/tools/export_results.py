@@ -0,0 +1,59 @@
+import argparse
+import sys
+from typing import Any, BinaryIO, Iterable, Iterator
+
+from sqlalchemy import Engine
+
+from k_matcher.config import get_config
+from k_matcher.database import get_engine
+from k_matcher.export import COLUMNS, ExportFormat, ExportKind, encode_rows, export_rows
+
+
+def export_results(
+    engine: Engine,
+    output: BinaryIO,
+    kind: ExportKind,
+    export_format: ExportFormat,
+    since: int | None = None,
+    batch_size: int = 1000,
+) -> tuple[int, int | None]:
+    """Write the export to output, returns the row count and the last seq"""
+    seq = COLUMNS[kind].index("seq")
+    count, watermark = 0, None
+
+    def counted(rows: Iterable[tuple[Any, ...]]) -> Iterator[tuple[Any, ...]]:
+        nonlocal count, watermark
+        for row in rows:
+            count += 1
+            watermark = row[seq]
+            yield row
+
+    with engine.connect() as connection:
+        rows = counted(export_rows(connection, kind, since, batch_size))
+        for chunk in encode_rows(rows, kind, export_format, batch_size):
+            output.write(chunk)
+    return count, watermark
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Stream results or answers as NDJSON or CSV, to stdout by default"
+    )
+    parser.add_argument("kind", choices=["results", "answers"])
+    parser.add_argument("--format", choices=["ndjson", "csv"], default="ndjson")
+    parser.add_argument(
+        "--since",
+        type=int,
+        help="only rows written after this seq, the watermark of the previous export",
+    )
+    parser.add_argument("--output", type=argparse.FileType("wb"), default=sys.stdout.buffer)
+    parser.add_argument("--batch-size", type=int, default=get_config().export.batch_size)
+    args = parser.parse_args()
+    count, watermark = export_results(
+        get_engine(), args.output, args.kind, args.format, args.since, args.batch_size
+    )
+    print(f"Exported {count} {args.kind}, watermark: {watermark}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
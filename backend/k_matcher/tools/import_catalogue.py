@@ -0,0 +1,150 @@
+"""Import questions and categories from a YAML, JSON or CSV file, upserting by id.
+
+YAML and JSON files hold a mapping with "categories" and "questions" lists.
+CSV files are streamed row by row and hold one question per row with the columns
+category_id, category_name, category_description (optional), question_id, question_text.
+The whole file is imported in one transaction, so a bad row leaves the catalogue as it was.
+"""
+
+import argparse
+import csv
+import json
+import time
+from pathlib import Path
+from typing import Any, Iterator
+
+from pydantic import BaseModel
+from sqlalchemy import Connection, Engine
+from sqlalchemy.dialects.sqlite import insert
+from sqlmodel import SQLModel
+from yaml import safe_load
+
+from k_matcher.database import create_db_and_tables, get_engine
+from k_matcher.models.models import Question, QuestionCategory
+
+
+class ImportStats(BaseModel):
+    categories: int = 0
+    questions: int = 0
+    seconds: float = 0.0
+
+    @property
+    def rows_per_second(self) -> float:
+        return (self.categories + self.questions) / self.seconds if self.seconds else 0.0
+
+
+# Plain mirrors of the table models with a required id: validating through the
+# table models themselves builds an instrumented ORM object per row.
+class QuestionCategoryRow(BaseModel):
+    id: int
+    name: str
+    description: str | None = None
+
+
+class QuestionRow(BaseModel):
+    id: int
+    text: str
+    category_id: int
+
+
+ROW_MODELS: dict[type[SQLModel], type[BaseModel]] = {
+    QuestionCategory: QuestionCategoryRow,
+    Question: QuestionRow,
+}
+
+
+def _validated(model: type[SQLModel], row: dict[str, Any]) -> dict[str, Any]:
+    return ROW_MODELS[model].model_validate(row).model_dump()
+
+
+def read_document(path: Path) -> Iterator[tuple[type[SQLModel], dict[str, Any]]]:
+    with open(path, "r", encoding="utf-8") as f:
+        if path.suffix == ".json":
+            document = json.load(f)
+        else:
+            document = safe_load(f)
+    for row in document.get("categories", []):
+        yield QuestionCategory, _validated(QuestionCategory, row)
+    for row in document.get("questions", []):
+        yield Question, _validated(Question, row)
+
+
+CSV_COLUMNS = ("category_id", "category_name", "question_id", "question_text")
+
+
+def read_csv(path: Path) -> Iterator[tuple[type[SQLModel], dict[str, Any]]]:
+    seen_category_ids = set()
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        reader = csv.DictReader(f)
+        missing = [column for column in CSV_COLUMNS if column not in (reader.fieldnames or [])]
+        if missing:
+            raise ValueError(f"{path} is missing the columns: {', '.join(missing)}")
+        for row in reader:
+            category_id = int(row["category_id"])
+            if category_id not in seen_category_ids:
+                seen_category_ids.add(category_id)
+                category = {
+                    "id": category_id,
+                    "name": row["category_name"],
+                    "description": row.get("category_description") or None,
+                }
+                yield QuestionCategory, _validated(QuestionCategory, category)
+            question = {"id": row["question_id"], "text": row["question_text"]}
+            yield Question, _validated(Question, question | {"category_id": category_id})
+
+
+def _upsert(connection: Connection, model: type[SQLModel], rows: list[dict[str, Any]]):
+    if not rows:
+        return
+    statement = insert(model)
+    columns = [name for name in rows[0] if name != "id"]
+    connection.execute(
+        statement.on_conflict_do_update(
+            index_elements=["id"],
+            set_={name: statement.excluded[name] for name in columns},
+        ),
+        rows,
+    )
+
+
+def import_catalogue(engine: Engine, path: Path, batch_size: int = 10000) -> ImportStats:
+    create_db_and_tables(engine)
+    rows = read_csv(path) if path.suffix == ".csv" else read_document(path)
+    stats = ImportStats()
+    started = time.perf_counter()
+    categories: list[dict[str, Any]] = []
+    questions: list[dict[str, Any]] = []
+
+    def flush(connection: Connection):
+        # Categories go first so the questions of the same batch can reference them
+        _upsert(connection, QuestionCategory, categories)
+        _upsert(connection, Question, questions)
+        stats.categories += len(categories)
+        stats.questions += len(questions)
+        categories.clear()
+        questions.clear()
+
+    with engine.begin() as connection:
+        for model, row in rows:
+            (categories if model is QuestionCategory else questions).append(row)
+            if len(categories) + len(questions) >= batch_size:
+                flush(connection)
+        flush(connection)
+    stats.seconds = time.perf_counter() - started
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("path", type=Path, help="a .yaml, .yml, .json or .csv file")
+    parser.add_argument("--batch-size", type=int, default=10000)
+    args = parser.parse_args()
+    stats = import_catalogue(get_engine(), args.path, args.batch_size)
+    print(
+        f"Imported {stats.categories} categories and {stats.questions} questions "
+        f"in {stats.seconds:.2f}s ({stats.rows_per_second:.0f} rows/s)"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""Bring a database created by an older version up to date, then fill the new columns.
+
+Runs every backfill in the order they depend on each other; each of them skips what is
+already done, so it is safe to run again after an interruption.
+"""
+
+import argparse
+
+from sqlalchemy import Engine
+
+from k_matcher.database import check_schema, create_db_and_tables, get_engine
+from k_matcher.tools.backfill_answer_vectors import (
+    add_answers_vector_column,
+    backfill_answer_vectors,
+)
+from k_matcher.tools.backfill_change_sequence import (
+    add_change_sequence_columns,
+    backfill_change_sequence,
+)
+from k_matcher.tools.backfill_match_items import backfill_match_items
+from k_matcher.tools.backfill_pairing_codes import (
+    add_pairing_code_column,
+    backfill_pairing_codes,
+)
+from k_matcher.tools.backfill_questionnaires import (
+    add_questionnaire_column,
+    backfill_questionnaires,
+)
+
+
+def migrate(engine: Engine, batch_size: int = 1000) -> dict[str, int]:
+    """Returns the number of results each backfill filled in"""
+    create_db_and_tables(engine)
+    for add_columns in (
+        add_answers_vector_column,
+        add_pairing_code_column,
+        add_questionnaire_column,
+        add_change_sequence_columns,
+    ):
+        add_columns(engine)
+    check_schema(engine)
+    # Questionnaires are read from the answer vectors
+    return {
+        "answer vectors": backfill_answer_vectors(engine, batch_size),
+        "match items": backfill_match_items(engine, batch_size),
+        "pairing codes": backfill_pairing_codes(engine, batch_size),
+        "questionnaires": backfill_questionnaires(engine, batch_size),
+        "change sequence": backfill_change_sequence(engine),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+    for name, backfilled in migrate(get_engine(), args.batch_size).items():
+        print(f"Backfilled {name} for {backfilled} results")
+
+
+if __name__ == "__main__":
+    main()
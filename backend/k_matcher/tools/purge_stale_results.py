@@ -0,0 +1,120 @@
+import argparse
+import datetime
+import time
+
+from pydantic import BaseModel
+from sqlalchemy import Connection, Engine, delete
+from sqlmodel import Session, col, select
+
+from k_matcher.config import get_config
+from k_matcher.database import create_db_and_tables, get_engine
+from k_matcher.models.models import Answer, MatchItem, Result
+
+INCREMENTAL_VACUUM_PAGES = 1000
+
+
+class PurgeStats(BaseModel):
+    results: int = 0
+    answers: int = 0
+    bytes_before: int = 0
+    bytes_after: int = 0
+
+    @property
+    def bytes_reclaimed(self) -> int:
+        return self.bytes_before - self.bytes_after
+
+
+def database_size(connection: Connection) -> int:
+    page_count = connection.exec_driver_sql("PRAGMA page_count").scalar_one()
+    page_size = connection.exec_driver_sql("PRAGMA page_size").scalar_one()
+    return page_count * page_size
+
+
+def compact(connection: Connection, full_vacuum: bool = False):
+    """Give free pages back to the file system and refresh the query planner statistics"""
+    if full_vacuum:
+        # Rewrites the whole file and locks it meanwhile, but also switches a database
+        # created without auto_vacuum to INCREMENTAL for the following runs
+        connection.exec_driver_sql("PRAGMA auto_vacuum=INCREMENTAL")
+        connection.exec_driver_sql("VACUUM")
+    elif connection.exec_driver_sql("PRAGMA auto_vacuum").scalar_one() == 2:
+        # A bounded number of pages per statement, so the write lock is released in
+        # between. Each step frees one page, so the DBAPI cursor has to be drained.
+        cursor = connection.connection.cursor()
+        while connection.exec_driver_sql("PRAGMA freelist_count").scalar_one():
+            cursor.execute(f"PRAGMA incremental_vacuum({INCREMENTAL_VACUUM_PAGES})").fetchall()
+        cursor.close()
+    connection.exec_driver_sql("ANALYZE")
+
+
+def purge_stale_results(
+    engine: Engine,
+    ttl: datetime.timedelta,
+    batch_size: int = 500,
+    batch_pause: float = 0.0,
+    full_vacuum: bool = False,
+) -> PurgeStats:
+    create_db_and_tables(engine)
+    cutoff = datetime.datetime.now() - ttl
+    stats = PurgeStats()
+    with engine.connect() as connection:
+        stats.bytes_before = database_size(connection)
+
+    with Session(engine) as session:
+        while True:
+            result_ids = session.exec(
+                select(col(Result.id))
+                .where(col(Result.matching_result).is_(None), col(Result.created_at) < cutoff)
+                .limit(batch_size)
+            ).all()
+            if not result_ids:
+                break
+            # Deleted explicitly rather than through ON DELETE CASCADE to count them
+            deleted_answers = session.execute(
+                delete(Answer).where(col(Answer.result_id).in_(result_ids))
+            )
+            session.execute(delete(MatchItem).where(col(MatchItem.result_id).in_(result_ids)))
+            deleted_results = session.execute(delete(Result).where(col(Result.id).in_(result_ids)))
+            session.commit()
+            stats.answers += deleted_answers.rowcount  # type: ignore[attr-defined]
+            stats.results += deleted_results.rowcount  # type: ignore[attr-defined]
+            if batch_pause:
+                time.sleep(batch_pause)
+
+    with engine.connect() as connection:
+        compact(connection, full_vacuum)
+        connection.commit()
+        stats.bytes_after = database_size(connection)
+    return stats
+
+
+def main():
+    settings = get_config().retention
+    parser = argparse.ArgumentParser(
+        description="Delete unmatched results older than the TTL, then compact the database"
+    )
+    parser.add_argument("--ttl-days", type=int, default=settings.ttl_days)
+    parser.add_argument("--batch-size", type=int, default=settings.batch_size)
+    parser.add_argument("--batch-pause-ms", type=int, default=settings.batch_pause_ms)
+    parser.add_argument(
+        "--full-vacuum",
+        action="store_true",
+        help="VACUUM the whole file, needed once for databases created without auto_vacuum",
+    )
+    args = parser.parse_args()
+    stats = purge_stale_results(
+        get_engine(),
+        datetime.timedelta(days=args.ttl_days),
+        args.batch_size,
+        args.batch_pause_ms / 1000,
+        args.full_vacuum,
+    )
+    print(
+        f"Deleted {stats.results} results and {stats.answers} answers, "
+        f"reclaimed {stats.bytes_reclaimed} bytes "
+        f"({stats.bytes_before} -> {stats.bytes_after})"
+    )
+
+
+if __name__ == "__main__":
+    main()
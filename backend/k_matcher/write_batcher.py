@@ -0,0 +1,139 @@
+"""Group commit: results submitted from many request threads share one transaction"""
+
+import functools
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, NamedTuple, Sequence
+
+from sqlalchemy import Connection, Engine, insert
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import Session
+
+from k_matcher.config import get_config
+from k_matcher.database import get_engine
+from k_matcher.models.models import Answer, Result
+
+# Longer than the fast profile's busy_timeout, so a write waiting for the lock isn't cut short
+WRITE_TIMEOUT_SECONDS = 60.0
+
+
+class NewResult(NamedTuple):
+    result: dict[str, Any]
+    answers: list[dict[str, Any]]
+
+
+def insert_results(connection: Connection | Session, new_results: Sequence[NewResult]):
+    connection.execute(insert(Result), [new_result.result for new_result in new_results])
+    answers = [answer for new_result in new_results for answer in new_result.answers]
+    if answers:
+        connection.execute(insert(Answer), answers)
+
+
+class WriteBatcher:
+    """Collects results for up to flush_window seconds or max_batch_size results, then
+    commits them at once. If the batch fails, its results are committed one by one, so
+    that only the offending ones get their IntegrityError."""
+
+    def __init__(
+        self,
+        engine: Engine,
+        flush_window: float,
+        max_batch_size: int,
+        write_timeout: float = WRITE_TIMEOUT_SECONDS,
+    ) -> None:
+        self.engine = engine
+        self.flush_window = flush_window
+        self.max_batch_size = max_batch_size
+        self.write_timeout = write_timeout
+        self._queue: queue.Queue[tuple[NewResult, Future[None]] | None] = queue.Queue()
+        # Nothing is queued behind the stop marker, it would never be written
+        self._closed = False
+        self._close_lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name="write-batcher", daemon=True)
+        self._thread.start()
+        self.batches = 0
+        self.results = 0
+
+    def write(self, new_result: NewResult):
+        """Blocks until the result is committed, raises what the insert raised, or
+        TimeoutError when the writer doesn't get to it within write_timeout seconds"""
+        future: Future[None] = Future()
+        with self._close_lock:
+            if self._closed:
+                raise RuntimeError("The write batcher is closed")
+            self._queue.put((new_result, future))
+        future.result(timeout=self.write_timeout)
+
+    def close(self):
+        """Commits what is queued and stops the writer thread; later writes raise"""
+        with self._close_lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._queue.put(None)
+        self._thread.join()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            batch = [item]
+            deadline = time.monotonic() + self.flush_window
+            stopping = False
+            while len(batch) < self.max_batch_size:
+                try:
+                    item = self._queue.get(timeout=max(deadline - time.monotonic(), 0))
+                except queue.Empty:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+            self._flush(batch)
+            if stopping:
+                return
+
+    def _flush(self, batch: list[tuple[NewResult, Future[None]]]):
+        try:
+            self._commit([new_result for new_result, _ in batch])
+        except IntegrityError:
+            for new_result, future in batch:
+                try:
+                    self._commit([new_result])
+                except Exception as e:
+                    future.set_exception(e)
+                else:
+                    future.set_result(None)
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+        else:
+            for _, future in batch:
+                future.set_result(None)
+
+    def _commit(self, new_results: list[NewResult]):
+        with self.engine.begin() as connection:
+            insert_results(connection, new_results)
+        self.batches += 1
+        self.results += len(new_results)
+
+
+@functools.cache
+def get_write_batcher() -> WriteBatcher | None:
+    """None when write batching is turned off"""
+    settings = get_config().write_batching
+    if not settings.enabled:
+        return None
+    return WriteBatcher(get_engine(), settings.flush_window_ms / 1000, settings.max_batch_size)
+
+
+def close_write_batcher():
+    """Commits what is queued; the next get_write_batcher starts a new batcher"""
+    if get_write_batcher.cache_info().currsize:
+        batcher = get_write_batcher()
+        get_write_batcher.cache_clear()
+        if batcher is not None:
+            batcher.close()
@@ -1,11 +1,14 @@
 import pytest
 from fastapi.testclient import TestClient
+from sqlalchemy import event
 from sqlmodel import Session, create_engine
 from sqlmodel.pool import StaticPool
 
+from k_matcher.catalogue_cache import catalogue_cache
 from k_matcher.database import create_db_and_tables, get_session
 from k_matcher.main import app
 from k_matcher.models.models import Question, QuestionCategory
+from k_matcher.questionnaires import questionnaire_cache
 
 
 @pytest.fixture
@@ -18,6 +21,19 @@ def engine():
     )
 
 
+@pytest.fixture
+def statements(engine):
+    """SQL statements executed by the engine during the test"""
+    executed: list[str] = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        executed.append(statement)
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    yield executed
+    event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+
 @pytest.fixture
 def session(engine):
     with Session(engine) as session:
@@ -35,6 +51,8 @@ def test_client(engine):
         app.dependency_overrides[get_session] = get_session_override
     yield TestClient(app)
     app.dependency_overrides.clear()
+    catalogue_cache.clear()
+    questionnaire_cache.clear()
 
 
 @pytest.fixture
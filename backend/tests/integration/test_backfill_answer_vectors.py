@@ -0,0 +1,45 @@
+import datetime
+
+from sqlmodel import Session, select
+
+from k_matcher.database import create_db_and_tables
+from k_matcher.domain.answer_vector import decode_answer_vector
+from k_matcher.domain.enums import AnswerEnum
+from k_matcher.domain.match_engine import encode_answer
+from k_matcher.models.models import Answer, Question, QuestionCategory, Result
+from k_matcher.tools.backfill_answer_vectors import backfill_answer_vectors
+
+
+def test_backfill_answer_vectors(engine, session: Session):
+    create_db_and_tables(engine)
+    session.add(QuestionCategory(id=1, name="category_1"))
+    session.flush()
+    session.add_all([Question(id=i, text=f"text {i}", category_id=1) for i in range(1, 5)])
+    result = Result(created_at=datetime.datetime.now())
+    empty_result = Result(created_at=datetime.datetime.now())
+    session.add_all([result, empty_result])
+    session.add_all(
+        [
+            Answer(result_id=result.id, question_id=4, answer=AnswerEnum.NEED, if_forced=True),
+            Answer(result_id=result.id, question_id=1, answer=AnswerEnum.NEVER),
+            Answer(result_id=result.id, question_id=3, answer=AnswerEnum.MAYBE),
+        ]
+    )
+    session.commit()
+
+    assert backfill_answer_vectors(engine, batch_size=1) == 2
+    assert backfill_answer_vectors(engine) == 0
+
+    vectors = {
+        result_id: decode_answer_vector(blob)
+        for result_id, blob in session.exec(select(Result.id, Result.answers_vector))
+    }
+    assert vectors[result.id].question_ids == (1, 3, 4)
+    assert vectors[result.id].answers == bytes(
+        [
+            encode_answer(AnswerEnum.NEVER, False),
+            encode_answer(AnswerEnum.MAYBE, False),
+            encode_answer(AnswerEnum.NEED, True),
+        ]
+    )
+    assert vectors[empty_result.id] == ((), b"")
@@ -0,0 +1,33 @@
+import datetime
+
+from sqlmodel import Session, SQLModel, col, select
+
+from k_matcher.models.models import Result
+from k_matcher.tools.backfill_change_sequence import backfill_change_sequence
+
+
+def test_backfill_change_sequence(engine, session: Session):
+    # Written before the change sequence triggers existed
+    SQLModel.metadata.create_all(engine)
+    now = datetime.datetime.now()
+    results = [Result(created_at=now - datetime.timedelta(days=days)) for days in (1, 3, 2)]
+    session.add_all(results)
+    session.commit()
+
+    assert backfill_change_sequence(engine) == 3
+    assert backfill_change_sequence(engine) == 0
+
+    session.add(Result(created_at=now - datetime.timedelta(days=5)))
+    session.commit()
+    rows = session.exec(
+        select(col(Result.created_at), col(Result.created_seq), col(Result.updated_seq)).order_by(
+            col(Result.created_seq)
+        )
+    ).all()
+    assert [(created_seq, updated_seq) for _, created_seq, updated_seq in rows] == [
+        (1, 1),
+        (2, 2),
+        (3, 3),
+        (4, 4),
+    ]
+    assert [created_at for created_at, _, _ in rows[:3]] == sorted(r.created_at for r in results)
@@ -0,0 +1,30 @@
+from fastapi.testclient import TestClient
+from sqlmodel import Session, delete, select
+
+from k_matcher.models.models import MatchItem
+from k_matcher.tools.backfill_match_items import backfill_match_items
+
+
+def _dump_items(session: Session) -> list[dict]:
+    items = [item.model_dump() for item in session.exec(select(MatchItem))]
+    return sorted(items, key=lambda item: (str(item["result_id"]), item["question_id"]))
+
+
+def test_backfill_match_items(
+    engine, test_client: TestClient, session: Session, fill_db_with_questions
+):
+    answers = [
+        {"question_id": question_id, "answer": 3, "if_forced": False} for question_id in range(1, 5)
+    ]
+    for _ in range(3):
+        result_id = test_client.post("/results", json={"answers": answers}).json()["id"]
+        test_client.post("/results", json={"answers": answers, "partner_id": result_id})
+    test_client.post("/results", json={"answers": answers})
+
+    stored_items = _dump_items(session)
+    assert len(stored_items) == 12
+    session.exec(delete(MatchItem))  # type: ignore
+    session.commit()
+
+    assert backfill_match_items(engine, batch_size=2) == 3
+    assert _dump_items(session) == stored_items
@@ -0,0 +1,39 @@
+import datetime
+
+from sqlmodel import Session, col, select
+
+from k_matcher.database import create_db_and_tables
+from k_matcher.domain.pairing_code import is_pairing_code
+from k_matcher.models.models import Result
+from k_matcher.tools import backfill_pairing_codes as backfill_module
+from k_matcher.tools.backfill_pairing_codes import backfill_pairing_codes
+
+
+def test_backfill_pairing_codes(engine, session: Session):
+    create_db_and_tables(engine)
+    session.add_all([Result(created_at=datetime.datetime.now()) for _ in range(3)])
+    session.commit()
+
+    assert backfill_pairing_codes(engine, batch_size=2) == 3
+    assert backfill_pairing_codes(engine) == 0
+
+    pairing_codes = session.exec(select(col(Result.pairing_code))).all()
+    assert len(set(pairing_codes)) == 3
+    assert all(is_pairing_code(code) for code in pairing_codes if code)
+
+
+def test_backfill_pairing_codes__collision(engine, session: Session, monkeypatch):
+    create_db_and_tables(engine)
+    session.add(Result(created_at=datetime.datetime.now(), pairing_code="2222222222"))
+    session.add_all([Result(created_at=datetime.datetime.now()) for _ in range(2)])
+    session.commit()
+    # The first code drawn is taken, the retry draws new ones
+    codes = iter(["2222222222", "3333333333", "4444444444", "5555555555"])
+    monkeypatch.setattr(backfill_module, "new_pairing_code", lambda: next(codes))
+
+    assert backfill_pairing_codes(engine) == 2
+    assert sorted(session.exec(select(col(Result.pairing_code))).all()) == [
+        "2222222222",
+        "4444444444",
+        "5555555555",
+    ]
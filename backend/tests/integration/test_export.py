@@ -0,0 +1,116 @@
+import csv
+import datetime
+import io
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlmodel import Session, update
+
+from k_matcher.config import get_config
+from k_matcher.models.models import Result
+from k_matcher.tools.export_results import export_results
+
+ANSWERS = [
+    {"question_id": question_id, "answer": 3, "if_forced": question_id == 2}
+    for question_id in range(1, 5)
+]
+
+
+@pytest.fixture
+def export_token(monkeypatch) -> str:
+    monkeypatch.setattr(get_config().export, "token", "secret")
+    return "secret"
+
+
+@pytest.fixture
+def matched_results(test_client: TestClient, fill_db_with_questions) -> list[dict]:
+    partner = test_client.post("/results", json={"answers": ANSWERS}).json()
+    match = test_client.post("/results", json={"partner_id": partner["id"], "answers": ANSWERS})
+    unmatched = test_client.post("/results", json={"answers": ANSWERS}).json()
+    return [match.json(), unmatched]
+
+
+def test_export__requires_token(test_client: TestClient, export_token: str):
+    assert test_client.get("/export/results").status_code == 401
+    response = test_client.get("/export/results", headers={"Authorization": "Bearer wrong"})
+    assert response.status_code == 401
+
+
+def test_export__disabled_without_token(test_client: TestClient):
+    assert get_config().export.token is None
+    response = test_client.get("/export/results", headers={"Authorization": "Bearer "})
+    assert response.status_code == 404
+
+
+def test_export__results_ndjson(test_client: TestClient, export_token: str, matched_results):
+    headers = {"Authorization": f"Bearer {export_token}"}
+    response = test_client.get("/export/results", headers=headers)
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert [(row["id"], row["matching_result"]) for row in rows] == [
+        (result["id"], result["matching_result"]) for result in matched_results
+    ]
+
+    response = test_client.get("/export/results", params={"since": rows[0]["seq"]}, headers=headers)
+    assert [json.loads(line)["id"] for line in response.text.splitlines()] == [rows[1]["id"]]
+
+
+def test_export__answers_csv(test_client: TestClient, export_token: str, matched_results):
+    response = test_client.get(
+        "/export/answers",
+        params={"format": "csv"},
+        headers={"Authorization": f"Bearer {export_token}"},
+    )
+    assert response.status_code == 200
+    rows = list(csv.DictReader(io.StringIO(response.text)))
+    assert len(rows) == 2 * len(ANSWERS)
+    assert rows[1] | {"seq": None, "created_at": None} == {
+        "seq": None,
+        "result_id": matched_results[0]["id"],
+        "question_id": "2",
+        "answer": "3",
+        "if_forced": "True",
+        "created_at": None,
+    }
+
+
+def test_export_results__batches_and_watermark(engine, matched_results):
+    output = io.BytesIO()
+    count, watermark = export_results(engine, output, "answers", "ndjson", batch_size=3)
+    rows = [json.loads(line) for line in output.getvalue().splitlines()]
+    assert count == len(rows) == 2 * len(ANSWERS)
+    assert watermark == rows[-1]["seq"]
+
+    output = io.BytesIO()
+    assert export_results(engine, output, "results", "csv", since=watermark) == (0, None)
+    assert output.getvalue().decode().splitlines() == [
+        "seq,id,pairing_code,created_at,matching_result"
+    ]
+
+
+def test_export_results__late_commits_and_matches(
+    test_client: TestClient, engine, session: Session, fill_db_with_questions
+):
+    first = test_client.post("/results", json={"answers": ANSWERS}).json()
+    count, watermark = export_results(engine, io.BytesIO(), "results", "ndjson")
+    assert count == 1
+
+    # Committed after the export, but with an earlier created_at
+    late = test_client.post("/results", json={"answers": ANSWERS}).json()
+    session.execute(update(Result).values(created_at=datetime.datetime(2000, 1, 1)))
+    session.commit()
+    test_client.post("/results", json={"partner_id": first["id"], "answers": ANSWERS})
+
+    output = io.BytesIO()
+    assert export_results(engine, output, "results", "ndjson", since=watermark)[0] == 2
+    rows = [json.loads(line) for line in output.getvalue().splitlines()]
+    assert [row["id"] for row in rows] == [late["id"], first["id"]]
+    assert rows[1]["matching_result"] is not None
+
+    # Answers don't change when their result is matched
+    output = io.BytesIO()
+    export_results(engine, output, "answers", "ndjson", since=watermark)
+    rows = [json.loads(line) for line in output.getvalue().splitlines()]
+    assert {row["result_id"] for row in rows} == {late["id"]}
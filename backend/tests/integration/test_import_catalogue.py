@@ -0,0 +1,85 @@
+import json
+from pathlib import Path
+
+import pytest
+from pydantic import ValidationError
+from sqlmodel import Session, select
+
+from k_matcher.models.models import Question, QuestionCategory
+from k_matcher.tools.import_catalogue import import_catalogue
+
+
+def test_import_catalogue__csv_upserts(engine, session: Session, tmp_path: Path):
+    path = tmp_path / "catalogue.csv"
+    path.write_text(
+        "category_id,category_name,category_description,question_id,question_text\n"
+        "1,category_1,,1,text 1\n"
+        "2,category_2,about,2,text 2\n"
+        "1,category_1,,3,text 3\n"
+    )
+    stats = import_catalogue(engine, path, batch_size=2)
+    assert (stats.categories, stats.questions) == (2, 3)
+
+    path.write_text(
+        "category_id,category_name,category_description,question_id,question_text\n"
+        "1,renamed,,3,text 3 updated\n"
+    )
+    import_catalogue(engine, path)
+
+    assert [c.model_dump() for c in session.exec(select(QuestionCategory))] == [
+        {"id": 1, "name": "renamed", "description": None},
+        {"id": 2, "name": "category_2", "description": "about"},
+    ]
+    assert [q.model_dump() for q in session.exec(select(Question))] == [
+        {"id": 1, "text": "text 1", "category_id": 1},
+        {"id": 2, "text": "text 2", "category_id": 2},
+        {"id": 3, "text": "text 3 updated", "category_id": 1},
+    ]
+
+
+@pytest.mark.parametrize("suffix", [".json", ".yaml"])
+def test_import_catalogue__document(engine, session: Session, tmp_path: Path, suffix: str):
+    path = tmp_path / f"catalogue{suffix}"
+    # JSON is a subset of YAML, so the same document serves both formats
+    path.write_text(
+        json.dumps(
+            {
+                "categories": [{"id": 1, "name": "category_1"}],
+                "questions": [{"id": 7, "text": "text 7", "category_id": 1}],
+            }
+        )
+    )
+    stats = import_catalogue(engine, path)
+    assert (stats.categories, stats.questions) == (1, 1)
+    assert session.exec(select(Question)).one().model_dump() == {
+        "id": 7,
+        "text": "text 7",
+        "category_id": 1,
+    }
+
+
+def test_import_catalogue__invalid_row(engine, tmp_path: Path):
+    path = tmp_path / "catalogue.json"
+    path.write_text(json.dumps({"questions": [{"text": "no id", "category_id": 1}]}))
+    with pytest.raises(ValidationError):
+        import_catalogue(engine, path)
+
+
+def test_import_catalogue__failure_imports_nothing(engine, session: Session, tmp_path: Path):
+    path = tmp_path / "catalogue.json"
+    document = {
+        "categories": [{"id": 1, "name": "category 1"}],
+        "questions": [{"id": 1, "text": "text 1", "category_id": 1}, {"text": "no id"}],
+    }
+    path.write_text(json.dumps(document))
+    with pytest.raises(ValidationError):
+        import_catalogue(engine, path, batch_size=1)
+    assert session.exec(select(QuestionCategory)).all() == []
+    assert session.exec(select(Question)).all() == []
+
+
+def test_import_catalogue__csv_missing_columns(engine, tmp_path: Path):
+    path = tmp_path / "catalogue.csv"
+    path.write_text("category_id,question_id,question_text\n1,1,text 1\n")
+    with pytest.raises(ValueError, match="missing the columns: category_name"):
+        import_catalogue(engine, path)
@@ -0,0 +1,50 @@
+import uuid
+
+import pytest
+from sqlmodel import Session, col, select, text
+
+from k_matcher.database import check_schema
+from k_matcher.models.models import Result
+from k_matcher.tools.migrate import migrate
+
+# The tables as the first release created them
+FIRST_RELEASE_SCHEMA = [
+    "CREATE TABLE question_category (id INTEGER PRIMARY KEY, name VARCHAR NOT NULL, "
+    "description VARCHAR)",
+    "CREATE TABLE question (id INTEGER PRIMARY KEY, text VARCHAR NOT NULL, "
+    "category_id INTEGER NOT NULL REFERENCES question_category (id) ON DELETE CASCADE)",
+    "CREATE TABLE result (id CHAR(32) PRIMARY KEY, "
+    "created_at DATETIME DEFAULT CURRENT_TIMESTAMP NOT NULL, matching_result VARCHAR)",
+    "CREATE TABLE answer (result_id CHAR(32) NOT NULL REFERENCES result (id) ON DELETE CASCADE, "
+    "question_id INTEGER NOT NULL REFERENCES question (id), answer INTEGER NOT NULL, "
+    "if_forced BOOLEAN NOT NULL, PRIMARY KEY (result_id, question_id))",
+]
+
+
+def test_migrate(engine, session: Session):
+    result_id = uuid.uuid4()
+    with engine.begin() as connection:
+        for statement in FIRST_RELEASE_SCHEMA:
+            connection.execute(text(statement))
+        connection.execute(text("INSERT INTO question_category VALUES (1, 'category', NULL)"))
+        connection.execute(text("INSERT INTO question VALUES (1, 'text 1', 1), (2, 'text 2', 1)"))
+        connection.execute(
+            text("INSERT INTO result (id, matching_result) VALUES (:id, NULL)"),
+            {"id": result_id.hex},
+        )
+        connection.execute(
+            text("INSERT INTO answer VALUES (:id, 1, 3, 0), (:id, 2, 4, 1)"), {"id": result_id.hex}
+        )
+    with pytest.raises(RuntimeError, match="result.answers_vector.*tools.migrate"):
+        check_schema(engine)
+
+    assert migrate(engine)["questionnaires"] == 1
+    check_schema(engine)
+    assert migrate(engine) == dict.fromkeys(
+        ["answer vectors", "match items", "pairing codes", "questionnaires", "change sequence"], 0
+    )
+    result = session.exec(select(Result).where(col(Result.id) == result_id)).one()
+    assert result.answers_vector is not None
+    assert result.pairing_code is not None
+    assert result.questionnaire_id is not None
+    assert (result.created_seq, result.updated_seq) == (1, 1)
@@ -0,0 +1,146 @@
+import datetime
+import json
+import uuid
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlmodel import Session, col, delete, update
+
+from k_matcher import main
+from k_matcher.match_index import MatchIndex
+from k_matcher.models.models import Answer, Result
+from k_matcher.tools.build_match_index import build_match_index
+
+
+@pytest.fixture
+def index(monkeypatch) -> MatchIndex:
+    index = MatchIndex(block_size=8)
+    monkeypatch.setattr(main, "get_match_index", lambda: index)
+    return index
+
+
+def _post_answers(test_client: TestClient, answers: list[int]) -> str:
+    test_data = {
+        "answers": [
+            {"question_id": question_id, "answer": answer, "if_forced": False}
+            for question_id, answer in enumerate(answers, start=1)
+        ]
+    }
+    response = test_client.post("/results", json=test_data)
+    assert response.status_code == 200
+    return response.json()["id"]
+
+
+def _nearest(test_client: TestClient, result_id: str, k: int) -> list[dict]:
+    response = test_client.get(f"/results/{result_id}/nearest", params={"k": k})
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    return [json.loads(line) for line in response.text.splitlines()]
+
+
+def test_nearest_results(
+    test_client: TestClient, fill_db_with_questions, index: MatchIndex, session: Session
+):
+    result_id = _post_answers(test_client, [4, 3, 2, 1])
+    worst_id = _post_answers(test_client, [0, 0, 0, 0])
+    for _ in range(10):
+        _post_answers(test_client, [3, 0, 0, 0])
+    best_id = _post_answers(test_client, [4, 4, 3, 4])
+    assert len(index) == 13
+
+    nearest = _nearest(test_client, result_id, 2)
+    assert [ranked["result_id"] for ranked in nearest][:1] == [best_id]
+    assert nearest[0]["grade_counts"] == {"4": 1, "3": 1, "2": 1, "1": 1}
+    assert nearest[1]["match_count"] == 1
+    assert worst_id not in [ranked["result_id"] for ranked in _nearest(test_client, result_id, 11)]
+
+    # Deleted by another process, e.g. the retention job
+    session.exec(delete(Answer).where(col(Answer.result_id) == uuid.UUID(best_id)))  # type: ignore
+    session.exec(delete(Result).where(col(Result.id) == uuid.UUID(best_id)))  # type: ignore
+    session.commit()
+    assert best_id not in [ranked["result_id"] for ranked in _nearest(test_client, result_id, 2)]
+    assert len(index) == 12
+
+
+def test_nearest_results__refresh(
+    test_client: TestClient, fill_db_with_questions, engine, monkeypatch
+):
+    monkeypatch.setattr(main, "get_match_index", lambda: None)
+    # Created by another worker, or before the index was enabled
+    result_id = _post_answers(test_client, [4, 3, 2, 1])
+    best_id = _post_answers(test_client, [4, 4, 3, 4])
+
+    index = MatchIndex(block_size=8)
+    monkeypatch.setattr(main, "get_match_index", lambda: index)
+    assert [ranked["result_id"] for ranked in _nearest(test_client, result_id, 1)] == [best_id]
+    assert len(index) == 2
+    _post_answers(test_client, [4, 4, 4, 4])
+    with Session(engine) as session:
+        assert index.refresh(session) == 0
+    assert len(index) == 3
+
+
+def test_nearest_results__refresh_by_commit_order(
+    test_client: TestClient, fill_db_with_questions, engine, monkeypatch
+):
+    index = MatchIndex(block_size=8)
+    monkeypatch.setattr(main, "get_match_index", lambda: index)
+    _post_answers(test_client, [4, 3, 2, 1])
+    with Session(engine) as session:
+        assert index.refresh(session) == 0
+
+    # Committed by another worker after the refresh, but created long before it
+    monkeypatch.setattr(main, "get_match_index", lambda: None)
+    late_id = _post_answers(test_client, [4, 4, 3, 4])
+    with Session(engine) as session:
+        session.exec(
+            update(Result)  # type: ignore
+            .where(col(Result.id) == uuid.UUID(late_id))
+            .values(created_at=datetime.datetime(2000, 1, 1))
+        )
+        session.commit()
+        assert index.refresh(session) == 1
+        assert index.refresh(session) == 0
+    assert len(index) == 2
+
+
+def test_nearest_results__invalid(test_client: TestClient, fill_db_with_questions, index):
+    result_id = _post_answers(test_client, [4, 3, 2, 1])
+    assert test_client.get(f"/results/{uuid.uuid4()}/nearest").status_code == 404
+    assert test_client.get(f"/results/{result_id}/nearest", params={"k": 0}).status_code == 422
+    assert test_client.get(f"/results/{result_id}/nearest", params={"k": 101}).status_code == 422
+
+
+def test_nearest_results__disabled(test_client: TestClient, fill_db_with_questions):
+    result_id = _post_answers(test_client, [4, 3, 2, 1])
+    response = test_client.get(f"/results/{result_id}/nearest")
+    assert response.status_code == 404
+    assert response.json() == {"detail": "Match index is disabled"}
+
+
+def test_build_match_index(test_client: TestClient, fill_db_with_questions, engine, tmp_path):
+    for answer in range(5):
+        _post_answers(test_client, [4, 3, 2, answer])
+    path = tmp_path / "match_index.bin"
+    assert build_match_index(engine, path, block_size=8) == 5
+    assert build_match_index(engine, path, block_size=8) == 5
+
+    _post_answers(test_client, [4, 4, 4, 4])
+    assert build_match_index(engine, path, block_size=8) == 6
+    index = MatchIndex.load(path)
+    assert len(index) == 6
+    assert index.watermark is not None
+
+
+def test_build_match_index__rebuilt(
+    test_client: TestClient, fill_db_with_questions, engine, tmp_path
+):
+    for answer in range(3):
+        _post_answers(test_client, [4, 3, 2, answer])
+    path = tmp_path / "match_index.bin"
+    path.write_bytes(b"not an index")
+    assert build_match_index(engine, path, block_size=8) == 3
+
+    assert build_match_index(engine, path, block_size=2) == 3
+    index = MatchIndex.load(path)
+    assert (len(index), index.block_size) == (3, 2)
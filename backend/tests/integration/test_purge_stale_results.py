@@ -0,0 +1,48 @@
+import datetime
+
+from sqlalchemy import insert
+from sqlmodel import Session, col, create_engine, select
+
+from k_matcher.database import create_db_and_tables
+from k_matcher.domain.enums import AnswerEnum
+from k_matcher.models.models import Answer, Question, QuestionCategory, Result
+from k_matcher.tools.purge_stale_results import purge_stale_results
+
+
+def test_purge_stale_results(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'db.sqlite'}")
+    create_db_and_tables(engine)
+    now = datetime.datetime.now()
+    stale = [Result(created_at=now - datetime.timedelta(days=40)) for _ in range(10)]
+    matched = Result(created_at=now - datetime.timedelta(days=40), matching_result="[]")
+    recent = Result(created_at=now)
+    with Session(engine) as session:
+        session.add(QuestionCategory(id=1, name="category_1"))
+        session.flush()
+        session.add_all([Question(id=i, text=f"text {i}", category_id=1) for i in range(500)])
+        session.add_all([*stale, matched, recent])
+        session.flush()
+        session.execute(
+            insert(Answer),
+            [
+                {
+                    "result_id": result.id,
+                    "question_id": i,
+                    "answer": AnswerEnum.YES,
+                    "if_forced": False,
+                }
+                for result in [*stale, matched, recent]
+                for i in range(500)
+            ],
+        )
+        session.commit()
+        kept_ids = {matched.id, recent.id}
+
+    stats = purge_stale_results(engine, datetime.timedelta(days=30), batch_size=3)
+
+    assert (stats.results, stats.answers) == (10, 5000)
+    assert stats.bytes_reclaimed > 0
+    with Session(engine) as session:
+        assert set(session.exec(select(col(Result.id))).all()) == kept_ids
+        assert set(session.exec(select(col(Answer.result_id)).distinct()).all()) == kept_ids
+    engine.dispose()
@@ -0,0 +1,111 @@
+import datetime
+
+from fastapi.testclient import TestClient
+from sqlmodel import Session, col, select
+
+from k_matcher.database import create_db_and_tables
+from k_matcher.domain.answer_vector import encode_answer_vector, vector_from_answers
+from k_matcher.domain.enums import AnswerEnum
+from k_matcher.models.models import AnswerCreate, Question, QuestionCategory, Result
+from k_matcher.tools.backfill_questionnaires import backfill_questionnaires
+
+ANSWERS = [
+    {"question_id": question_id, "answer": 3, "if_forced": False} for question_id in range(1, 5)
+]
+
+
+def test_current_questionnaire(test_client: TestClient, fill_db_with_questions, session: Session):
+    questionnaire = test_client.get("/questionnaires/current").json()
+    assert questionnaire["question_ids"] == [1, 2, 3, 4]
+    assert test_client.get("/questionnaires/current").json() == questionnaire
+    assert test_client.get(f"/questionnaires/{questionnaire['id']}").json() == questionnaire
+    assert test_client.get("/questionnaires/404").status_code == 404
+
+    question = session.get_one(Question, 1)
+    question.text = "edited"
+    session.commit()
+    assert test_client.get("/questionnaires/current").json() == questionnaire
+
+    session.add(Question(id=5, text="text 5", category_id=1))
+    session.commit()
+    new_questionnaire = test_client.get("/questionnaires/current").json()
+    assert new_questionnaire["question_ids"] == [1, 2, 3, 4, 5]
+    assert new_questionnaire["id"] != questionnaire["id"]
+    assert test_client.get(f"/questionnaires/{questionnaire['id']}").json() == questionnaire
+
+
+def test_post_answers__questionnaire(test_client: TestClient, fill_db_with_questions):
+    questionnaire_id = test_client.get("/questionnaires/current").json()["id"]
+    partner = test_client.post(
+        "/results", json={"questionnaire_id": questionnaire_id, "answers": ANSWERS}
+    )
+    assert partner.status_code == 200
+
+    match = test_client.post(
+        "/results",
+        json={
+            "questionnaire_id": questionnaire_id,
+            "partner_id": partner.json()["pairing_code"],
+            "answers": ANSWERS[::-1],
+        },
+    )
+    assert match.status_code == 200
+    assert [group["min_answer"] for group in match.json()["matching_result"]] == [3]
+    # Results without a questionnaire still match by their question ids
+    match = test_client.post(
+        "/results", json={"partner_id": partner.json()["id"], "answers": ANSWERS}
+    )
+    assert match.status_code == 200
+
+
+def test_post_answers__questionnaire_mismatch(test_client: TestClient, fill_db_with_questions):
+    questionnaire_id = test_client.get("/questionnaires/current").json()["id"]
+    for answers in (
+        ANSWERS[1:],
+        ANSWERS[:3] + [ANSWERS[0]],
+        ANSWERS[:3] + [dict(ANSWERS[0], question_id=5)],
+    ):
+        response = test_client.post(
+            "/results", json={"questionnaire_id": questionnaire_id, "answers": answers}
+        )
+        assert response.status_code == 400
+        assert response.json()["detail"] == "Answers do not match the questionnaire"
+
+    response = test_client.post("/results", json={"questionnaire_id": 404, "answers": ANSWERS})
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Unknown questionnaire"
+
+
+def test_backfill_questionnaires(engine, session: Session):
+    create_db_and_tables(engine)
+    session.add(QuestionCategory(id=1, name="category_1"))
+    session.flush()
+    session.add_all([Question(id=i, text=f"text {i}", category_id=1) for i in range(1, 5)])
+    session.flush()
+
+    def result(question_ids: list[int]) -> Result:
+        vector = vector_from_answers(
+            [AnswerCreate(question_id=i, answer=AnswerEnum.YES) for i in question_ids]
+        )
+        return Result(
+            created_at=datetime.datetime.now(), answers_vector=encode_answer_vector(vector)
+        )
+
+    session.add_all(
+        [
+            result([1, 2]),
+            result([2, 1]),
+            result([1, 2, 3]),
+            Result(created_at=datetime.datetime.now()),
+        ]
+    )
+    session.commit()
+
+    assert backfill_questionnaires(engine, batch_size=2) == 3
+    assert backfill_questionnaires(engine) == 0
+
+    questionnaire_ids = session.exec(
+        select(col(Result.questionnaire_id)).order_by(col(Result.questionnaire_id))
+    ).all()
+    assert questionnaire_ids[0] is None
+    assert questionnaire_ids[1] == questionnaire_ids[2] != questionnaire_ids[3]
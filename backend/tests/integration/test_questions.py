@@ -1,4 +1,7 @@
 from fastapi.testclient import TestClient
+from sqlmodel import Session
+
+from k_matcher.models.models import Question
 
 
 def test_get_questions__none(test_client: TestClient):
@@ -25,3 +28,39 @@ def test_get_questions_by_category(test_client: TestClient, fill_db_with_questio
         {"id": 2, "text": "text 2", "category_id": 2},
         {"id": 3, "text": "text 3", "category_id": 2},
     ]
+
+
+def test_get_questions__not_modified(test_client: TestClient, fill_db_with_questions):
+    response = test_client.get("/questions")
+    assert response.status_code == 200
+    etag = response.headers["etag"]
+
+    response = test_client.get("/questions", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.headers["etag"] == etag
+    assert test_client.get("/catalogue_cache").json() | {"size_bytes": 0} == {
+        "version": 6,
+        "entries": 1,
+        "size_bytes": 0,
+        "hits": 1,
+        "misses": 1,
+        "hit_rate": 0.5,
+    }
+
+
+def test_get_questions__invalidated_on_write(
+    test_client: TestClient, session: Session, fill_db_with_questions
+):
+    etag = test_client.get("/questions?category_id=1").headers["etag"]
+
+    session.add(Question(id=5, text="text 5", category_id=1))
+    session.commit()
+
+    response = test_client.get("/questions?category_id=1", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
+    assert response.json() == [
+        {"id": 1, "text": "text 1", "category_id": 1},
+        {"id": 4, "text": "text 4", "category_id": 1},
+        {"id": 5, "text": "text 5", "category_id": 1},
+    ]
@@ -1,4 +1,16 @@
+import json
+import uuid
+
+import pytest
 from fastapi.testclient import TestClient
+from sqlmodel import Session, col, select, text, update
+
+from k_matcher import main
+from k_matcher.domain.enums import AnswerEnum
+from k_matcher.domain.pairing_code import is_pairing_code
+from k_matcher.match_cache import MatchCache, MemoryBackend
+from k_matcher.models import helpers
+from k_matcher.models.models import Answer, MatchItem, Result
 
 
 def test_post_answers__foreign_key_error(test_client: TestClient):
@@ -9,6 +21,20 @@ def test_post_answers__foreign_key_error(test_client: TestClient):
     assert response.json() == {"detail": "Foreign key constraint violated"}
 
 
+@pytest.mark.parametrize("question_id", [-1, 400_000_000])
+def test_post_answers__question_id_out_of_range(test_client: TestClient, question_id: int):
+    test_data = {"answers": [{"question_id": question_id, "answer": 0, "if_forced": False}]}
+    response = test_client.post("/results", json=test_data)
+    assert response.status_code == 422
+
+
+def test_post_answers__no_answers(test_client: TestClient, session: Session):
+    response = test_client.post("/results", json={"answers": []})
+    assert response.status_code == 200
+    assert response.json()["id"] is not None
+    assert session.exec(select(Answer)).all() == []
+
+
 def test_post_answers__unreleated_users(test_client: TestClient, fill_db_with_questions):
     # First user sends answers (no id in URL)
     test_data = {
@@ -93,3 +119,295 @@ def test_post_answers__related_users(test_client: TestClient, fill_db_with_quest
     response = test_client.get(f"/results/{first_result_id}")
     assert response.status_code == 200
     validate_result(response.json())
+
+
+def test_rank_results(test_client: TestClient, fill_db_with_questions):
+    def post_answers(answers: list[int]) -> str:
+        test_data = {
+            "answers": [
+                {"question_id": question_id, "answer": answer, "if_forced": False}
+                for question_id, answer in enumerate(answers, start=1)
+            ]
+        }
+        response = test_client.post("/results", json=test_data)
+        assert response.status_code == 200
+        return response.json()["id"]
+
+    result_id = post_answers([4, 3, 2, 1])
+    best_id = post_answers([4, 4, 3, 4])
+    good_id = post_answers([3, 0, 0, 0])
+    worst_id = post_answers([0, 0, 0, 0])
+
+    response = test_client.post(
+        f"/results/{result_id}/ranking",
+        json={"candidate_ids": [worst_id, good_id, best_id, result_id]},
+    )
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    assert [json.loads(line) for line in response.text.splitlines()] == [
+        {
+            "result_id": best_id,
+            "match_count": 4,
+            "grade_counts": {"4": 1, "3": 1, "2": 1, "1": 1},
+            "matching_result": None,
+        },
+        {
+            "result_id": good_id,
+            "match_count": 1,
+            "grade_counts": {"3": 1},
+            "matching_result": None,
+        },
+        {
+            "result_id": worst_id,
+            "match_count": 0,
+            "grade_counts": {},
+            "matching_result": None,
+        },
+    ]
+
+
+def test_rank_results__not_found(test_client: TestClient):
+    response = test_client.post(f"/results/{uuid.uuid4()}/ranking", json={"candidate_ids": []})
+    assert response.status_code == 404
+    assert response.json() == {"detail": "Result not found"}
+
+
+def test_match_group(test_client: TestClient, fill_db_with_questions):
+    def post_answers(answers: list[int]) -> str:
+        test_data = {
+            "answers": [
+                {"question_id": question_id, "answer": answer, "if_forced": False}
+                for question_id, answer in enumerate(answers, start=1)
+            ]
+        }
+        return test_client.post("/results", json=test_data).json()["id"]
+
+    result_ids = [
+        post_answers([4, 3, 2, 1]),
+        post_answers([4, 4, 2, 4]),
+        post_answers([3, 3, 0, 4]),
+    ]
+    response = test_client.post("/groups/match", json={"result_ids": result_ids})
+    assert response.status_code == 200
+    group_match = response.json()
+    assert group_match["result_ids"] == result_ids
+    assert [
+        (group["min_answer"], sorted(match["question_id"] for match in group["matches"]))
+        for group in group_match["matching_result"]
+    ] == [(3, [1, 2]), (1, [4])]
+    assert group_match["matching_result"][1]["matches"][0]["answers"] == [
+        {"answer": 1, "if_forced": False},
+        {"answer": 4, "if_forced": False},
+        {"answer": 4, "if_forced": False},
+    ]
+    assert test_client.post("/groups/match", json={"result_ids": result_ids}).json() == (
+        response.json()
+    )
+
+
+def test_match_group__invalid(test_client: TestClient, fill_db_with_questions):
+    result_id = test_client.post(
+        "/results", json={"answers": [{"question_id": 1, "answer": 4, "if_forced": False}]}
+    ).json()["id"]
+    for result_ids, status_code in [
+        ([result_id] * 2, 422),
+        ([result_id] * 21, 422),
+        ([result_id] * 3, 400),
+        ([result_id, str(uuid.uuid4()), str(uuid.uuid4())], 404),
+    ]:
+        response = test_client.post("/groups/match", json={"result_ids": result_ids})
+        assert response.status_code == status_code
+
+
+def test_post_answers__match_items_stored(
+    test_client: TestClient, session: Session, fill_db_with_questions
+):
+    answers = [3, 2, 0, 4]
+    partner_answers = [4, 2, 4, 1]
+    first_response = test_client.post(
+        "/results",
+        json={
+            "answers": [
+                {"question_id": question_id, "answer": answer, "if_forced": question_id == 1}
+                for question_id, answer in enumerate(answers, start=1)
+            ]
+        },
+    )
+    first_result_id = first_response.json()["id"]
+    test_client.post(
+        "/results",
+        json={
+            "partner_id": first_result_id,
+            "answers": [
+                {"question_id": question_id, "answer": answer, "if_forced": False}
+                for question_id, answer in enumerate(partner_answers, start=1)
+            ],
+        },
+    )
+
+    match_items = session.exec(select(MatchItem).order_by(col(MatchItem.question_id))).all()
+    assert [item.model_dump() for item in match_items] == [
+        {
+            "result_id": uuid.UUID(first_result_id),
+            "question_id": 1,
+            "min_answer": 3,
+            "answer_a": AnswerEnum.YES,
+            "if_forced_a": True,
+            "answer_b": AnswerEnum.NEED,
+            "if_forced_b": False,
+        },
+        {
+            "result_id": uuid.UUID(first_result_id),
+            "question_id": 2,
+            "min_answer": 2,
+            "answer_a": AnswerEnum.MAYBE,
+            "if_forced_a": False,
+            "answer_b": AnswerEnum.MAYBE,
+            "if_forced_b": False,
+        },
+        {
+            "result_id": uuid.UUID(first_result_id),
+            "question_id": 4,
+            "min_answer": 1,
+            "answer_a": AnswerEnum.NEED,
+            "if_forced_a": False,
+            "answer_b": AnswerEnum.NO_DESIRE,
+            "if_forced_b": False,
+        },
+    ]
+
+
+def test_post_answers__no_matches(
+    test_client: TestClient, session: Session, fill_db_with_questions
+):
+    test_data = {
+        "answers": [
+            {"question_id": question_id, "answer": 0, "if_forced": False}
+            for question_id in range(1, 5)
+        ]
+    }
+    first_result_id = test_client.post("/results", json=test_data).json()["id"]
+    response = test_client.post("/results", json=test_data | {"partner_id": first_result_id})
+    assert response.status_code == 200
+    assert response.json()["matching_result"] == []
+    assert session.exec(select(MatchItem)).all() == []
+
+
+def test_post_answers__partner_loaded_in_one_query(
+    test_client: TestClient, statements: list[str], fill_db_with_questions
+):
+    answers = [
+        {"question_id": question_id, "answer": 4, "if_forced": False} for question_id in range(1, 5)
+    ]
+    first_result_id = test_client.post("/results", json={"answers": answers}).json()["id"]
+
+    statements.clear()
+    response = test_client.post(
+        "/results", json={"partner_id": first_result_id, "answers": answers}
+    )
+    assert response.status_code == 200
+    assert [statement.split()[0] for statement in statements] == [
+        "SELECT",
+        "UPDATE",
+        "DELETE",
+        "INSERT",
+    ]
+
+
+def test_post_answers__partner_by_pairing_code(test_client: TestClient, fill_db_with_questions):
+    answers = [
+        {"question_id": question_id, "answer": 4, "if_forced": False} for question_id in range(1, 5)
+    ]
+    first_response = test_client.post("/results", json={"answers": answers}).json()
+    pairing_code = first_response["pairing_code"]
+    assert is_pairing_code(pairing_code)
+
+    response = test_client.post("/results", json={"partner_id": pairing_code, "answers": answers})
+    assert response.status_code == 200
+    assert response.json()["id"] == first_response["id"]
+    assert test_client.get(f"/results/{pairing_code}").json() == response.json()
+
+
+def test_post_answers__repeated_match_is_identical(test_client: TestClient, fill_db_with_questions):
+    answers = [
+        {"question_id": question_id, "answer": 3, "if_forced": False} for question_id in range(1, 5)
+    ]
+    partner_id = test_client.post("/results", json={"answers": answers}).json()["id"]
+
+    match_request = {"partner_id": partner_id, "answers": answers}
+    first_response = test_client.post("/results", json=match_request)
+    second_response = test_client.post("/results", json=match_request)
+    assert first_response.content == second_response.content
+
+
+def test_post_answers__match_cache(
+    test_client: TestClient, fill_db_with_questions, statements, monkeypatch
+):
+    cache = MatchCache(MemoryBackend(max_entries=100, max_bytes=100_000, ttl=60))
+    monkeypatch.setattr(main, "get_match_cache", lambda: cache)
+    answers = [
+        {"question_id": question_id, "answer": 3, "if_forced": False} for question_id in range(1, 5)
+    ]
+    partner = test_client.post("/results", json={"answers": answers}).json()
+    match_request = {"partner_id": partner["pairing_code"], "answers": answers}
+    first_response = test_client.post("/results", json=match_request)
+
+    statements.clear()
+    assert test_client.post("/results", json=match_request).content == first_response.content
+    assert test_client.get(f"/results/{partner['id'].upper()}").content == first_response.content
+    assert statements == []
+
+    other_answers = [answer | {"answer": 4} for answer in answers]
+    other_match = test_client.post(
+        "/results", json={"partner_id": partner["id"], "answers": other_answers}
+    )
+    assert test_client.get(f"/results/{partner['pairing_code']}").content == other_match.content
+    assert test_client.post("/results", json=match_request).content == first_response.content
+    assert test_client.get("/match_cache").json()["hits"] == 3
+
+
+def test_get_results__unmatched_not_cached(
+    test_client: TestClient, session: Session, fill_db_with_questions, monkeypatch
+):
+    cache = MatchCache(MemoryBackend(max_entries=100, max_bytes=100_000, ttl=60))
+    monkeypatch.setattr(main, "get_match_cache", lambda: cache)
+    answers = [{"question_id": 1, "answer": 3, "if_forced": False}]
+    result_id = test_client.post("/results", json={"answers": answers}).json()["id"]
+    assert test_client.get(f"/results/{result_id}").json()["matching_result"] is None
+
+    # Matched by another worker, which can't invalidate this worker's cache
+    session.execute(
+        update(Result).where(col(Result.id) == uuid.UUID(result_id)).values(matching_result="[]")
+    )
+    session.commit()
+    assert test_client.get(f"/results/{result_id}").json()["matching_result"] == []
+
+
+def test_post_answers__invalid_partner_id(test_client: TestClient, fill_db_with_questions):
+    answers = [{"question_id": 1, "answer": 4, "if_forced": False}]
+    response = test_client.post("/results", json={"partner_id": "not an id", "answers": answers})
+    assert response.status_code == 400
+    response = test_client.post("/results", json={"partner_id": "abcdefghjk", "answers": answers})
+    assert response.status_code == 404
+    assert test_client.get("/results/not-an-id").status_code == 404
+
+
+@pytest.fixture
+def binary_uuids(monkeypatch):
+    monkeypatch.setattr(helpers, "binary_uuids", lambda: True)
+
+
+def test_post_answers__binary_uuids(
+    binary_uuids, test_client: TestClient, session: Session, fill_db_with_questions
+):
+    answers = [
+        {"question_id": question_id, "answer": 4, "if_forced": False} for question_id in range(1, 5)
+    ]
+    result_id = test_client.post("/results", json={"answers": answers}).json()["id"]
+    response = test_client.post("/results", json={"partner_id": result_id, "answers": answers})
+    assert response.status_code == 200
+    assert test_client.get(f"/results/{result_id}").json()["id"] == result_id
+
+    for table, column in (("result", "id"), ("answer", "result_id"), ("match_item", "result_id")):
+        stored = session.exec(text(f"SELECT DISTINCT {column} FROM {table}")).all()  # type: ignore
+        assert stored == [(uuid.UUID(result_id).bytes,)]
@@ -0,0 +1,124 @@
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import Session, col, create_engine, func, select
+
+from k_matcher import main, write_batcher
+from k_matcher.config import WriteBatchingConfig
+from k_matcher.database import create_db_and_tables
+from k_matcher.domain.enums import AnswerEnum
+from k_matcher.models.models import Question, QuestionCategory, Result
+from k_matcher.write_batcher import (
+    NewResult,
+    WriteBatcher,
+    close_write_batcher,
+    get_write_batcher,
+)
+
+
+@pytest.fixture
+def file_engine(tmp_path):
+    engine = create_engine(
+        f"sqlite:///{tmp_path / 'db.sqlite'}", connect_args={"check_same_thread": False}
+    )
+    create_db_and_tables(engine)
+    with Session(engine) as session:
+        session.add(QuestionCategory(id=1, name="category"))
+        session.commit()
+        session.add(Question(id=1, text="question", category_id=1))
+        session.commit()
+    yield engine
+    engine.dispose()
+
+
+def _new_result(question_id: int = 1) -> NewResult:
+    result_id = uuid.uuid4()
+    return NewResult(
+        {"id": result_id, "pairing_code": uuid.uuid4().hex[:10]},
+        [{"result_id": result_id, "question_id": question_id, "answer": AnswerEnum.YES}],
+    )
+
+
+def _write_concurrently(batcher: WriteBatcher, new_results: list[NewResult]) -> list:
+    barrier = threading.Barrier(len(new_results))
+
+    def write(new_result: NewResult):
+        barrier.wait()
+        try:
+            batcher.write(new_result)
+        except IntegrityError as e:
+            return e
+
+    with ThreadPoolExecutor(len(new_results)) as executor:
+        return list(executor.map(write, new_results))
+
+
+def test_write_batcher__one_transaction(file_engine):
+    batcher = WriteBatcher(file_engine, flush_window=0.5, max_batch_size=8)
+    outcomes = _write_concurrently(batcher, [_new_result() for _ in range(8)])
+    batcher.close()
+
+    assert outcomes == [None] * 8
+    assert (batcher.batches, batcher.results) == (1, 8)
+    with Session(file_engine) as session:
+        assert session.exec(select(func.count(col(Result.id)))).one() == 8
+
+
+def test_write_batcher__foreign_key_error_only_fails_its_result(file_engine):
+    batcher = WriteBatcher(file_engine, flush_window=0.5, max_batch_size=4)
+    new_results = [_new_result(), _new_result(question_id=404), _new_result(), _new_result()]
+    outcomes = _write_concurrently(batcher, new_results)
+    batcher.close()
+
+    assert [outcome is None for outcome in outcomes] == [True, False, True, True]
+    assert "FOREIGN KEY constraint failed" in str(outcomes[1])
+    with Session(file_engine) as session:
+        assert session.exec(select(func.count(col(Result.id)))).one() == 3
+
+
+def test_write_batcher__closed(file_engine):
+    batcher = WriteBatcher(file_engine, flush_window=0.01, max_batch_size=4)
+    batcher.close()
+    batcher.close()
+
+    with pytest.raises(RuntimeError, match="closed"):
+        batcher.write(_new_result())
+
+
+def test_close_write_batcher__next_one_is_new(monkeypatch):
+    write_batching = WriteBatchingConfig(enabled=True, flush_window_ms=1)
+    monkeypatch.setattr(
+        write_batcher, "get_config", lambda: SimpleNamespace(write_batching=write_batching)
+    )
+    get_write_batcher.cache_clear()
+    try:
+        batcher = get_write_batcher()
+        close_write_batcher()
+        assert get_write_batcher() is not batcher
+        close_write_batcher()
+    finally:
+        get_write_batcher.cache_clear()
+    assert batcher is not None and batcher._closed
+
+
+def test_post_answers__write_batching(
+    test_client: TestClient, fill_db_with_questions, engine, monkeypatch
+):
+    batcher = WriteBatcher(engine, flush_window=0.001, max_batch_size=32)
+    monkeypatch.setattr(main, "get_write_batcher", lambda: batcher)
+    answers = [{"question_id": 1, "answer": 4, "if_forced": False}]
+
+    result = test_client.post("/results", json={"answers": answers}).json()
+    assert (
+        test_client.get(f"/results/{result['id']}").json()["pairing_code"] == result["pairing_code"]
+    )
+    response = test_client.post(
+        "/results", json={"answers": [{"question_id": 0, "answer": 4, "if_forced": False}]}
+    )
+    assert response.status_code == 400
+    batcher.close()
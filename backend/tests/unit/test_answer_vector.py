@@ -0,0 +1,40 @@
+from k_matcher.domain.answer_vector import (
+    AnswerVector,
+    decode_answer_vector,
+    encode_answer_vector,
+    vector_from_answers,
+)
+from k_matcher.domain.enums import AnswerEnum
+from k_matcher.models.models import AnswerCreate
+
+
+def test_vector_from_answers__sorted_by_question_id():
+    vector = vector_from_answers(
+        [
+            AnswerCreate(question_id=9, answer=AnswerEnum.NEED, if_forced=True),
+            AnswerCreate(question_id=2, answer=AnswerEnum.MAYBE),
+        ]
+    )
+    assert vector == AnswerVector((2, 9), bytes([0x02, 0x0C]))
+
+
+def test_answer_vector_roundtrip():
+    answers = [
+        AnswerCreate(question_id=question_id, answer=answer, if_forced=question_id % 3 == 0)
+        for question_id, answer in zip(range(1, 2000, 7), list(AnswerEnum) * 100)
+    ]
+    for count in (0, 1, 2, len(answers)):
+        vector = vector_from_answers(answers[:count])
+        assert decode_answer_vector(encode_answer_vector(vector)) == vector
+
+
+def test_encode_answer_vector__layout():
+    blob = encode_answer_vector(AnswerVector((0, 3, 8), bytes([0x01, 0x0A, 0x04])))
+    assert blob == bytes([0, 0, 0, 2, 0b00001001, 0b00000001, 0x1A, 0x40])
+
+
+def test_encode_answer_vector__sparse_ids():
+    vector = AnswerVector((1, 1_000_000), bytes([0x01, 0x0A]))
+    blob = encode_answer_vector(vector)
+    assert len(blob) == 4 + 2 * 4 + 1
+    assert decode_answer_vector(blob) == vector
@@ -0,0 +1,30 @@
+from k_matcher.config import DatabaseConfig, load_config
+from k_matcher.database import sqlite_pragmas
+
+
+def test_database_config__safe_profile_keeps_sqlite_defaults():
+    settings = DatabaseConfig(profile="safe")
+    assert settings.echo is True
+    assert sqlite_pragmas(settings) == ["PRAGMA foreign_keys=ON"]
+
+
+def test_database_config__fast_profile_with_override():
+    settings = DatabaseConfig(profile="fast", synchronous="FULL")
+    assert settings.echo is False
+    assert sqlite_pragmas(settings) == [
+        "PRAGMA foreign_keys=ON",
+        "PRAGMA auto_vacuum=INCREMENTAL",
+        "PRAGMA journal_mode=WAL",
+        "PRAGMA synchronous=FULL",
+        "PRAGMA busy_timeout=30000",
+        f"PRAGMA mmap_size={256 * 1024 * 1024}",
+        f"PRAGMA cache_size={-64 * 1024}",
+    ]
+
+
+def test_config__tokens_not_read_from_environment(monkeypatch):
+    monkeypatch.setenv("PROFILING_TOKEN", "secret")
+    monkeypatch.setenv("TOKEN", "secret")
+    config = load_config()
+    assert config.instrumentation.profiling_token is None
+    assert config.export.token is None
@@ -0,0 +1,70 @@
+import itertools
+import random
+
+import pytest
+
+from k_matcher.domain.answer import AnswerEnum
+from k_matcher.domain.group_match import grade_group, group_match_list
+from k_matcher.domain.match_engine import GRADE_TABLE, NO_MATCH, encode_answer
+from k_matcher.domain.match_rules import MatchRules
+
+CODES = [encode_answer(answer, if_forced) for answer in AnswerEnum for if_forced in (False, True)]
+
+
+def _pairwise_grades(vectors: list[bytes], grade_table: bytes) -> bytes:
+    grades = bytearray()
+    for answers in zip(*vectors):
+        pair_grades = [grade_table[(a << 4) | b] for a, b in itertools.combinations(answers, 2)]
+        grades.append(NO_MATCH if NO_MATCH in pair_grades else min(pair_grades))
+    return bytes(grades)
+
+
+@pytest.mark.parametrize(
+    "rules",
+    [
+        MatchRules(),
+        MatchRules(pairs={"MAYBE+MAYBE": None, "NO_DESIRE+NO_DESIRE": 1}, forced_grade_offset=-1),
+    ],
+)
+@pytest.mark.parametrize("group_size", [2, 3, 7, 20])
+def test_grade_group__same_as_every_pair(rules: MatchRules, group_size: int):
+    grade_table = rules.grade_table()
+    rng = random.Random(group_size)
+    # Few distinct answers per question, so that repeated answers and full matches are common
+    vectors = [bytearray() for _ in range(group_size)]
+    for _ in range(2000):
+        choices = rng.sample(CODES, rng.randint(1, 3))
+        for vector in vectors:
+            vector.append(rng.choice(choices))
+    vectors_bytes = [bytes(vector) for vector in vectors]
+    grades = grade_group(vectors_bytes, grade_table)
+    assert grades == _pairwise_grades(vectors_bytes, grade_table)
+    assert len(set(grades)) > 2
+
+
+def test_grade_group__repeated_answer_must_match_itself():
+    no_desire = encode_answer(AnswerEnum.NO_DESIRE, False)
+    need = encode_answer(AnswerEnum.NEED, False)
+    assert grade_group([bytes([no_desire]), bytes([need]), bytes([need])]) == bytes([1])
+    assert grade_group([bytes([no_desire]), bytes([need]), bytes([no_desire])]) == bytes([NO_MATCH])
+    with pytest.raises(ValueError):
+        grade_group([bytes([need]), bytes([need, need])])
+
+
+def test_group_match_list():
+    yes, maybe, never = (
+        encode_answer(answer, False)
+        for answer in (AnswerEnum.YES, AnswerEnum.MAYBE, AnswerEnum.NEVER)
+    )
+    vectors = [bytes([yes, yes, never]), bytes([yes, maybe, yes]), bytes([yes, yes, yes])]
+    match_list = group_match_list([10, 20, 30], vectors, GRADE_TABLE, seed=1)
+    assert [
+        (
+            group["min_answer"],
+            [(m.question_id, [a.answer for a in m.answers]) for m in group["matches"]],
+        )
+        for group in match_list.root
+    ] == [
+        (3, [(10, [AnswerEnum.YES] * 3)]),
+        (2, [(20, [AnswerEnum.YES, AnswerEnum.MAYBE, AnswerEnum.YES])]),
+    ]
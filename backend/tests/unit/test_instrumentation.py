@@ -0,0 +1,73 @@
+from fastapi import APIRouter, FastAPI
+from fastapi.testclient import TestClient
+
+from k_matcher import instrumentation
+from k_matcher.config import get_config
+from k_matcher.instrumentation import (
+    InstrumentationMiddleware,
+    InstrumentedRoute,
+    Profiler,
+    stage,
+)
+
+
+def make_client() -> TestClient:
+    router = APIRouter(route_class=InstrumentedRoute)
+
+    @router.get("/items/{item_id}")
+    def get_item(item_id: int) -> dict[str, int]:
+        with stage("db"):
+            pass
+        return {"id": item_id}
+
+    app = FastAPI()
+    app.include_router(router)
+    app.include_router(instrumentation.router)
+    app.add_middleware(InstrumentationMiddleware)
+    return TestClient(app)
+
+
+def test_stage_outside_of_a_request_is_a_no_op():
+    with stage("db"):
+        pass
+
+
+def test_server_timing_and_metrics():
+    client = make_client()
+    response = client.get("/items/1")
+    assert response.json() == {"id": 1}
+    stages = [entry.split(";")[0] for entry in response.headers["Server-Timing"].split(", ")]
+    assert stages == ["validation", "db", "total"]
+
+    metrics = client.get("/metrics").text
+    assert (
+        'k_matcher_request_duration_seconds_count{method="GET",route="/items/{item_id}",'
+        'status="200"} 1' in metrics
+    )
+    assert 'route="/items/{item_id}",stage="db"' in metrics
+    assert "k_matcher_catalogue_cache_hits_total" in metrics
+
+
+def test_profiling_sample_rate_is_changed_at_runtime(tmp_path, monkeypatch):
+    profiler = Profiler(0.0, tmp_path)
+    monkeypatch.setattr(instrumentation, "get_profiler", lambda: profiler)
+    monkeypatch.setattr(get_config().instrumentation, "profiling_token", "secret")
+    headers = {"Authorization": "Bearer secret"}
+    client = make_client()
+    client.get("/items/1")
+    assert not list(tmp_path.iterdir())
+
+    assert client.put("/debug/profiling", json={"sample_rate": 1.0}).status_code == 401
+    response = client.put("/debug/profiling", json={"sample_rate": 1.0}, headers=headers)
+    assert response.status_code == 200
+    client.get("/items/1")
+    assert [path.name.split("-")[0] for path in tmp_path.iterdir()] == ["get_item"]
+    response = client.put("/debug/profiling", json={"sample_rate": 2}, headers=headers)
+    assert response.status_code == 422
+
+
+def test_profiling_sample_rate_is_config_only_without_token():
+    assert get_config().instrumentation.profiling_token is None
+    client = make_client()
+    assert client.put("/debug/profiling", json={"sample_rate": 1.0}).status_code == 404
+    assert client.get("/debug/profiling").status_code == 200
@@ -0,0 +1,95 @@
+import fnmatch
+
+import pytest
+
+from k_matcher import match_cache
+from k_matcher.match_cache import MatchCache, MemoryBackend, RedisBackend
+
+
+class LocalRedis:
+    """Stand-in for a Redis client with the few commands the backend uses"""
+
+    def __init__(self) -> None:
+        self.values: dict[str, bytes] = {}
+        self.ttls: dict[str, int] = {}
+
+    def get(self, key: str) -> bytes | None:
+        return self.values.get(key)
+
+    def set(self, key: str, value: bytes, px: int):
+        self.values[key] = value
+        self.ttls[key] = px
+
+    def scan_iter(self, match: str):
+        return [key for key in list(self.values) if fnmatch.fnmatch(key, match)]
+
+    def delete(self, key: str):
+        self.values.pop(key, None)
+
+
+def test_memory_backend__lru_eviction():
+    backend = MemoryBackend(max_entries=2, max_bytes=100, ttl=60)
+    backend.set("a", b"1")
+    backend.set("b", b"2")
+    assert backend.get("a") == b"1"
+    backend.set("c", b"3")
+    assert (backend.get("a"), backend.get("b"), backend.get("c")) == (b"1", None, b"3")
+    assert backend.evictions == 1
+
+
+def test_memory_backend__fifo_eviction():
+    backend = MemoryBackend(max_entries=2, max_bytes=100, ttl=60, eviction="fifo")
+    backend.set("a", b"1")
+    backend.set("b", b"2")
+    assert backend.get("a") == b"1"
+    backend.set("c", b"3")
+    assert (backend.get("a"), backend.get("b"), backend.get("c")) == (None, b"2", b"3")
+
+
+def test_memory_backend__max_bytes():
+    backend = MemoryBackend(max_entries=100, max_bytes=10, ttl=60)
+    backend.set("a", b"12345")
+    backend.set("b", b"12345")
+    backend.set("too_large", b"12345678901")
+    backend.set("c", b"1")
+    assert backend.get("a") is None
+    assert backend.get("too_large") is None
+    assert backend.size_bytes == 6
+    assert len(backend) == 2
+
+
+def test_memory_backend__ttl(monkeypatch):
+    backend = MemoryBackend(max_entries=100, max_bytes=100, ttl=10)
+    backend.set("a", b"1")
+    now = match_cache.time.monotonic()
+    monkeypatch.setattr(match_cache.time, "monotonic", lambda: now + 11)
+    assert backend.get("a") is None
+    assert backend.size_bytes == 0
+
+
+@pytest.mark.parametrize(
+    "backend",
+    [MemoryBackend(max_entries=100, max_bytes=1000, ttl=60), RedisBackend(LocalRedis(), 60, "k:")],
+)
+def test_match_cache__match_replaced_by_another_submission(backend):
+    cache = MatchCache(backend)
+    cache.put_match("result-id", "pairingcode", "digest-a", b"match a")
+    assert cache.get_match("pairingcode", "digest-a") == b"match a"
+    assert cache.get_result("result-id") == b"match a"
+
+    cache.put_match("result-id", "pairingcode", "digest-b", b"match b")
+    assert cache.get_match("result-id", "digest-a") is None
+    assert cache.get_match("result-id", "digest-b") == b"match b"
+
+    stats = cache.stats()
+    assert (stats.backend, stats.hits, stats.misses) == (backend.name, 3, 1)
+
+
+def test_redis_backend__ttl_and_clear():
+    client = LocalRedis()
+    backend = RedisBackend(client, 1.5, "k:")
+    backend.set("a", b"1")
+    assert client.ttls == {"k:a": 1500}
+    client.values["other:a"] = b"2"
+    backend.clear()
+    assert client.values == {"other:a": b"2"}
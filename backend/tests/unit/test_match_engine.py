@@ -0,0 +1,143 @@
+import itertools
+
+import pytest
+from pydantic import ValidationError
+
+from k_matcher.domain.answer import Answer, AnswerEnum
+from k_matcher.domain.match_engine import (
+    GRADE_TABLE,
+    NO_MATCH,
+    grade_vectors,
+    pack_answers,
+)
+from k_matcher.domain.match_rules import MatchRules
+from k_matcher.domain.question_result import (
+    QuestionResult,
+    filter_matches,
+    get_match,
+    group_by_min_answer,
+    match_seed,
+)
+from k_matcher.models.models import AnswerCreate
+
+
+def _answer_sets() -> tuple[list[AnswerCreate], list[AnswerCreate]]:
+    answers_a, answers_b = [], []
+    combinations = itertools.product(AnswerEnum, AnswerEnum, (False, True), (False, True))
+    for question_id, (answer_a, answer_b, forced_a, forced_b) in enumerate(combinations):
+        answers_a.append(AnswerCreate(question_id=question_id, answer=answer_a, if_forced=forced_a))
+        answers_b.append(AnswerCreate(question_id=question_id, answer=answer_b, if_forced=forced_b))
+    return answers_a, answers_b
+
+
+@pytest.mark.parametrize(
+    "rules",
+    [
+        MatchRules(),
+        MatchRules(pairs={"MAYBE+MAYBE": None, "NEED+NEVER": 1}, forced_grade_offset=-1),
+    ],
+)
+def test_get_match__same_as_question_result_path(rules: MatchRules):
+    grade_table = rules.grade_table()
+    answers_a, answers_b = _answer_sets()
+    question_ids = {answer.question_id for answer in answers_a}
+    question_results = [
+        QuestionResult(
+            question_id=a.question_id,
+            answer_a=Answer.from_answer_base(a),
+            answer_b=Answer.from_answer_base(b),
+        )
+        for a, b in zip(answers_a, answers_b)
+    ]
+    expected = {
+        min_answer.value: sorted(qr.model_dump_json() for qr in matches)
+        for min_answer, matches in group_by_min_answer(
+            filter_matches(question_results, grade_table), grade_table
+        ).items()
+    }
+
+    match = get_match(answers_a, answers_b, question_ids, grade_table)
+
+    assert [graded_match["min_answer"] for graded_match in match.root] == list(expected)
+    assert {
+        graded_match["min_answer"]: sorted(qr.model_dump_json() for qr in graded_match["matches"])
+        for graded_match in match.root
+    } == expected
+
+
+def test_get_match__seeded_shuffle():
+    answers_a, answers_b = _answer_sets()
+    question_ids = {answer.question_id for answer in answers_a}
+    seed = match_seed("result-a", "result-b")
+
+    first = get_match(answers_a, answers_b, question_ids, seed=seed).model_dump_json()
+
+    assert get_match(answers_a, answers_b, question_ids, seed=seed).model_dump_json() == first
+    assert seed == match_seed("result-a", "result-b")
+    assert match_seed("result-b", "result-a") != seed
+    assert match_seed("result-a", "result-b", b"") != seed
+
+
+def test_get_match__missing_answer():
+    answers_a, answers_b = _answer_sets()
+    question_ids = {answer.question_id for answer in answers_a}
+    with pytest.raises(KeyError):
+        get_match(answers_a, answers_b[:-1], question_ids)
+
+
+def test_grade_vectors():
+    positions = {10: 0, 20: 1, 30: 2}
+    vector_a = pack_answers(
+        [
+            AnswerCreate(question_id=10, answer=AnswerEnum.NEED, if_forced=True),
+            AnswerCreate(question_id=20, answer=AnswerEnum.NEVER),
+            AnswerCreate(question_id=30, answer=AnswerEnum.MAYBE),
+        ],
+        positions,
+    )
+    vector_b = pack_answers(
+        [
+            AnswerCreate(question_id=30, answer=AnswerEnum.YES),
+            AnswerCreate(question_id=20, answer=AnswerEnum.NEED),
+            AnswerCreate(question_id=10, answer=AnswerEnum.NO_DESIRE),
+        ],
+        positions,
+    )
+    assert grade_vectors(vector_a, vector_b) == bytes(
+        [AnswerEnum.NO_DESIRE.value, NO_MATCH, AnswerEnum.MAYBE.value]
+    )
+
+
+def _grade(grade_table: bytes, a: AnswerEnum, b: AnswerEnum, forced_a=False, forced_b=False):
+    vector_a = pack_answers([AnswerCreate(question_id=1, answer=a, if_forced=forced_a)], {1: 0})
+    vector_b = pack_answers([AnswerCreate(question_id=1, answer=b, if_forced=forced_b)], {1: 0})
+    return grade_vectors(vector_a, vector_b, grade_table)[0]
+
+
+def test_match_rules__defaults():
+    assert MatchRules().grade_table() == GRADE_TABLE
+
+
+def test_match_rules__pair_overrides():
+    grade_table = MatchRules(pairs={"MAYBE+MAYBE": None, "YES+NO_DESIRE": 2}).grade_table()
+    assert _grade(grade_table, AnswerEnum.MAYBE, AnswerEnum.MAYBE) == NO_MATCH
+    assert _grade(grade_table, AnswerEnum.NO_DESIRE, AnswerEnum.YES) == AnswerEnum.MAYBE.value
+    assert _grade(grade_table, AnswerEnum.YES, AnswerEnum.NO_DESIRE, True) == AnswerEnum.MAYBE.value
+    assert _grade(grade_table, AnswerEnum.YES, AnswerEnum.YES) == AnswerEnum.YES.value
+
+
+def test_match_rules__forced_grade_offset():
+    grade_table = MatchRules(forced_grade_offset=-1).grade_table()
+    assert _grade(grade_table, AnswerEnum.NEED, AnswerEnum.NEED) == AnswerEnum.NEED.value
+    assert _grade(grade_table, AnswerEnum.NEED, AnswerEnum.NEED, True) == AnswerEnum.YES.value
+    assert (
+        _grade(grade_table, AnswerEnum.NEED, AnswerEnum.YES, True, True)
+        == AnswerEnum.NO_DESIRE.value
+    )
+    assert _grade(grade_table, AnswerEnum.NEED, AnswerEnum.NO_DESIRE, False, True) == NO_MATCH
+
+
+@pytest.mark.parametrize("pairs", [{"MAYBE": 2}, {"MAYBE+SOMETIMES": 2}, {"YES+YES": 5}])
+def test_match_rules__invalid_pairs(pairs):
+    with pytest.raises(ValidationError):
+        MatchRules(pairs=pairs)
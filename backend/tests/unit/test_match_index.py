@@ -0,0 +1,125 @@
+import random
+import threading
+import uuid
+
+import pytest
+
+from k_matcher.config import get_config
+from k_matcher.domain.answer_vector import AnswerVector
+from k_matcher.domain.match_engine import GRADE_TABLE
+from k_matcher.domain.match_rules import MatchRules
+from k_matcher.domain.ranking import _rank_key, rank_matches
+from k_matcher.match_index import CODES, MatchIndex, get_match_index
+
+QUESTION_IDS = tuple(range(1, 31))
+
+
+def _vector(rng: random.Random, question_ids: tuple[int, ...] = QUESTION_IDS) -> AnswerVector:
+    return AnswerVector(question_ids, bytes(rng.choice(CODES) for _ in question_ids))
+
+
+@pytest.fixture
+def vectors() -> dict[uuid.UUID, AnswerVector]:
+    rng = random.Random(0)
+    return {uuid.UUID(int=i): _vector(rng) for i in range(1000)}
+
+
+@pytest.fixture
+def index(vectors) -> MatchIndex:
+    index = MatchIndex(block_size=256)
+    items = list(vectors.items())
+    # In bulk and one by one, across several blocks
+    index.add(items[:600])
+    for result_id, vector in items[600:700]:
+        index.add([(result_id, vector)])
+    index.add(items[700:])
+    return index
+
+
+@pytest.mark.parametrize(
+    "grade_table",
+    [
+        GRADE_TABLE,
+        MatchRules(pairs={"MAYBE+MAYBE": None}, forced_grade_offset=-1).grade_table(),
+    ],
+)
+def test_nearest__same_top_k_as_ranking_all(index: MatchIndex, vectors, grade_table: bytes):
+    rng = random.Random(1)
+    all_candidates = {str(result_id): vector for result_id, vector in vectors.items()}
+    for k in (1, 5, 20):
+        vector = _vector(rng)
+        candidates = {
+            str(result_id): vectors[result_id]
+            for result_id in index.nearest(vector, k, grade_table)
+        }
+        assert [
+            _rank_key(ranked) for ranked in rank_matches(vector, candidates, False, grade_table)[:k]
+        ] == [
+            _rank_key(ranked)
+            for ranked in rank_matches(vector, all_candidates, False, grade_table)[:k]
+        ]
+
+
+def test_nearest__other_questions(index: MatchIndex):
+    assert index.nearest(_vector(random.Random(1), (1, 2, 3)), 5, GRADE_TABLE) == []
+
+
+def test_remove(index: MatchIndex, vectors):
+    vector = _vector(random.Random(1))
+    nearest = index.nearest(vector, 3, GRADE_TABLE)
+    index.remove(nearest)
+    assert len(index) == len(vectors) - len(nearest)
+    assert not set(nearest) & set(index.nearest(vector, 3, GRADE_TABLE))
+
+
+def test_save_and_load(index: MatchIndex, tmp_path):
+    index.remove([uuid.UUID(int=5)])
+    path = tmp_path / "match_index.bin"
+    index.save(path)
+    loaded = MatchIndex.load(path)
+
+    assert (len(loaded), loaded.block_size) == (len(index), index.block_size)
+    vector = _vector(random.Random(1))
+    assert loaded.nearest(vector, 10, GRADE_TABLE) == index.nearest(vector, 10, GRADE_TABLE)
+    (tmp_path / "other.bin").write_bytes(b"not an index")
+    with pytest.raises(ValueError):
+        MatchIndex.load(tmp_path / "other.bin")
+
+
+def test_load__truncated_or_corrupt(index: MatchIndex, tmp_path):
+    path = tmp_path / "match_index.bin"
+    index.save(path)
+    data = path.read_bytes()
+    corrupt = bytearray(data)
+    corrupt[len(data) // 2] ^= 0xFF
+    for broken in (data[:20], data[: len(data) // 2], data[:-1], bytes(corrupt)):
+        path.write_bytes(broken)
+        with pytest.raises(ValueError):
+            MatchIndex.load(path)
+
+
+def test_save__concurrent(index: MatchIndex, tmp_path):
+    path = tmp_path / "match_index.bin"
+    index.save(path)
+    # Separate instances like in separate workers, so the saves don't share a lock
+    workers = [MatchIndex.load(path) for _ in range(4)]
+    threads = [threading.Thread(target=worker.save, args=(path,)) for worker in workers]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(MatchIndex.load(path)) == len(index)
+    assert [child.name for child in tmp_path.iterdir()] == [path.name]
+
+
+def test_get_match_index__rebuilt_when_file_is_corrupt(monkeypatch, tmp_path):
+    path = tmp_path / "match_index.bin"
+    path.write_bytes(b"KMATCHIDX2\n" + b"\0" * 20)
+    monkeypatch.setattr(get_config().match_index, "enabled", True)
+    monkeypatch.setattr(get_config().match_index, "path", str(path))
+    get_match_index.cache_clear()
+    try:
+        index = get_match_index()
+        assert index is not None and len(index) == 0 and index.watermark is None
+    finally:
+        get_match_index.cache_clear()
@@ -240,3 +240,17 @@ def test_group_question_results_by_min_answer():
         AnswerEnum.NO_DESIRE: set((hash(k) for k in ("no_desire_1", "no_desire_2"))),
     }
     assert grouped_matches_as_sets == expected_result
+
+
+def test_group_by_min_answer__skips_unmatched():
+    matched = QuestionResult(
+        question_id=1,
+        answer_a=Answer(answer=AnswerEnum.YES),
+        answer_b=Answer(answer=AnswerEnum.NEED),
+    )
+    unmatched = QuestionResult(
+        question_id=2,
+        answer_a=Answer(answer=AnswerEnum.NEVER),
+        answer_b=Answer(answer=AnswerEnum.NEED),
+    )
+    assert group_by_min_answer([matched, unmatched]) == {AnswerEnum.YES: [matched]}
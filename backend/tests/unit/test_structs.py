@@ -0,0 +1,36 @@
+import itertools
+
+import msgspec
+
+from k_matcher.domain.enums import AnswerEnum
+from k_matcher.domain.match_engine import encode_answer
+from k_matcher.domain.question_result import MatchList, match_list_from_vectors
+from k_matcher.domain.structs import MatchListStruct, match_structs_from_vectors
+
+
+def _vectors() -> tuple[list[int], bytes, bytes]:
+    codes = [encode_answer(answer, if_forced) for answer in AnswerEnum for if_forced in (0, 1)]
+    pairs = list(itertools.product(codes, codes))
+    return (
+        [question_id * 10 for question_id in range(len(pairs))],
+        bytes(code_a for code_a, _ in pairs),
+        bytes(code_b for _, code_b in pairs),
+    )
+
+
+def test_match_structs__same_json_as_pydantic():
+    question_ids, vector_a, vector_b = _vectors()
+    pydantic_json = match_list_from_vectors(
+        question_ids, vector_a, vector_b, seed=1
+    ).model_dump_json()
+    msgspec_json = msgspec.json.encode(
+        match_structs_from_vectors(question_ids, vector_a, vector_b, seed=1)
+    )
+    assert msgspec_json == pydantic_json.encode()
+
+
+def test_match_structs__decode_pydantic_json():
+    question_ids, vector_a, vector_b = _vectors()
+    match = match_list_from_vectors(question_ids, vector_a, vector_b)
+    decoded = msgspec.json.decode(match.model_dump_json(), type=MatchListStruct)
+    assert MatchList.model_validate_json(msgspec.json.encode(decoded)) == match
@@ -25,6 +25,7 @@ interface Answer {
 
 interface SubmitResult {
   id: string;
+  pairing_code?: string | null;
   matching_result?: {
     min_answer: number;
     matches: {
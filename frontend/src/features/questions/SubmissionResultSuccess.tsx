@@ -8,14 +8,16 @@ const SubmissionResultSuccess = () => {
     return null;
   }
 
+  const code = submissionResult.pairing_code ?? submissionResult.id;
+
   return (
     <div className="flex justify-center">
       <div className="text-lg font-semibold p-6 rounded-lg max-w-2xl text-center bg-green-900/20 border border-green-500 text-green-300">
-        Your code is: <span className="font-bold">{submissionResult.id}</span>
+        Your code is: <span className="font-bold">{code}</span>
         <br />
         Give{" "}
         <a
-          href={`/${submissionResult.id}`}
+          href={`/${code}`}
           target="_blank"
           rel="noopener noreferrer"
           className="underline"